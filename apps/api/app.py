@@ -6,6 +6,7 @@ from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
+from .core.cache import get_key_invalidations, project_key_cache
 from .core.config import settings
 from .routers import (
     auth,
@@ -16,9 +17,19 @@ from .routers import (
     datasets,
     webhooks,
     collaboration,
-    organizations
+    organizations,
+    blobs,
+    pricing,
+    retention,
+    analytics
 )
 from .core.database import engine, Base
+from .core.dedup import get_seen_traces
+from .core.ingest_queue import get_ingest_queue
+from .services.analytics_export import create_export_job
+from .services.blob_store import get_blob_store
+from .services.ingest_worker import create_worker_pool
+from .services.retention import create_retention_job
 
 # Set up logging
 logger.add("logs/api.log", rotation="500 MB", level="INFO")
@@ -55,6 +66,10 @@ def create_app() -> FastAPI:
     app.include_router(organizations.router, prefix=f"{settings.API_V1_STR}/organizations", tags=["organizations"])
     app.include_router(projects.router, prefix=f"{settings.API_V1_STR}/projects", tags=["projects"])
     app.include_router(traces.router, prefix=f"{settings.API_V1_STR}/traces", tags=["traces"])
+    app.include_router(blobs.router, prefix=f"{settings.API_V1_STR}/blobs", tags=["blobs"])
+    app.include_router(pricing.router, prefix=f"{settings.API_V1_STR}/pricing", tags=["pricing"])
+    app.include_router(retention.router, prefix=f"{settings.API_V1_STR}/retention", tags=["retention"])
+    app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["analytics"])
     app.include_router(evaluations.router, prefix=f"{settings.API_V1_STR}/evaluations", tags=["evaluations"])
     app.include_router(prompts.router, prefix=f"{settings.API_V1_STR}/prompts", tags=["prompts"])
     app.include_router(datasets.router, prefix=f"{settings.API_V1_STR}/datasets", tags=["datasets"])
@@ -66,7 +81,12 @@ def create_app() -> FastAPI:
         return {
             "status": "healthy",
             "timestamp": time.time(),
-            "version": "1.0.0"
+            "version": "1.0.0",
+            "caches": {
+                "project_keys": project_key_cache.stats(),
+                "seen_traces": get_seen_traces().stats(),
+            },
+            "blob_store": get_blob_store().stats(),
         }
 
     return app
@@ -77,7 +97,30 @@ app = create_app()
 async def startup_event():
     logger.info("Starting up Jordy Observe API...")
     # Optional: Base.metadata.create_all(bind=engine) - usually handled by alembic
+    app.state.key_invalidations = get_key_invalidations()
+    if app.state.key_invalidations is not None:
+        app.state.key_invalidations.start()
+    app.state.ingest_workers = None
+    if settings.INGEST_MODE == "queue" and settings.INGEST_WORKERS > 0:
+        app.state.ingest_workers = create_worker_pool(get_ingest_queue())
+        app.state.ingest_workers.start()
+    app.state.retention_job = None
+    if settings.RETENTION_ENABLED:
+        app.state.retention_job = create_retention_job()
+        app.state.retention_job.start()
+    app.state.export_job = None
+    if settings.ANALYTICS_EXPORT_ENABLED:
+        app.state.export_job = create_export_job()
+        app.state.export_job.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down Jordy Observe API...")
+    if app.state.key_invalidations is not None:
+        await app.state.key_invalidations.stop()
+    if app.state.ingest_workers is not None:
+        await app.state.ingest_workers.stop()
+    if app.state.retention_job is not None:
+        await app.state.retention_job.stop()
+    if app.state.export_job is not None:
+        await app.state.export_job.stop()
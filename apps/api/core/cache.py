@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Optional, Tuple
+from uuid import UUID
+
+from loguru import logger
+
+from .config import settings
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and negative caching.
+
+    `set_missing` records that a key is known to be absent, so repeated
+    lookups of bad keys are answered without hitting the backing store.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, negative_ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Returns (found, value). A cached negative entry is found with value None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if entry[1] is _MISSING:
+                self.negative_hits += 1
+                return True, None
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._store(key, value, self.ttl_seconds)
+
+    def set_missing(self, key: Hashable):
+        self._store(key, _MISSING, self.negative_ttl_seconds)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+@dataclass(frozen=True)
+class CachedProject:
+    """
+    Detached snapshot of the project fields needed on the ingest path.
+    """
+    id: UUID
+    organization_id: Optional[UUID]
+    name: str
+    slug: str
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_model(cls, project: Any) -> "CachedProject":
+        return cls(
+            id=project.id,
+            organization_id=project.organization_id,
+            name=project.name,
+            slug=project.slug,
+            settings=dict(project.settings or {}),
+        )
+
+
+class CacheInvalidations:
+    """
+    Broadcasts invalidations of a TTLCache to every API process over Redis
+    pub/sub, so a rotated key stops working everywhere at once rather than
+    when each process's entry expires.
+
+    `publish` is synchronous (the project endpoints are); `start` runs a
+    listener task per process that drops each published key from `cache`.
+    The cache is cleared whenever the subscription (re)connects, since
+    messages sent while disconnected are lost. If Redis is down, the TTL
+    still bounds how long a stale entry lives.
+    """
+
+    def __init__(self, cache: TTLCache, redis_url: str, channel: str, retry_seconds: float = 5.0):
+        import redis
+        import redis.asyncio as aioredis
+
+        self.cache = cache
+        self.channel = channel
+        self.retry_seconds = retry_seconds
+        self._publisher = redis.Redis.from_url(redis_url)
+        self._subscriber = aioredis.Redis.from_url(redis_url)
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.errors = 0
+
+    def publish(self, key: str):
+        try:
+            self._publisher.publish(self.channel, key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Failed to publish cache invalidation on {self.channel}: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"received": self.received, "errors": self.errors}
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._subscriber.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self.cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.cache.invalidate(message["data"].decode("utf-8"))
+                            self.received += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Cache invalidation listener on {self.channel} failed, retrying: {e}")
+                await asyncio.sleep(self.retry_seconds)
+
+
+# Process-wide API key -> project cache. With PROJECT_KEY_CACHE_INVALIDATION=redis
+# changes reach every worker at once; otherwise they wait for the TTL.
+project_key_cache = TTLCache(
+    max_size=settings.PROJECT_KEY_CACHE_MAX_SIZE,
+    ttl_seconds=settings.PROJECT_KEY_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.PROJECT_KEY_CACHE_NEGATIVE_TTL_SECONDS,
+)
+
+
+def create_key_invalidations() -> Optional[CacheInvalidations]:
+    """
+    Build the invalidation channel configured by PROJECT_KEY_CACHE_INVALIDATION.
+    """
+    if settings.PROJECT_KEY_CACHE_INVALIDATION == "local":
+        return None
+    if settings.PROJECT_KEY_CACHE_INVALIDATION != "redis":
+        raise ValueError(f"Unknown project key cache invalidation: {settings.PROJECT_KEY_CACHE_INVALIDATION}")
+    redis_url = settings.REDIS_URL or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+    return CacheInvalidations(project_key_cache, redis_url, channel="jordy:project-keys:invalidate")
+
+
+key_invalidations: Optional[CacheInvalidations] = None
+
+
+def get_key_invalidations() -> Optional[CacheInvalidations]:
+    global key_invalidations
+    if key_invalidations is None and settings.PROJECT_KEY_CACHE_INVALIDATION != "local":
+        key_invalidations = create_key_invalidations()
+    return key_invalidations
+
+
+def invalidate_project_key(api_key: str):
+    """
+    Drop an API key from this process's cache and, if configured, every other's.
+    """
+    project_key_cache.invalidate(api_key)
+    invalidations = get_key_invalidations()
+    if invalidations is not None:
+        invalidations.publish(api_key)
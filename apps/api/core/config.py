@@ -47,6 +47,98 @@ class Settings(BaseSettings):
         data = info.data
         return f"postgresql://{data.get('POSTGRES_USER')}:{data.get('POSTGRES_PASSWORD')}@{data.get('POSTGRES_SERVER')}/{data.get('POSTGRES_DB')}"
 
+    # Async engine (asyncpg); derived from DATABASE_URL when not set
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 500
+
+    # Ingestion
+    INGEST_MAX_BATCH_SIZE: int = 1000
+    # Limit on the decompressed size of one ingest request body
+    INGEST_MAX_BODY_BYTES: int = 64 * 1024 * 1024
+    # Streaming ingest: rows per insert/commit chunk and the cap on one record
+    INGEST_STREAM_CHUNK_ROWS: int = 500
+    INGEST_MAX_RECORD_BYTES: int = 8 * 1024 * 1024
+    # "sync" writes before responding, "queue" returns 202 and lets workers write
+    INGEST_MODE: str = "sync"
+    INGEST_QUEUE_BACKEND: str = "redis"  # redis, file
+    INGEST_QUEUE_STREAM: str = "jordy:ingest"
+    INGEST_QUEUE_GROUP: str = "ingest-workers"
+    # Unprocessed backlog at which queue-mode ingest answers 503 instead of queueing
+    INGEST_QUEUE_MAXLEN: int = 1_000_000
+    INGEST_QUEUE_PATH: str = "data/ingest-queue"
+    INGEST_QUEUE_FSYNC: bool = False
+    INGEST_WORKERS: int = 4
+    INGEST_WORKER_BATCH_SIZE: int = 200
+    INGEST_WORKER_BLOCK_MS: int = 1000
+    # After this many deliveries a failing batch is written one trace at a time
+    # and the traces that still fail are moved to the dead-letter stream/file
+    INGEST_MAX_DELIVERIES: int = 5
+    INGEST_DEAD_LETTER_STREAM: str = "jordy:ingest:dead"
+    # Recently written trace ids, to drop retried uploads before any DB work.
+    # "local" remembers them per process; "redis" also shares them through Redis.
+    INGEST_DEDUP_BACKEND: str = "local"  # local, redis
+    INGEST_DEDUP_TTL_SECONDS: float = 600.0
+    INGEST_DEDUP_LOCAL_MAX_SIZE: int = 200_000
+    # Largest payload field the SDK may offload to PUT /blobs/{digest}
+    BLOB_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Content-addressed payload blobs: where they live, and which payloads go there.
+    # Strings and whole input/output/documents fields of at least
+    # PAYLOAD_INLINE_MAX_BYTES are stored once as compressed blobs and the row
+    # keeps a reference with a preview (0 keeps every payload inline).
+    BLOB_STORE_BACKEND: str = "postgres"  # postgres, filesystem, s3
+    BLOB_STORE_PATH: str = "data/blobs"
+    BLOB_S3_BUCKET: Optional[str] = None
+    BLOB_S3_PREFIX: str = "blobs/"
+    BLOB_S3_ENDPOINT_URL: Optional[str] = None
+    BLOB_S3_REGION: Optional[str] = None
+    BLOB_KNOWN_CACHE_SIZE: int = 100_000
+    BLOB_KNOWN_TTL_SECONDS: float = 3600.0
+    PAYLOAD_INLINE_MAX_BYTES: int = 4096
+    PAYLOAD_PREVIEW_CHARS: int = 200
+
+    # Model pricing: how often workers check model_prices for changes, and the
+    # USD per 1k tokens charged for models without a price
+    PRICING_REFRESH_SECONDS: float = 30.0
+    PRICING_DEFAULT_USD_PER_1K: float = 0.002
+    PRICING_RECOMPUTE_BATCH_ROWS: int = 5000
+
+    # Retention: traces (with their spans, evaluations and feedback) older than
+    # a project's settings["retention"]["traces_days"], or RETENTION_TRACES_DAYS
+    # by default, are deleted in batches; with "archive" they are first written
+    # to Parquet under ARCHIVE_ROOT (a path or an s3:// URI). None keeps them forever.
+    RETENTION_ENABLED: bool = True
+    RETENTION_INTERVAL_SECONDS: float = 3600.0
+    RETENTION_BATCH_ROWS: int = 2000
+    RETENTION_TRACES_DAYS: Optional[int] = None
+    RETENTION_ARCHIVE: bool = False
+    ARCHIVE_ROOT: str = "data/archive"
+    # Rollup downsampling: minute/hour rollups older than this are deleted
+    # (day rollups are kept forever). None keeps them.
+    ROLLUP_MINUTE_RETENTION_DAYS: Optional[int] = None
+    ROLLUP_HOUR_RETENTION_DAYS: Optional[int] = None
+
+    # Analytics export: finished days of traces/spans are copied to Parquet under
+    # ANALYTICS_EXPORT_ROOT (a path or an s3:// URI). Long-range analytics read
+    # exported days older than ANALYTICS_POSTGRES_DAYS from there, not Postgres.
+    ANALYTICS_EXPORT_ENABLED: bool = False
+    ANALYTICS_EXPORT_ROOT: str = "data/export"
+    ANALYTICS_EXPORT_INTERVAL_SECONDS: float = 3600.0
+    ANALYTICS_EXPORT_CHUNK_ROWS: int = 5000
+    ANALYTICS_POSTGRES_DAYS: int = 7
+
+    # API key -> project cache
+    PROJECT_KEY_CACHE_MAX_SIZE: int = 10000
+    PROJECT_KEY_CACHE_TTL_SECONDS: float = 60.0
+    PROJECT_KEY_CACHE_NEGATIVE_TTL_SECONDS: float = 10.0
+    # How key changes (rotate-key, project updates) reach other API processes:
+    # "local" waits for their entries to expire, "redis" publishes them at once
+    PROJECT_KEY_CACHE_INVALIDATION: str = "local"  # local, redis
+
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
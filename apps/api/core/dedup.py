@@ -0,0 +1,156 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+from uuid import UUID
+
+from loguru import logger
+
+from .config import settings
+
+
+class RecentIdSet:
+    """
+    Thread-safe set that remembers ids for at least `ttl_seconds`.
+
+    Ids are added to the current generation, which becomes the previous one
+    every `ttl_seconds` (or once it holds `max_size` ids); lookups check
+    both. Ids are kept for between one and two TTLs without per-entry
+    timestamps, and memory is bounded by 2 * `max_size`.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._current: Set[Hashable] = set()
+        self._previous: Set[Hashable] = set()
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            self._rotate_if_due()
+            return key in self._current or key in self._previous
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._current) + len(self._previous)
+
+    def add_many(self, keys: Iterable[Hashable]):
+        with self._lock:
+            for key in keys:
+                self._rotate_if_due()
+                self._current.add(key)
+
+    def _rotate_if_due(self):
+        now = time.monotonic()
+        if now - self._rotated_at >= self.ttl_seconds or len(self._current) >= self.max_size:
+            # Idle longer than two TTLs: the previous generation has expired as well
+            self._previous = self._current if now - self._rotated_at < 2 * self.ttl_seconds else set()
+            self._current = set()
+            self._rotated_at = now
+
+
+class SeenTraceIds:
+    """
+    Ids of traces written recently, so a retried upload is recognized as a
+    duplicate before any database work.
+
+    Every process keeps a RecentIdSet. With `redis_url` the ids are also
+    shared through Redis keys that expire after `ttl_seconds`, so a retry
+    that lands on another API process or ingest worker is caught as well.
+    Ids are marked only after their transaction commits, so a failed write
+    stays retryable. This is only a fast path: ingest inserts use ON
+    CONFLICT DO NOTHING, so an id missed here (expired, or Redis
+    unavailable) is still never stored twice.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        local_max_size: int,
+        redis_url: Optional[str] = None,
+        prefix: str = "jordy:seen",
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.local = RecentIdSet(ttl_seconds, local_max_size)
+        self.redis = None
+        if redis_url:
+            import redis.asyncio as redis
+
+            self.redis = redis.Redis.from_url(redis_url)
+        self.duplicates = 0
+        self.redis_errors = 0
+
+    async def seen(self, project_id: UUID, trace_ids: List[UUID]) -> Set[UUID]:
+        """
+        The subset of `trace_ids` already written for this project.
+        """
+        found = {trace_id for trace_id in trace_ids if (project_id, trace_id) in self.local}
+        rest = [trace_id for trace_id in trace_ids if trace_id not in found]
+        if rest and self.redis is not None:
+            try:
+                values = await self.redis.mget([self._key(project_id, trace_id) for trace_id in rest])
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Trace dedup lookup failed, relying on the database: {e}")
+            else:
+                shared = {trace_id for trace_id, value in zip(rest, values) if value is not None}
+                self.local.add_many((project_id, trace_id) for trace_id in shared)
+                found |= shared
+        self.duplicates += len(found)
+        return found
+
+    async def mark(self, project_id: UUID, trace_ids: List[UUID]):
+        """
+        Remember trace ids once their rows are committed.
+        """
+        if not trace_ids:
+            return
+        self.local.add_many((project_id, trace_id) for trace_id in trace_ids)
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for trace_id in trace_ids:
+                    pipe.set(self._key(project_id, trace_id), 1, ex=int(self.ttl_seconds))
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Failed to share seen trace ids: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.local),
+            "duplicates": self.duplicates,
+            "redis_errors": self.redis_errors,
+        }
+
+    def _key(self, project_id: UUID, trace_id: UUID) -> str:
+        return f"{self.prefix}:{project_id}:{trace_id}"
+
+
+def create_seen_traces() -> SeenTraceIds:
+    """
+    Build the seen-set configured by INGEST_DEDUP_BACKEND.
+    """
+    redis_url = None
+    if settings.INGEST_DEDUP_BACKEND == "redis":
+        redis_url = settings.REDIS_URL or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+    elif settings.INGEST_DEDUP_BACKEND != "local":
+        raise ValueError(f"Unknown ingest dedup backend: {settings.INGEST_DEDUP_BACKEND}")
+    return SeenTraceIds(
+        ttl_seconds=settings.INGEST_DEDUP_TTL_SECONDS,
+        local_max_size=settings.INGEST_DEDUP_LOCAL_MAX_SIZE,
+        redis_url=redis_url,
+    )
+
+
+seen_traces: Optional[SeenTraceIds] = None
+
+
+def get_seen_traces() -> SeenTraceIds:
+    global seen_traces
+    if seen_traces is None:
+        seen_traces = create_seen_traces()
+    return seen_traces
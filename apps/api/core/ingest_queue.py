@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from loguru import logger
+
+from .config import settings
+
+
+@dataclass
+class QueuedTrace:
+    """
+    A validated trace waiting to be written, plus the queue's handle for
+    acking it and how many times it has been handed to a worker.
+    """
+    message_id: str
+    project_id: UUID
+    payload: Dict[str, Any]
+    deliveries: int = 1
+
+
+class IngestQueueFull(Exception):
+    """
+    Raised by `publish` when the unprocessed backlog is at its limit.
+    """
+
+
+class RedisStreamQueue:
+    """
+    Durable ingest queue on a Redis Stream with a consumer group.
+
+    Messages stay in the group's pending list until acked, so a worker that
+    dies mid-batch has its messages reclaimed by another worker after
+    `claim_idle_ms`. Messages a worker gives up on are moved to the
+    `dead_letter_stream`.
+
+    Acked messages are deleted, so the stream holds only the unprocessed
+    backlog. It is never trimmed: once it reaches `maxlen` entries,
+    `publish` raises IngestQueueFull instead of evicting traces that were
+    already acknowledged to the client.
+    """
+
+    def __init__(self, url: str, stream: str, group: str, maxlen: int, claim_idle_ms: int = 60000, dead_letter_stream: Optional[str] = None):
+        import redis.asyncio as redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.stream = stream
+        self.dead_letter_stream = dead_letter_stream or f"{stream}:dead"
+        self.group = group
+        self.maxlen = maxlen
+        self.claim_idle_ms = claim_idle_ms
+        self._group_ready = False
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def publish(self, project_id: UUID, payload: Dict[str, Any]) -> str:
+        (message_id,) = await self.publish_many(project_id, [payload])
+        return message_id
+
+    async def publish_many(self, project_id: UUID, payloads: List[Dict[str, Any]]) -> List[str]:
+        """
+        Queue payloads in one round trip, or none of them if the backlog is full.
+        The check is not atomic with the adds, so concurrent publishers can
+        overshoot `maxlen` by at most one request each.
+        """
+        if not payloads:
+            return []
+        if await self.redis.xlen(self.stream) + len(payloads) > self.maxlen:
+            raise IngestQueueFull(f"Ingest backlog is at its limit of {self.maxlen} traces")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for payload in payloads:
+                pipe.xadd(self.stream, {"project_id": str(project_id), "payload": json.dumps(payload)})
+            message_ids = await pipe.execute()
+        return [m.decode() if isinstance(m, bytes) else m for m in message_ids]
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[QueuedTrace]:
+        await self._ensure_group()
+
+        # Messages abandoned by a crashed consumer come first
+        _, claimed, *_ = await self.redis.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=count
+        )
+        entries = list(claimed)
+        deliveries = await self._delivery_counts(consumer, [message_id for message_id, _ in entries])
+        if len(entries) < count:
+            response = await self.redis.xreadgroup(
+                self.group, consumer, {self.stream: ">"}, count=count - len(entries), block=block_ms
+            )
+            for _, stream_entries in response or []:
+                entries.extend(stream_entries)
+
+        messages = []
+        for message_id, fields in entries:
+            if fields:
+                message = self._decode(message_id, fields)
+                message.deliveries = deliveries.get(message.message_id, 1)
+                messages.append(message)
+        return messages
+
+    async def _delivery_counts(self, consumer: str, message_ids: List[Any]) -> Dict[str, int]:
+        # XAUTOCLAIM bumps the delivery counter but does not return it. Each id
+        # is looked up on its own: a range query would also match (and count
+        # against its limit) other entries pending between the claimed ids.
+        if not message_ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for message_id in message_ids:
+                pipe.xpending_range(
+                    self.stream, self.group, min=message_id, max=message_id, count=1, consumername=consumer
+                )
+            results = await pipe.execute()
+        counts = {}
+        for pending in results:
+            for entry in pending:
+                message_id = entry["message_id"]
+                counts[message_id.decode() if isinstance(message_id, bytes) else message_id] = entry["times_delivered"]
+        return counts
+
+    async def ack(self, message_ids: List[str]):
+        if not message_ids:
+            return
+        await self.redis.xack(self.stream, self.group, *message_ids)
+        await self.redis.xdel(self.stream, *message_ids)
+
+    async def dead_letter(self, message: QueuedTrace, error: str):
+        await self.redis.xadd(
+            self.dead_letter_stream,
+            {"project_id": str(message.project_id), "payload": json.dumps(message.payload), "error": error},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        await self.ack([message.message_id])
+
+    async def close(self):
+        await self.redis.close()
+
+    @staticmethod
+    def _decode(message_id: Any, fields: Dict[bytes, bytes]) -> QueuedTrace:
+        return QueuedTrace(
+            message_id=message_id.decode() if isinstance(message_id, bytes) else message_id,
+            project_id=UUID(fields[b"project_id"].decode()),
+            payload=json.loads(fields[b"payload"]),
+        )
+
+
+class FileQueue:
+    """
+    Append-only file-backed ingest queue for single-process deployments and tests.
+
+    Each message is one JSON line. The committed read offset is persisted next
+    to the log so unacked messages are redelivered after a restart, and
+    in-process after `visibility_timeout` seconds. Dead-lettered messages are
+    appended to `dead.log` in the same directory.
+    """
+
+    COMPACT_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: str, fsync: bool = False, visibility_timeout: float = 60.0):
+        os.makedirs(path, exist_ok=True)
+        self.log_path = os.path.join(path, "queue.log")
+        self.offset_path = os.path.join(path, "queue.offset")
+        self.dead_letter_path = os.path.join(path, "dead.log")
+        self.fsync = fsync
+        self.visibility_timeout = visibility_timeout
+
+        self._write_lock = threading.Lock()
+        self._read_lock = asyncio.Lock()
+        self._committed = self._load_offset()
+        self._read_pos = self._committed
+        # end offset -> (start offset, redelivery deadline, message)
+        self._pending: Dict[int, Tuple[int, float, QueuedTrace]] = {}
+        self._acked: set = set()
+        self._log = open(self.log_path, "ab")
+
+    def _load_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _append(self, line: bytes):
+        with self._write_lock:
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+
+    async def publish(self, project_id: UUID, payload: Dict[str, Any]) -> str:
+        (message_id,) = await self.publish_many(project_id, [payload])
+        return message_id
+
+    async def publish_many(self, project_id: UUID, payloads: List[Dict[str, Any]]) -> List[str]:
+        # Bounded only by disk space; a full disk fails the request instead of dropping
+        lines = b"".join(
+            json.dumps({"project_id": str(project_id), "payload": payload}).encode() + b"\n" for payload in payloads
+        )
+        if lines:
+            await asyncio.to_thread(self._append, lines)
+        return ["file"] * len(payloads)
+
+    def _read_new(self, count: int) -> List[Tuple[int, int, bytes]]:
+        lines = []
+        with open(self.log_path, "rb") as f:
+            f.seek(self._read_pos)
+            while len(lines) < count:
+                start = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # nothing new, or a write still in progress
+                lines.append((start, f.tell(), line))
+        return lines
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[QueuedTrace]:
+        deadline = time.monotonic() + block_ms / 1000
+        while True:
+            async with self._read_lock:
+                now = time.monotonic()
+                batch = []
+                for end, (start, expires, message) in list(self._pending.items()):
+                    if len(batch) >= count:
+                        break
+                    if expires <= now and end not in self._acked:
+                        message.deliveries += 1
+                        self._pending[end] = (start, now + self.visibility_timeout, message)
+                        batch.append(message)
+
+                if len(batch) < count:
+                    for start, end, line in await asyncio.to_thread(self._read_new, count - len(batch)):
+                        record = json.loads(line)
+                        message = QueuedTrace(
+                            message_id=str(end),
+                            project_id=UUID(record["project_id"]),
+                            payload=record["payload"],
+                        )
+                        self._pending[end] = (start, now + self.visibility_timeout, message)
+                        self._read_pos = end
+                        batch.append(message)
+
+            if batch or time.monotonic() >= deadline:
+                return batch
+            await asyncio.sleep(0.05)
+
+    async def ack(self, message_ids: List[str]):
+        async with self._read_lock:
+            for message_id in message_ids:
+                end = int(message_id)
+                if end in self._pending:
+                    self._acked.add(end)
+
+            # Advance the committed offset over the contiguous acked prefix
+            advanced = False
+            for end in sorted(self._pending):
+                start = self._pending[end][0]
+                if end not in self._acked or start != self._committed:
+                    break
+                del self._pending[end]
+                self._acked.discard(end)
+                self._committed = end
+                advanced = True
+
+            if advanced:
+                await asyncio.to_thread(self._save_offset, self._committed)
+                if not self._pending and self._committed >= self.COMPACT_BYTES:
+                    if await asyncio.to_thread(self._compact):
+                        self._committed = self._read_pos = 0
+
+    async def dead_letter(self, message: QueuedTrace, error: str):
+        line = json.dumps({"project_id": str(message.project_id), "payload": message.payload, "error": error}).encode() + b"\n"
+        await asyncio.to_thread(self._append_dead_letter, line)
+        await self.ack([message.message_id])
+
+    def _append_dead_letter(self, line: bytes):
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(line)
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _compact(self) -> bool:
+        # Only a fully drained log is truncated, so no offsets need rewriting
+        with self._write_lock:
+            if os.path.getsize(self.log_path) != self._committed:
+                return False
+            self._log.truncate(0)
+            self._save_offset(0)
+            return True
+
+    def _save_offset(self, offset: int):
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self.offset_path)
+
+    async def close(self):
+        self._log.close()
+
+
+def create_ingest_queue():
+    """
+    Build the ingest queue configured by INGEST_QUEUE_BACKEND.
+    """
+    if settings.INGEST_QUEUE_BACKEND == "redis":
+        url = settings.REDIS_URL or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+        return RedisStreamQueue(
+            url,
+            stream=settings.INGEST_QUEUE_STREAM,
+            group=settings.INGEST_QUEUE_GROUP,
+            maxlen=settings.INGEST_QUEUE_MAXLEN,
+            dead_letter_stream=settings.INGEST_DEAD_LETTER_STREAM,
+        )
+    if settings.INGEST_QUEUE_BACKEND == "file":
+        return FileQueue(settings.INGEST_QUEUE_PATH, fsync=settings.INGEST_QUEUE_FSYNC)
+    raise ValueError(f"Unknown ingest queue backend: {settings.INGEST_QUEUE_BACKEND}")
+
+
+ingest_queue: Optional[Any] = None
+
+
+def get_ingest_queue():
+    global ingest_queue
+    if ingest_queue is None:
+        ingest_queue = create_ingest_queue()
+        logger.info(f"Using {settings.INGEST_QUEUE_BACKEND} ingest queue")
+    return ingest_queue
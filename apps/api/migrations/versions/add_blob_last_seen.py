@@ -0,0 +1,23 @@
+"""Track when payload blobs were last referenced
+
+Revision ID: 014
+Revises: 013
+Create Date: 2025-08-06
+
+Retention deletes blobs no row has written or referenced since its cutoff,
+so existing rows start from their creation time.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '014'
+down_revision = '013'
+
+def upgrade():
+    op.add_column('payload_blobs', sa.Column('last_seen_at', sa.DateTime(), server_default=sa.text("(now() AT TIME ZONE 'utc')")))
+    op.execute("UPDATE payload_blobs SET last_seen_at = created_at WHERE created_at IS NOT NULL")
+    op.create_index('ix_payload_blobs_project_last_seen', 'payload_blobs', ['project_id', 'last_seen_at'])
+
+def downgrade():
+    op.drop_index('ix_payload_blobs_project_last_seen', table_name='payload_blobs')
+    op.drop_column('payload_blobs', 'last_seen_at')
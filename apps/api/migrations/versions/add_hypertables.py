@@ -0,0 +1,123 @@
+"""Convert traces and spans to TimescaleDB hypertables
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-06-18
+
+Both tables are partitioned on start_time with native compression for older
+chunks. Chunk sizes and the compression horizon can be tuned per deployment:
+
+    alembic -x traces_chunk_interval="12 hours" -x compress_after="3 days" upgrade head
+
+Timescale requires every unique index on a hypertable to contain the
+partitioning column, and foreign keys may not point at a hypertable, so the
+primary keys become (id, start_time) and the FKs into traces/spans are
+dropped. The ORM models mirror this: composite primary keys and plain
+indexed reference columns, with RetentionService deleting dependents itself.
+
+Downgrading copies both tables back into plain tables (decompressing every
+chunk first), so it needs free space for a second copy of the data.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = '007'
+down_revision = '006'
+
+# Constraints that reference traces or spans (Postgres default FK names)
+REFERENCING_FKS = [
+    ('spans', 'spans_trace_id_fkey'),
+    ('spans', 'spans_parent_span_id_fkey'),
+    ('evaluations', 'evaluations_trace_id_fkey'),
+    ('evaluations', 'evaluations_span_id_fkey'),
+    ('feedback', 'feedback_trace_id_fkey'),
+    ('dataset_items', 'dataset_items_trace_id_fkey'),
+    ('dataset_items', 'dataset_items_span_id_fkey'),
+]
+
+# FKs the pre-hypertable revisions created, restored on downgrade. They are
+# added NOT VALID: rows written without them may reference deleted parents.
+RESTORED_FKS = [
+    ('spans', 'spans_trace_id_fkey', 'trace_id', 'traces'),
+    ('evaluations', 'evaluations_span_id_fkey', 'span_id', 'spans'),
+]
+
+def _options():
+    args = context.get_x_argument(as_dictionary=True)
+    return {
+        'traces_chunk_interval': args.get('traces_chunk_interval', '1 day'),
+        'spans_chunk_interval': args.get('spans_chunk_interval', '1 day'),
+        'compress_after': args.get('compress_after', '7 days'),
+    }
+
+def upgrade():
+    options = _options()
+    op.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+
+    for table, constraint in REFERENCING_FKS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+
+    for table in ('traces', 'spans'):
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, start_time)")
+        # Point lookups by id no longer have a unique index of their own
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_id ON {table} (id)")
+
+    op.execute(
+        "SELECT create_hypertable('traces', 'start_time', "
+        f"chunk_time_interval => INTERVAL '{options['traces_chunk_interval']}', "
+        "migrate_data => true, if_not_exists => true)"
+    )
+    op.execute(
+        "SELECT create_hypertable('spans', 'start_time', "
+        f"chunk_time_interval => INTERVAL '{options['spans_chunk_interval']}', "
+        "migrate_data => true, if_not_exists => true)"
+    )
+
+    # Segment traces by project (dashboards always filter on it); spans are
+    # ordered by trace so a trace's rows stay adjacent inside compressed batches
+    op.execute(
+        "ALTER TABLE traces SET (timescaledb.compress, "
+        "timescaledb.compress_segmentby = 'project_id', "
+        "timescaledb.compress_orderby = 'start_time DESC, id')"
+    )
+    op.execute(
+        "ALTER TABLE spans SET (timescaledb.compress, "
+        "timescaledb.compress_orderby = 'trace_id, start_time, id')"
+    )
+    for table in ('traces', 'spans'):
+        op.execute(
+            f"SELECT add_compression_policy('{table}', INTERVAL '{options['compress_after']}', if_not_exists => true)"
+        )
+
+def downgrade():
+    bind = op.get_bind()
+    for table in ('traces', 'spans'):
+        op.execute(f"SELECT remove_compression_policy('{table}', if_exists => true)")
+        op.execute(f"SELECT decompress_chunk(c, true) FROM show_chunks('{table}') c")
+
+        # Secondary indexes are rebuilt by definition on the plain table; the
+        # id index and Timescale's default time index only served the hypertable
+        indexes = bind.execute(
+            sa.text(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() AND tablename = :table"
+            ),
+            {'table': table},
+        ).all()
+        skip = {f'{table}_pkey', f'ix_{table}_id', f'{table}_start_time_idx'}
+
+        op.execute(f"CREATE TABLE {table}_plain (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        op.execute(f"INSERT INTO {table}_plain SELECT * FROM {table}")
+        op.execute(f"DROP TABLE {table}")
+        op.execute(f"ALTER TABLE {table}_plain RENAME TO {table}")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        for name, definition in indexes:
+            if name not in skip:
+                op.execute(definition)
+
+    for table, constraint, column, target in RESTORED_FKS:
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+            f"FOREIGN KEY ({column}) REFERENCES {target} (id) NOT VALID"
+        )
@@ -0,0 +1,29 @@
+"""Add keyset pagination indexes
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-06-10
+"""
+from alembic import op
+
+revision = '006'
+down_revision = '005'
+
+INDEXES = [
+    ('ix_spans_trace_time', 'spans', ['trace_id', 'start_time', 'id']),
+    ('ix_evaluations_created', 'evaluations', ['created_at', 'id']),
+    ('ix_evaluations_trace_created', 'evaluations', ['trace_id', 'created_at']),
+    ('ix_datasets_project_created', 'datasets', ['project_id', 'created_at']),
+    ('ix_dataset_items_dataset_created', 'dataset_items', ['dataset_id', 'created_at', 'id']),
+]
+
+def upgrade():
+    # Built concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,77 @@
+"""Add latency sketches to metric rollups
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-06-28
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = '009'
+down_revision = '008'
+
+# Must match api.utils.sketch
+MIN_VALUE = 1e-3
+LOG_GAMMA = 0.020000666706669435  # ln(1.01 / 0.99)
+
+def upgrade():
+    op.add_column('metric_rollups', sa.Column('latency_bins', JSONB(), server_default='{}', nullable=False))
+    op.add_column('metric_rollups', sa.Column('latency_zero_count', sa.Integer(), server_default='0'))
+
+    # Adds two {bin: count} objects key by key; used by the ingest upsert
+    op.execute("""
+        CREATE OR REPLACE FUNCTION jordy_merge_counts(a jsonb, b jsonb) RETURNS jsonb AS $$
+            SELECT coalesce(jsonb_object_agg(key, total), '{}'::jsonb)
+            FROM (
+                SELECT key, sum(value::bigint) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(coalesce(a, '{}'::jsonb))
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(coalesce(b, '{}'::jsonb))
+                ) AS pairs
+                GROUP BY key
+            ) AS merged
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+    # Aggregate form so dashboards can merge a window's sketches in one row
+    op.execute("""
+        CREATE AGGREGATE jordy_merge_counts_agg(jsonb) (
+            SFUNC = jordy_merge_counts, STYPE = jsonb, INITCOND = '{}'
+        )
+    """)
+
+    # Backfill sketches for existing buckets from raw rows
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute(f"""
+            UPDATE metric_rollups r
+            SET latency_bins = b.bins, latency_zero_count = b.zero_count
+            FROM (
+                SELECT project_id, bucket, model,
+                       coalesce(jsonb_object_agg(idx, n) FILTER (WHERE idx IS NOT NULL), '{{}}'::jsonb) AS bins,
+                       coalesce(sum(n) FILTER (WHERE idx IS NULL), 0) AS zero_count
+                FROM (
+                    SELECT project_id, date_trunc('{granularity}', start_time) AS bucket, '' AS model,
+                           CASE WHEN latency_ms > {MIN_VALUE} THEN ceil(ln(latency_ms) / {LOG_GAMMA})::int END AS idx,
+                           count(*) AS n
+                    FROM traces WHERE latency_ms IS NOT NULL
+                    GROUP BY 1, 2, 3, 4
+                    UNION ALL
+                    SELECT t.project_id, date_trunc('{granularity}', s.start_time), s.model,
+                           CASE WHEN s.latency_ms > {MIN_VALUE} THEN ceil(ln(s.latency_ms) / {LOG_GAMMA})::int END,
+                           count(*)
+                    FROM spans s JOIN traces t ON t.id = s.trace_id
+                    WHERE s.model IS NOT NULL AND s.latency_ms IS NOT NULL
+                    GROUP BY 1, 2, 3, 4
+                ) AS binned
+                GROUP BY project_id, bucket, model
+            ) AS b
+            WHERE r.project_id = b.project_id AND r.granularity = '{granularity}'
+              AND r.bucket_start = b.bucket AND r.model = b.model
+        """)
+
+def downgrade():
+    op.execute("DROP AGGREGATE IF EXISTS jordy_merge_counts_agg(jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS jordy_merge_counts(jsonb, jsonb)")
+    op.drop_column('metric_rollups', 'latency_zero_count')
+    op.drop_column('metric_rollups', 'latency_bins')
@@ -0,0 +1,68 @@
+"""Add metric rollups
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-06-25
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '008'
+down_revision = '007'
+
+def upgrade():
+    op.create_table('metric_rollups',
+        sa.Column('project_id', UUID(as_uuid=True), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('granularity', sa.String(10), primary_key=True),
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('model', sa.String(100), primary_key=True, server_default=''),
+        sa.Column('trace_count', sa.Integer(), server_default='0'),
+        sa.Column('span_count', sa.Integer(), server_default='0'),
+        sa.Column('error_count', sa.Integer(), server_default='0'),
+        sa.Column('total_tokens', sa.BigInteger(), server_default='0'),
+        sa.Column('prompt_tokens', sa.BigInteger(), server_default='0'),
+        sa.Column('completion_tokens', sa.BigInteger(), server_default='0'),
+        sa.Column('cost_usd', sa.Float(), server_default='0'),
+        sa.Column('latency_count', sa.Integer(), server_default='0'),
+        sa.Column('latency_sum_ms', sa.Float(), server_default='0'),
+        sa.Column('latency_min_ms', sa.Float(), nullable=True),
+        sa.Column('latency_max_ms', sa.Float(), nullable=True),
+    )
+
+    # Backfill from existing raw rows; new data is rolled up at ingest time
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute(f"""
+            INSERT INTO metric_rollups (
+                project_id, granularity, bucket_start, model,
+                trace_count, span_count, error_count,
+                total_tokens, prompt_tokens, completion_tokens, cost_usd,
+                latency_count, latency_sum_ms, latency_min_ms, latency_max_ms
+            )
+            SELECT project_id, '{granularity}', date_trunc('{granularity}', start_time), '',
+                   count(*), 0, count(*) FILTER (WHERE status = 'FAILED'),
+                   coalesce(sum(total_tokens), 0), coalesce(sum(prompt_tokens), 0),
+                   coalesce(sum(completion_tokens), 0), coalesce(sum(total_cost_usd), 0),
+                   count(latency_ms), coalesce(sum(latency_ms), 0), min(latency_ms), max(latency_ms)
+            FROM traces
+            GROUP BY project_id, date_trunc('{granularity}', start_time)
+        """)
+        op.execute(f"""
+            INSERT INTO metric_rollups (
+                project_id, granularity, bucket_start, model,
+                trace_count, span_count, error_count,
+                total_tokens, prompt_tokens, completion_tokens, cost_usd,
+                latency_count, latency_sum_ms, latency_min_ms, latency_max_ms
+            )
+            SELECT t.project_id, '{granularity}', date_trunc('{granularity}', s.start_time), s.model,
+                   0, count(*), count(*) FILTER (WHERE s.status = 'error'),
+                   coalesce(sum(s.total_tokens), 0), coalesce(sum(s.prompt_tokens), 0),
+                   coalesce(sum(s.completion_tokens), 0), coalesce(sum(s.cost_usd), 0),
+                   count(s.latency_ms), coalesce(sum(s.latency_ms), 0), min(s.latency_ms), max(s.latency_ms)
+            FROM spans s JOIN traces t ON t.id = s.trace_id
+            WHERE s.model IS NOT NULL
+            GROUP BY t.project_id, date_trunc('{granularity}', s.start_time), s.model
+        """)
+
+def downgrade():
+    op.drop_table('metric_rollups')
@@ -0,0 +1,62 @@
+"""Add model prices
+
+Revision ID: 012
+Revises: 011
+Create Date: 2025-07-16
+"""
+import uuid
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '012'
+down_revision = '011'
+
+# Global list prices in USD per 1k tokens (prompt, completion), effective for all history
+SEED_PRICES = [
+    ('gpt-4o', 0.0025, 0.01),
+    ('gpt-4o-mini', 0.00015, 0.0006),
+    ('gpt-4-turbo', 0.01, 0.03),
+    ('gpt-4', 0.03, 0.06),
+    ('gpt-3.5-turbo', 0.0005, 0.0015),
+    ('text-embedding-3-small', 0.00002, 0.0),
+    ('text-embedding-3-large', 0.00013, 0.0),
+    ('claude-3-5-sonnet', 0.003, 0.015),
+    ('claude-3-opus', 0.015, 0.075),
+    ('claude-3-sonnet', 0.003, 0.015),
+    ('claude-3-haiku', 0.00025, 0.00125),
+]
+
+def upgrade():
+    op.create_table('model_prices',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('organization_id', UUID(as_uuid=True), sa.ForeignKey('organizations.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('model', sa.String(100), nullable=False),
+        sa.Column('prompt_usd_per_1k', sa.Float(), nullable=False),
+        sa.Column('completion_usd_per_1k', sa.Float(), nullable=False),
+        sa.Column('effective_from', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()')),
+        sa.UniqueConstraint('organization_id', 'model', 'effective_from', name='uq_model_price_version'),
+    )
+    prices = sa.table('model_prices',
+        sa.column('id', UUID(as_uuid=True)),
+        sa.column('model', sa.String),
+        sa.column('prompt_usd_per_1k', sa.Float),
+        sa.column('completion_usd_per_1k', sa.Float),
+        sa.column('effective_from', sa.DateTime),
+    )
+    op.bulk_insert(prices, [
+        {
+            'id': uuid.uuid4(),
+            'model': model,
+            'prompt_usd_per_1k': prompt,
+            'completion_usd_per_1k': completion,
+            'effective_from': datetime(1970, 1, 1),
+        }
+        for model, prompt, completion in SEED_PRICES
+    ])
+
+def downgrade():
+    op.drop_table('model_prices')
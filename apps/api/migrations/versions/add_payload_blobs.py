@@ -0,0 +1,24 @@
+"""Add payload blobs
+
+Revision ID: 011
+Revises: 010
+Create Date: 2025-07-09
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '011'
+down_revision = '010'
+
+def upgrade():
+    op.create_table('payload_blobs',
+        sa.Column('project_id', UUID(as_uuid=True), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('digest', sa.String(71), primary_key=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()')),
+    )
+
+def downgrade():
+    op.drop_table('payload_blobs')
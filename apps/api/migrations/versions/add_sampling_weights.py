@@ -0,0 +1,69 @@
+"""Add sampling weights
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-07-02
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '010'
+down_revision = '009'
+
+EST_COLUMNS = {
+    'est_trace_count': 'trace_count',
+    'est_span_count': 'span_count',
+    'est_error_count': 'error_count',
+    'est_total_tokens': 'total_tokens',
+    'est_cost_usd': 'cost_usd',
+    'est_latency_count': 'latency_count',
+    'est_latency_sum_ms': 'latency_sum_ms',
+}
+
+def upgrade():
+    op.add_column('traces', sa.Column('sample_rate', sa.Float(), server_default='1.0', nullable=False))
+
+    for column in EST_COLUMNS:
+        op.add_column('metric_rollups', sa.Column(column, sa.Float(), server_default='0'))
+    # Existing data was never sampled, so estimates equal the raw counters
+    op.execute("UPDATE metric_rollups SET " + ", ".join(
+        f"{est} = {raw}" for est, raw in EST_COLUMNS.items()
+    ))
+
+    # Sketch bins now hold weights rather than integer counts
+    op.alter_column('metric_rollups', 'latency_zero_count', type_=sa.Float(), server_default='0')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION jordy_merge_counts(a jsonb, b jsonb) RETURNS jsonb AS $$
+            SELECT coalesce(jsonb_object_agg(key, total), '{}'::jsonb)
+            FROM (
+                SELECT key, sum(value::numeric) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(coalesce(a, '{}'::jsonb))
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(coalesce(b, '{}'::jsonb))
+                ) AS pairs
+                GROUP BY key
+            ) AS merged
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION jordy_merge_counts(a jsonb, b jsonb) RETURNS jsonb AS $$
+            SELECT coalesce(jsonb_object_agg(key, total), '{}'::jsonb)
+            FROM (
+                SELECT key, sum(value::numeric)::bigint AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(coalesce(a, '{}'::jsonb))
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(coalesce(b, '{}'::jsonb))
+                ) AS pairs
+                GROUP BY key
+            ) AS merged
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+    op.alter_column('metric_rollups', 'latency_zero_count', type_=sa.Integer(), server_default='0',
+                    postgresql_using='round(latency_zero_count)::integer')
+    for column in EST_COLUMNS:
+        op.drop_column('metric_rollups', column)
+    op.drop_column('traces', 'sample_rate')
@@ -0,0 +1,25 @@
+"""Store payload blobs compressed
+
+Revision ID: 013
+Revises: 012
+Create Date: 2025-07-23
+
+New blobs go to the bytea `data` column, compressed. Existing rows keep
+their text in `content` and stay readable.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '013'
+down_revision = '012'
+
+def upgrade():
+    op.add_column('payload_blobs', sa.Column('data', sa.LargeBinary(), nullable=True))
+    op.alter_column('payload_blobs', 'content', existing_type=sa.Text(), nullable=True)
+    # Compressed blobs gain nothing from TOAST's own pglz pass
+    op.execute("ALTER TABLE payload_blobs ALTER COLUMN data SET STORAGE EXTERNAL")
+
+def downgrade():
+    op.execute("DELETE FROM payload_blobs WHERE content IS NULL")
+    op.alter_column('payload_blobs', 'content', existing_type=sa.Text(), nullable=False)
+    op.drop_column('payload_blobs', 'data')
@@ -11,7 +11,7 @@ from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
     Column, String, DateTime, ForeignKey, Float, JSON, Text, 
-    Boolean, Integer, Enum, Index, UniqueConstraint, event
+    Boolean, Integer, BigInteger, Enum, Index, UniqueConstraint, event, LargeBinary
 )
 from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
 from sqlalchemy.orm import relationship, backref
@@ -193,8 +193,8 @@ class Trace(Base):
     status = Column(Enum(TraceStatus), default=TraceStatus.RUNNING)
     error_message = Column(Text, nullable=True)
     
-    # Timing
-    start_time = Column(DateTime, nullable=False, index=True)
+    # Timing (part of the primary key: traces is a hypertable on start_time)
+    start_time = Column(DateTime, primary_key=True, nullable=False, index=True)
     end_time = Column(DateTime, nullable=True)
     
     # I/O
@@ -207,6 +207,8 @@ class Trace(Base):
     completion_tokens = Column(Integer, default=0)
     total_cost_usd = Column(Float, default=0.0)
     latency_ms = Column(Float, nullable=True)
+    # Head sampling probability reported by the SDK (1.0 = unsampled)
+    sample_rate = Column(Float, default=1.0)
     
     # Metadata
     metadata = Column(JSONB, default={})
@@ -214,11 +216,22 @@ class Trace(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationships
+    # Relationships. Nothing references traces with a real FK (hypertables can't
+    # be FK targets), so the joins are explicit and there are no DB cascades:
+    # RetentionService deletes spans, evaluations and feedback itself.
     project = relationship("Project", back_populates="traces")
-    spans = relationship("Span", back_populates="trace", cascade="all, delete-orphan", order_by="Span.start_time")
-    evaluations = relationship("Evaluation", back_populates="trace", cascade="all, delete-orphan")
-    feedback = relationship("Feedback", back_populates="trace", cascade="all, delete-orphan")
+    spans = relationship(
+        "Span", back_populates="trace", cascade="all, delete-orphan", order_by="Span.start_time",
+        primaryjoin="Trace.id == foreign(Span.trace_id)",
+    )
+    evaluations = relationship(
+        "Evaluation", back_populates="trace", cascade="all, delete-orphan",
+        primaryjoin="Trace.id == foreign(Evaluation.trace_id)",
+    )
+    feedback = relationship(
+        "Feedback", back_populates="trace", cascade="all, delete-orphan",
+        primaryjoin="Trace.id == foreign(Feedback.trace_id)",
+    )
     
     # Indexes
     __table_args__ = (
@@ -242,15 +255,17 @@ class Span(Base):
     __tablename__ = "spans"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    trace_id = Column(UUID(as_uuid=True), ForeignKey("traces.id", ondelete="CASCADE"), nullable=False)
-    parent_span_id = Column(UUID(as_uuid=True), ForeignKey("spans.id", ondelete="SET NULL"), nullable=True)
+    # Plain columns, not FKs: traces and spans are hypertables (see Trace).
+    # trace_id is indexed through ix_spans_trace_time
+    trace_id = Column(UUID(as_uuid=True), nullable=False)
+    parent_span_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     
     # Identity
     name = Column(String(255), nullable=False)
     span_type = Column(Enum(SpanType), nullable=False, index=True)
     
-    # Timing
-    start_time = Column(DateTime, nullable=False)
+    # Timing (part of the primary key, like Trace.start_time)
+    start_time = Column(DateTime, primary_key=True, nullable=False)
     end_time = Column(DateTime, nullable=True)
     latency_ms = Column(Float, nullable=True)
     
@@ -286,14 +301,122 @@ class Span(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    trace = relationship("Trace", back_populates="spans")
-    parent = relationship("Span", remote_side=[id], backref=backref("children", cascade="all, delete-orphan"))
-    evaluations = relationship("Evaluation", back_populates="span", cascade="all, delete-orphan")
+    trace = relationship("Trace", back_populates="spans", primaryjoin="foreign(Span.trace_id) == Trace.id")
+    parent = relationship(
+        "Span", primaryjoin="foreign(Span.parent_span_id) == remote(Span.id)",
+        backref=backref("children", cascade="all, delete-orphan"),
+    )
+    evaluations = relationship(
+        "Evaluation", back_populates="span", cascade="all, delete-orphan",
+        primaryjoin="Span.id == foreign(Evaluation.span_id)",
+    )
     prompt_version = relationship("PromptVersion", back_populates="spans")
     
     __table_args__ = (
         Index("ix_spans_trace_type", "trace_id", "span_type"),
         Index("ix_spans_model", "model"),
+        Index("ix_spans_trace_time", "trace_id", "start_time", "id"),
+    )
+
+
+# ============================================================================
+# METRIC ROLLUP MODELS
+# ============================================================================
+
+class MetricRollup(Base):
+    """
+    Pre-aggregated project metrics per time bucket, maintained incrementally on ingest.
+    Rows with an empty `model` aggregate whole traces; rows with a model name
+    aggregate that model's LLM spans. Dashboards read these instead of raw rows.
+    """
+    __tablename__ = "metric_rollups"
+    
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    granularity = Column(String(10), primary_key=True)  # minute, hour, day
+    bucket_start = Column(DateTime, primary_key=True)
+    model = Column(String(100), primary_key=True, default="")
+    
+    # Volume
+    trace_count = Column(Integer, default=0)
+    span_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    
+    # Usage
+    total_tokens = Column(BigInteger, default=0)
+    prompt_tokens = Column(BigInteger, default=0)
+    completion_tokens = Column(BigInteger, default=0)
+    cost_usd = Column(Float, default=0.0)
+    
+    # Latency (traces for trace-level rows, spans for model rows)
+    latency_count = Column(Integer, default=0)
+    latency_sum_ms = Column(Float, default=0.0)
+    latency_min_ms = Column(Float, nullable=True)
+    latency_max_ms = Column(Float, nullable=True)
+    # Mergeable DDSketch of latencies: {bin index: weight} plus the zero bucket
+    latency_bins = Column(JSONB, default={})
+    latency_zero_count = Column(Float, default=0.0)
+    
+    # Sampling-corrected estimates: each received trace weighted by 1 / sample_rate
+    est_trace_count = Column(Float, default=0.0)
+    est_span_count = Column(Float, default=0.0)
+    est_error_count = Column(Float, default=0.0)
+    est_total_tokens = Column(Float, default=0.0)
+    est_cost_usd = Column(Float, default=0.0)
+    est_latency_count = Column(Float, default=0.0)
+    est_latency_sum_ms = Column(Float, default=0.0)
+
+
+# ============================================================================
+# PAYLOAD BLOB MODELS
+# ============================================================================
+
+class PayloadBlob(Base):
+    """
+    Large span/trace payload fields stored once and referenced by content hash
+    (the Postgres backend of BlobStore). Inputs and outputs hold
+    `{"$blob": "sha256:...", "bytes": n, "preview": "..."}` in place of the
+    offloaded text, plus `"format": "json"` when a whole field was offloaded.
+    """
+    __tablename__ = "payload_blobs"
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    digest = Column(String(71), primary_key=True)  # "sha256:" + hex of the uncompressed bytes
+    data = Column(LargeBinary, nullable=True)  # zstd/zlib compressed
+    content = Column(Text, nullable=True)  # uncompressed text of rows written before `data`
+    size_bytes = Column(Integer, nullable=False)  # uncompressed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Last written or referenced by ingested rows; retention deletes blobs unseen since its cutoff
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_payload_blobs_project_last_seen", "project_id", "last_seen_at"),
+    )
+
+
+# ============================================================================
+# PRICING MODELS
+# ============================================================================
+
+class ModelPrice(Base):
+    """
+    One version of a model's token prices. A price applies from `effective_from`
+    until the next version of the same model; rows with an organization_id
+    override the global (NULL) price for that organization. Rows are never
+    edited in place: a price change is a new version.
+    """
+    __tablename__ = "model_prices"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), nullable=True)
+    # Matched against span.model exactly or as the longest prefix ("gpt-4o" covers "gpt-4o-2024-08-06")
+    model = Column(String(100), nullable=False)
+    prompt_usd_per_1k = Column(Float, nullable=False)
+    completion_usd_per_1k = Column(Float, nullable=False)
+    effective_from = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("organization_id", "model", "effective_from", name="uq_model_price_version"),
     )
 
 
@@ -309,8 +432,10 @@ class Evaluation(Base):
     __tablename__ = "evaluations"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    trace_id = Column(UUID(as_uuid=True), ForeignKey("traces.id", ondelete="CASCADE"), nullable=True)
-    span_id = Column(UUID(as_uuid=True), ForeignKey("spans.id", ondelete="CASCADE"), nullable=True)
+    # Plain references into the trace/span hypertables (no FKs, see Trace);
+    # trace_id is indexed through ix_evaluations_trace_created
+    trace_id = Column(UUID(as_uuid=True), nullable=True)
+    span_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     
     # Evaluator info
     evaluator_type = Column(Enum(EvaluatorType), nullable=False, index=True)
@@ -327,11 +452,13 @@ class Evaluation(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    trace = relationship("Trace", back_populates="evaluations")
-    span = relationship("Span", back_populates="evaluations")
+    trace = relationship("Trace", back_populates="evaluations", primaryjoin="foreign(Evaluation.trace_id) == Trace.id")
+    span = relationship("Span", back_populates="evaluations", primaryjoin="foreign(Evaluation.span_id) == Span.id")
     
     __table_args__ = (
         Index("ix_evaluations_type_score", "evaluator_type", "score"),
+        Index("ix_evaluations_created", "created_at", "id"),
+        Index("ix_evaluations_trace_created", "trace_id", "created_at"),
     )
 
 
@@ -342,7 +469,8 @@ class Feedback(Base):
     __tablename__ = "feedback"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    trace_id = Column(UUID(as_uuid=True), ForeignKey("traces.id", ondelete="CASCADE"), nullable=False)
+    # Plain reference into the traces hypertable (no FK, see Trace)
+    trace_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     
     # Feedback type
     score = Column(Integer, nullable=False)  # 1-5 or thumbs up/down (-1, 1)
@@ -356,7 +484,7 @@ class Feedback(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    trace = relationship("Trace", back_populates="feedback")
+    trace = relationship("Trace", back_populates="feedback", primaryjoin="foreign(Feedback.trace_id) == Trace.id")
 
 
 # ============================================================================
@@ -453,6 +581,7 @@ class Dataset(Base):
     
     __table_args__ = (
         UniqueConstraint("project_id", "name", name="uq_dataset_project_name"),
+        Index("ix_datasets_project_created", "project_id", "created_at"),
     )
 
 
@@ -470,8 +599,10 @@ class DatasetItem(Base):
     expected_output = Column(JSONB, nullable=True)
     
     # Source trace reference
-    trace_id = Column(UUID(as_uuid=True), ForeignKey("traces.id", ondelete="SET NULL"), nullable=True)
-    span_id = Column(UUID(as_uuid=True), ForeignKey("spans.id", ondelete="SET NULL"), nullable=True)
+    # Plain references into the trace/span hypertables (no FKs, see Trace);
+    # RetentionService clears them when the trace expires
+    trace_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    span_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     
     # Annotations
     annotations = Column(JSONB, default={})
@@ -484,6 +615,10 @@ class DatasetItem(Base):
     
     # Relationships
     dataset = relationship("Dataset", back_populates="items")
+    
+    __table_args__ = (
+        Index("ix_dataset_items_dataset_created", "dataset_id", "created_at", "id"),
+    )
 
 
 # ============================================================================
@@ -7,5 +7,9 @@ from . import (
     datasets,
     webhooks,
     collaboration,
-    organizations
+    organizations,
+    blobs,
+    pricing,
+    retention,
+    analytics
 )
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.database import get_async_db
+from ..models import models
+from ..schemas import schemas
+from ..services.analytics_export import create_exporter
+from ..services.analytics_service import AnalyticsService
+
+router = APIRouter()
+
+async def _check_project(db: AsyncSession, project_id: UUID):
+    found = (await db.execute(select(models.Project.id).where(models.Project.id == project_id))).scalar_one_or_none()
+    if found is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+def _window(since: Optional[datetime], until: Optional[datetime]):
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=30)
+    if since >= until:
+        raise HTTPException(status_code=422, detail="since must be before until")
+    return since, until
+
+@router.get("/{project_id}/cost-by-user", response_model=List[schemas.UserCost])
+async def read_cost_by_user(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Cost, tokens and trace count per user over whole days (default: the last 30).
+    """
+    await _check_project(db, project_id)
+    return await AnalyticsService.cost_by_user(db, project_id, *_window(since, until))
+
+@router.get("/{project_id}/latency-by-span", response_model=List[schemas.SpanLatency])
+async def read_latency_by_span(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Span count, errors and latency per span name over whole days (default: the last 30).
+    """
+    await _check_project(db, project_id)
+    return await AnalyticsService.latency_by_span_name(db, project_id, *_window(since, until))
+
+@router.post("/{project_id}/export", response_model=schemas.ExportResult)
+async def export_project(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+    request: schemas.ExportRequest,
+):
+    """
+    Export days to Parquet now. With `since`/`until` the days are exported
+    again even if already exported (e.g. after late uploads); otherwise
+    only days not exported yet are.
+    """
+    await _check_project(db, project_id)
+    exporter = create_exporter()
+    result = schemas.ExportResult(days=0, traces=0, spans=0)
+    if request.since is None:
+        await exporter.export_pending(project_id, result, request.until)
+    else:
+        until = request.until or datetime.utcnow().date()
+        await exporter.export_window(project_id, request.since, until, result)
+    return result
@@ -0,0 +1,61 @@
+import hashlib
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from ..core.cache import CachedProject
+from ..core.config import settings
+from ..schemas import schemas
+from ..services.blob_store import get_blob_store
+from ..utils.wire import iter_body
+from .traces import get_project_by_key
+
+router = APIRouter()
+
+DIGEST_PATTERN = re.compile(r"^sha256:[0-9a-f]{64}$")
+
+def _check_digest(digest: str):
+    if not DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=422, detail="Digest must be sha256:<64 lowercase hex chars>")
+
+@router.put("/{digest}", response_model=schemas.BlobRef)
+async def upload_blob(
+    *,
+    digest: str,
+    request: Request,
+    project: CachedProject = Depends(get_project_by_key),
+):
+    """
+    Store a large payload field offloaded by the SDK, keyed by the SHA-256
+    of its UTF-8 text. The body is the raw text, optionally gzip/zstd
+    compressed (Content-Encoding). Uploading the same content again is a no-op.
+    Stored compressed in the configured blob store.
+    """
+    _check_digest(digest)
+    chunks = [data async for data in iter_body(request, settings.BLOB_MAX_BYTES)]
+    body = b"".join(chunks)
+    if "sha256:" + hashlib.sha256(body).hexdigest() != digest:
+        raise HTTPException(status_code=422, detail="Content does not match digest")
+    try:
+        body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="Blob content must be UTF-8 text")
+
+    await get_blob_store().put_many(project.id, {digest: body})
+    return schemas.BlobRef(digest=digest, size_bytes=len(body))
+
+@router.get("/{digest}", response_class=PlainTextResponse)
+async def read_blob(
+    *,
+    digest: str,
+    project: CachedProject = Depends(get_project_by_key),
+):
+    """
+    Full text of an offloaded payload field.
+    """
+    _check_digest(digest)
+    content = await get_blob_store().get(project.id, digest)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return PlainTextResponse(content.decode("utf-8"))
@@ -7,20 +7,27 @@ from sqlalchemy.orm import Session
 from ..core.database import get_db
 from ..models import models
 from ..schemas import schemas
+from ..utils.pagination import build_page, keyset_condition
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.Dataset])
+@router.get("/", response_model=schemas.Page[schemas.Dataset])
 def read_datasets(
     db: Session = Depends(get_db),
     project_id: Optional[UUID] = None,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
 ):
     query = db.query(models.Dataset)
     if project_id:
         query = query.filter(models.Dataset.project_id == project_id)
-    return query.offset(skip).limit(limit).all()
+    if cursor:
+        query = query.filter(keyset_condition(models.Dataset.created_at, models.Dataset.id, cursor))
+    datasets = query.order_by(
+        models.Dataset.created_at.desc(), models.Dataset.id.desc()
+    ).limit(limit + 1).all()
+    items, next_cursor = build_page(datasets, limit, "created_at")
+    return schemas.Page[schemas.Dataset](items=items, next_cursor=next_cursor)
 
 @router.post("/", response_model=schemas.Dataset)
 def create_dataset(
@@ -35,6 +42,25 @@ def create_dataset(
     db.refresh(db_obj)
     return db_obj
 
+@router.get("/{dataset_id}/items", response_model=schemas.Page[schemas.DatasetItem])
+def read_dataset_items(
+    *,
+    db: Session = Depends(get_db),
+    dataset_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    query = db.query(models.DatasetItem).filter(models.DatasetItem.dataset_id == dataset_id)
+    if cursor:
+        query = query.filter(
+            keyset_condition(models.DatasetItem.created_at, models.DatasetItem.id, cursor, descending=False)
+        )
+    dataset_items = query.order_by(
+        models.DatasetItem.created_at, models.DatasetItem.id
+    ).limit(limit + 1).all()
+    items, next_cursor = build_page(dataset_items, limit, "created_at")
+    return schemas.Page[schemas.DatasetItem](items=items, next_cursor=next_cursor)
+
 @router.post("/{dataset_id}/items", response_model=schemas.DatasetItem)
 def create_dataset_item(
     *,
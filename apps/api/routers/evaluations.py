@@ -7,25 +7,31 @@ from sqlalchemy.orm import Session
 from ..core.database import get_db
 from ..models import models
 from ..schemas import schemas
+from ..utils.pagination import build_page, keyset_condition
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.Evaluation])
+@router.get("/", response_model=schemas.Page[schemas.Evaluation])
 def read_evaluations(
     db: Session = Depends(get_db),
     trace_id: Optional[UUID] = None,
     span_id: Optional[UUID] = None,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
 ):
     query = db.query(models.Evaluation)
     if trace_id:
         query = query.filter(models.Evaluation.trace_id == trace_id)
     if span_id:
         query = query.filter(models.Evaluation.span_id == span_id)
+    if cursor:
+        query = query.filter(keyset_condition(models.Evaluation.created_at, models.Evaluation.id, cursor))
     
-    evals = query.offset(skip).limit(limit).all()
-    return evals
+    evals = query.order_by(
+        models.Evaluation.created_at.desc(), models.Evaluation.id.desc()
+    ).limit(limit + 1).all()
+    items, next_cursor = build_page(evals, limit, "created_at")
+    return schemas.Page[schemas.Evaluation](items=items, next_cursor=next_cursor)
 
 @router.post("/", response_model=schemas.Evaluation)
 def create_evaluation(
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.database import get_async_db
+from ..models import models
+from ..schemas import schemas
+from ..services.pricing import pricing_catalog, recompute_costs
+
+router = APIRouter()
+
+@router.get("/", response_model=List[schemas.ModelPrice])
+async def list_prices(
+    db: AsyncSession = Depends(get_async_db),
+    organization_id: Optional[UUID] = None,
+    model: Optional[str] = None,
+):
+    """
+    Price versions, newest first: global prices plus the organization's overrides.
+    """
+    query = select(models.ModelPrice).where(
+        (models.ModelPrice.organization_id.is_(None)) | (models.ModelPrice.organization_id == organization_id)
+    )
+    if model:
+        query = query.where(models.ModelPrice.model == model)
+    query = query.order_by(models.ModelPrice.model, models.ModelPrice.effective_from.desc())
+    return (await db.execute(query)).scalars().all()
+
+@router.post("/", response_model=schemas.ModelPrice)
+async def create_price(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    price_in: schemas.ModelPriceCreate,
+):
+    """
+    Add a price version. It applies to spans starting at or after
+    `effective_from`; already stored costs only change through /recompute.
+    """
+    data = price_in.model_dump()
+    data["effective_from"] = data["effective_from"] or datetime.utcnow()
+    db_price = models.ModelPrice(**data)
+    db.add(db_price)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="A price for this model and effective date already exists")
+    # This process reprices right away; others notice within PRICING_REFRESH_SECONDS
+    pricing_catalog.invalidate()
+    return db_price
+
+@router.post("/recompute", response_model=schemas.PriceRecomputeResult)
+async def recompute_prices(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    recompute_in: schemas.PriceRecompute,
+):
+    """
+    Reprice stored spans in [since, until) with the current price versions
+    and correct trace totals and rollups to match.
+    """
+    if recompute_in.until <= recompute_in.since:
+        raise HTTPException(status_code=422, detail="until must be after since")
+    return await recompute_costs(db, recompute_in)
@@ -4,6 +4,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
+from ..core.cache import invalidate_project_key
 from ..core.database import get_db
 from ..models import models
 from ..schemas import schemas
@@ -95,4 +96,31 @@ def update_project(
     db.add(project)
     db.commit()
     db.refresh(project)
+    invalidate_project_key(project.api_key)
+    return project
+
+@router.post("/{project_id}/rotate-key", response_model=schemas.Project)
+def rotate_project_key(
+    *,
+    db: Session = Depends(get_db),
+    project_id: UUID,
+):
+    """
+    Issue a new API key for a project. With PROJECT_KEY_CACHE_INVALIDATION=redis
+    every worker rejects the old key immediately; otherwise other workers
+    keep accepting it from their key cache for up to
+    PROJECT_KEY_CACHE_TTL_SECONDS.
+    """
+    import secrets
+
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    old_key = project.api_key
+    project.api_key = f"jo_{secrets.token_urlsafe(32)}"
+    db.add(project)
+    db.commit()
+    db.refresh(project)
+    invalidate_project_key(old_key)
     return project
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import date, datetime
+from typing import List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.database import get_async_db
+from ..models import models
+from ..schemas import schemas
+from ..services.retention import create_retention_job
+from ..services.trace_archive import ARCHIVE_TABLES, from_archive_rows, get_trace_archive
+
+router = APIRouter()
+
+async def _check_project(db: AsyncSession, project_id: UUID):
+    found = (await db.execute(select(models.Project.id).where(models.Project.id == project_id))).scalar_one_or_none()
+    if found is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+@router.post("/{project_id}/run", response_model=schemas.RetentionResult)
+async def run_retention(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+):
+    """
+    Apply the project's retention policy now instead of waiting for the background job.
+    """
+    await _check_project(db, project_id)
+    return await create_retention_job().run_once(project_id)
+
+@router.get("/{project_id}/archive", response_model=List[date])
+async def list_archived_days(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+):
+    """
+    Days with archived traces.
+    """
+    await _check_project(db, project_id)
+    return await asyncio.to_thread(get_trace_archive().days, project_id)
+
+@router.get("/{project_id}/archive/traces", response_model=List[schemas.Trace])
+async def read_archived_traces(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+    since: datetime,
+    until: datetime,
+    limit: int = Query(100, ge=1, le=5000),
+):
+    """
+    Archived traces that started in [since, until), read from the Parquet files.
+    """
+    await _check_project(db, project_id)
+    table = await asyncio.to_thread(get_trace_archive().read, "traces", project_id, since, until, None, limit)
+    return from_archive_rows(ARCHIVE_TABLES["traces"], table.to_pylist())
+
+@router.post("/{project_id}/archive/rehydrate", response_model=schemas.ArchiveRehydrateResult)
+async def rehydrate_archive(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    project_id: UUID,
+    window: schemas.ArchiveWindow,
+):
+    """
+    Copy archived traces that started in [since, until), with their spans,
+    back into Postgres. They expire again on the next retention run unless
+    the policy is extended.
+    """
+    await _check_project(db, project_id)
+    traces, spans = await get_trace_archive().rehydrate(db, project_id, window.since, window.until)
+    return schemas.ArchiveRehydrateResult(traces=traces, spans=spans)
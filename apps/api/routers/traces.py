@@ -1,83 +1,311 @@
 from typing import Any, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, BackgroundTasks, Request
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, joinedload, selectinload
 
-from ..core.database import get_db
+from ..core.cache import CachedProject, project_key_cache
+from ..core.config import settings
+from ..core.dedup import get_seen_traces
+from ..core.database import get_async_db
+from ..core.ingest_queue import IngestQueueFull, get_ingest_queue
 from ..models import models
 from ..schemas import schemas
-from ..services.trace_processor import process_incoming_trace
+from ..services.payloads import expand_payloads
+from ..services.span_tree import build_trace_tree
+from ..services.stream_ingest import StreamIngestor
+from ..services.tail_sampler import TailSamplingPolicy
+from ..services.trace_processor import (
+    append_trace_spans,
+    batch_result,
+    process_incoming_trace,
+    process_trace_batch,
+    validate_trace,
+)
+from ..utils.pagination import build_page, keyset_condition
+from ..utils.wire import iter_records, read_document, read_trace_batch
 
 router = APIRouter()
 
 async def get_project_by_key(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     x_api_key: str = Header(...),
-) -> models.Project:
-    project = db.query(models.Project).filter(models.Project.api_key == x_api_key).first()
+) -> CachedProject:
+    found, project = project_key_cache.get(x_api_key)
+    if not found:
+        result = await db.execute(select(models.Project).where(models.Project.api_key == x_api_key))
+        db_project = result.scalar_one_or_none()
+        if db_project:
+            project = CachedProject.from_model(db_project)
+            project_key_cache.set(x_api_key, project)
+        else:
+            project_key_cache.set_missing(x_api_key)
     if not project:
         raise HTTPException(status_code=401, detail="Invalid API Key")
     return project
 
-@router.post("/", response_model=schemas.Trace)
+@router.post("/", response_model=schemas.Trace, responses={202: {"model": schemas.TraceAccepted}})
 async def ingest_trace(
     *,
-    db: Session = Depends(get_db),
-    trace_in: schemas.TraceCreate,
-    project: models.Project = Depends(get_project_by_key),
+    db: AsyncSession = Depends(get_async_db),
+    request: Request,
+    project: CachedProject = Depends(get_project_by_key),
     background_tasks: BackgroundTasks,
 ):
     """
-    Ingest a new trace with its spans.
-    Processing is offloaded to background tasks for high ingestion performance.
+    Ingest a new trace (schemas.TraceCreate) with its spans.
+    The body may be JSON or msgpack (Content-Type), optionally gzip or zstd
+    compressed (Content-Encoding).
+    In queue mode the trace is validated, queued and acknowledged with 202;
+    ingest workers write it to the database asynchronously. A full queue
+    answers 503 so the client retries later.
+    Re-sending a trace (an SDK retry) is safe: it is never stored twice.
     """
+    raw = await read_document(request, settings.INGEST_MAX_BODY_BYTES)
+    try:
+        trace_in = validate_trace(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if settings.INGEST_MODE == "queue":
+        accepted = schemas.TraceAccepted(id=trace_in.id)
+        if await get_seen_traces().seen(project.id, [trace_in.id]):
+            accepted.status = "duplicate"
+        else:
+            await _publish(project.id, [trace_in.model_dump(mode="json")])
+        return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
+
     # Quick validation and persistence
-    trace = await process_incoming_trace(db, trace_in, project.id)
+    sampling = TailSamplingPolicy.from_settings(project.settings)
+    trace = await process_incoming_trace(db, trace_in, project.id, sampling, project.organization_id)
     
     # Trigger further analysis in background (Evaluations, Drift, etc.)
     # background_tasks.add_task(analyze_trace, trace.id)
     
     return trace
 
-@router.get("/", response_model=List[schemas.Trace])
-def read_traces(
-    db: Session = Depends(get_db),
+@router.post("/batch", response_model=schemas.TraceBatchResult, responses={202: {"model": schemas.TraceBatchResult}})
+async def ingest_trace_batch(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    request: Request,
+    project: CachedProject = Depends(get_project_by_key),
+):
+    """
+    Ingest many traces in one request and one transaction.
+    The body is a schemas.TraceBatchCreate envelope (JSON or msgpack) or a
+    stream of concatenated msgpack trace maps, optionally gzip/zstd compressed.
+    Each trace is validated independently and reported as accepted or
+    rejected, or as duplicate if it was already stored by an earlier attempt.
+    """
+    traces_in = await read_trace_batch(
+        request, settings.INGEST_MAX_BODY_BYTES, settings.INGEST_MAX_BATCH_SIZE
+    )
+    if settings.INGEST_MODE == "queue":
+        return await _queue_trace_batch(traces_in, project.id)
+    sampling = TailSamplingPolicy.from_settings(project.settings)
+    return await process_trace_batch(db, traces_in, project.id, sampling, project.organization_id)
+
+@router.post("/stream", response_model=schemas.TraceStreamResult)
+async def ingest_trace_stream(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    request: Request,
+    project: CachedProject = Depends(get_project_by_key),
+):
+    """
+    Ingest an NDJSON (application/x-ndjson) or msgpack stream of trace and
+    span records without buffering the body; see StreamIngestor for the
+    record layout. Rows are written and committed in fixed-size chunks as
+    they arrive, so a failure part-way keeps the chunks already committed.
+    Always writes directly, even in queue mode.
+    """
+    ingestor = StreamIngestor(
+        db,
+        project.id,
+        chunk_rows=settings.INGEST_STREAM_CHUNK_ROWS,
+        sampling=TailSamplingPolicy.from_settings(project.settings),
+        organization_id=project.organization_id,
+    )
+    return await ingestor.run(iter_records(request, settings.INGEST_MAX_RECORD_BYTES))
+
+@router.post("/{trace_id}/spans", response_model=schemas.Trace)
+async def ingest_trace_spans(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    trace_id: UUID,
+    request: Request,
+    project: CachedProject = Depends(get_project_by_key),
+):
+    """
+    Upload spans of a long-running trace before it ends.
+    The body is a schemas.TraceCreate holding the trace header and the newly
+    finished spans; the trace is created as RUNNING on the first chunk and
+    closed by the chunk that carries `end_time`. Always writes directly,
+    even in queue mode, since each chunk updates the stored aggregates.
+    """
+    raw = await read_document(request, settings.INGEST_MAX_BODY_BYTES)
+    if isinstance(raw, dict):
+        raw.setdefault("id", str(trace_id))
+    try:
+        trace_in = validate_trace(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if trace_in.id != trace_id:
+        raise HTTPException(status_code=422, detail="Trace id in body does not match the URL")
+
+    trace = await append_trace_spans(db, trace_in, project.id, project.organization_id)
+    if trace is None:
+        raise HTTPException(status_code=409, detail="Trace is not running")
+    return trace
+
+async def _publish(project_id: UUID, payloads: List[dict]):
+    try:
+        await get_ingest_queue().publish_many(project_id, payloads)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+async def _queue_trace_batch(traces_in: List[dict], project_id: UUID) -> JSONResponse:
+    validated = []
+    for raw in traces_in:
+        try:
+            validated.append(validate_trace(raw))
+        except (ValidationError, ValueError) as e:
+            validated.append(schemas.TraceIngestResult(status="rejected", error=str(e)))
+
+    # Workers dedupe again on write; this only saves queueing recent retries
+    seen = await get_seen_traces().seen(
+        project_id, [item.id for item in validated if isinstance(item, schemas.TraceCreate)]
+    )
+    results = []
+    payloads = []
+    for item in validated:
+        if isinstance(item, schemas.TraceIngestResult):
+            results.append(item)
+        elif item.id in seen:
+            results.append(schemas.TraceIngestResult(id=item.id, status="duplicate"))
+        else:
+            payloads.append(item.model_dump(mode="json"))
+            results.append(schemas.TraceIngestResult(id=item.id, status="queued"))
+    # All or nothing, so a 503 never leaves part of the batch queued
+    await _publish(project_id, payloads)
+
+    return JSONResponse(status_code=202, content=batch_result(results).model_dump(mode="json"))
+
+@router.get("/", response_model=schemas.Page[schemas.Trace])
+async def read_traces(
+    db: AsyncSession = Depends(get_async_db),
     project_id: Optional[UUID] = None,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
 ):
     """
-    Retrieve traces for a project.
+    Retrieve traces for a project, newest first.
+    Keyset-paginated on (start_time, id) so deep pages cost the same as the first.
     """
-    query = db.query(models.Trace)
+    query = select(models.Trace)
     if project_id:
-        query = query.filter(models.Trace.project_id == project_id)
-    traces = query.order_by(models.Trace.start_time.desc()).offset(skip).limit(limit).all()
-    return traces
+        query = query.where(models.Trace.project_id == project_id)
+    if cursor:
+        query = query.where(keyset_condition(models.Trace.start_time, models.Trace.id, cursor))
+    query = query.order_by(models.Trace.start_time.desc(), models.Trace.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    items, next_cursor = build_page(result.scalars().all(), limit, "start_time")
+    return schemas.Page[schemas.Trace](items=items, next_cursor=next_cursor)
 
 @router.get("/{trace_id}", response_model=schemas.TraceDetailed)
-def read_trace(
+async def read_trace(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     trace_id: UUID,
+    load_payloads: bool = False,
 ):
     """
-    Get deep trace details including all spans.
+    Get deep trace details including all spans. Large payloads are returned
+    as blob references with a preview unless `load_payloads=true`.
     """
-    trace = db.query(models.Trace).filter(models.Trace.id == trace_id).first()
+    # Spans must be loaded eagerly: lazy loading is not available on an AsyncSession
+    result = await db.execute(
+        select(models.Trace)
+        .options(selectinload(models.Trace.spans))
+        .where(models.Trace.id == trace_id)
+    )
+    trace = result.scalar_one_or_none()
     if not trace:
         raise HTTPException(status_code=404, detail="Trace not found")
-    return trace
+    if not load_payloads:
+        return trace
+    detail = schemas.TraceDetailed.model_validate(trace).model_dump()
+    await expand_payloads(trace.project_id, [detail], children_keys=("spans",))
+    return detail
+
+@router.get("/{trace_id}/tree", response_model=schemas.TraceTree)
+async def read_trace_tree(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    trace_id: UUID,
+    include_io: bool = True,
+    load_payloads: bool = False,
+):
+    """
+    Get a trace with its spans nested by parent, plus per-subtree latency,
+    token and cost rollups. Trace and spans are fetched in a single query;
+    `include_io=false` leaves the input/output JSONB columns unloaded, and
+    `load_payloads=true` replaces blob references with their content.
+    """
+    spans_loader = joinedload(models.Trace.spans)
+    query = select(models.Trace).where(models.Trace.id == trace_id)
+    if include_io:
+        query = query.options(spans_loader)
+    else:
+        query = query.options(
+            defer(models.Trace.input),
+            defer(models.Trace.output),
+            spans_loader.options(defer(models.Span.input), defer(models.Span.output)),
+        )
+    result = await db.execute(query)
+    trace = result.unique().scalar_one_or_none()
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    tree = build_trace_tree(
+        trace,
+        trace_fields=schemas.Trace.model_fields,
+        span_fields=schemas.Span.model_fields,
+        include_io=include_io,
+    )
+    if include_io and load_payloads:
+        await expand_payloads(trace.project_id, [tree], children_keys=("spans", "children"))
+    return tree
 
-@router.get("/{trace_id}/spans", response_model=List[schemas.Span])
-def read_trace_spans(
+@router.get("/{trace_id}/spans", response_model=schemas.Page[schemas.Span])
+async def read_trace_spans(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     trace_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    load_payloads: bool = False,
 ):
     """
-    Get all spans for a specific trace.
+    Get spans for a specific trace in start order, keyset-paginated on (start_time, id).
+    `load_payloads=true` replaces blob references with their content.
     """
-    spans = db.query(models.Span).filter(models.Span.trace_id == trace_id).order_by(models.Span.start_time).all()
-    return spans
+    query = select(models.Span).where(models.Span.trace_id == trace_id)
+    if cursor:
+        query = query.where(keyset_condition(models.Span.start_time, models.Span.id, cursor, descending=False))
+    query = query.order_by(models.Span.start_time, models.Span.id).limit(limit + 1)
+    result = await db.execute(query)
+    items, next_cursor = build_page(result.scalars().all(), limit, "start_time")
+    if load_payloads and items:
+        # Blobs are stored per project; spans don't carry the project id
+        project_id = (await db.execute(
+            select(models.Trace.project_id).where(models.Trace.id == trace_id).limit(1)
+        )).scalar_one_or_none()
+        if project_id is not None:
+            items = [schemas.Span.model_validate(span).model_dump() for span in items]
+            await expand_payloads(project_id, items)
+    return schemas.Page[schemas.Span](items=items, next_cursor=next_cursor)
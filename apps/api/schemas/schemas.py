@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from datetime import date, datetime
+from typing import Any, Dict, Generic, List, Optional, TypeVar, Union
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -12,6 +12,16 @@ class Message(BaseModel):
     message: str
 
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """
+    One page of a keyset-paginated listing. Pass `next_cursor` back as `cursor`.
+    """
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
 # ============================================================================
 # TRACE SCHEMAS
 # ============================================================================
@@ -33,6 +43,8 @@ class SpanCreate(SpanBase):
     prompt_tokens: Optional[int] = None
     completion_tokens: Optional[int] = None
     total_tokens: Optional[int] = None
+    status: str = "ok"
+    error_message: Optional[str] = None
 
 class Span(SpanBase):
     model_config = ConfigDict(from_attributes=True)
@@ -55,6 +67,8 @@ class TraceCreate(TraceBase):
     start_time: datetime
     end_time: Optional[datetime] = None
     spans: List[SpanCreate] = Field(default_factory=list)
+    # Probability the SDK kept this trace; rollups weight it by 1 / sample_rate
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
 
 class Trace(TraceBase):
     model_config = ConfigDict(from_attributes=True)
@@ -70,6 +84,51 @@ class Trace(TraceBase):
 class TraceDetailed(Trace):
     spans: List[Span]
 
+class SpanNode(Span):
+    children: List["SpanNode"] = Field(default_factory=list)
+    subtree_span_count: int
+    subtree_tokens: int
+    subtree_cost_usd: float
+    subtree_latency_ms: Optional[float] = None
+
+class TraceTree(Trace):
+    span_count: int
+    spans: List[SpanNode]
+
+class TraceBatchCreate(BaseModel):
+    # Items are validated one by one so a bad trace only rejects itself
+    traces: List[Dict[str, Any]]
+
+class StreamRecordError(BaseModel):
+    record: int
+    error: str
+
+class TraceStreamResult(BaseModel):
+    accepted_traces: int
+    accepted_spans: int
+    rejected: int
+    duplicates: int = 0  # traces already stored, skipped with their spans
+    errors: List[StreamRecordError] = Field(default_factory=list)
+
+class BlobRef(BaseModel):
+    digest: str
+    size_bytes: int
+
+class TraceAccepted(BaseModel):
+    id: UUID
+    status: str = "queued"  # queued, duplicate
+
+class TraceIngestResult(BaseModel):
+    id: Optional[UUID] = None
+    status: str  # accepted, queued, rejected, duplicate
+    error: Optional[str] = None
+
+class TraceBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    duplicates: int = 0
+    results: List[TraceIngestResult]
+
 
 # ============================================================================
 # EVALUATION SCHEMAS
@@ -120,6 +179,90 @@ class Project(ProjectBase):
     created_at: datetime
 
 
+# ============================================================================
+# PRICING SCHEMAS
+# ============================================================================
+
+class ModelPriceBase(BaseModel):
+    model: str = Field(..., max_length=100)
+    prompt_usd_per_1k: float = Field(..., ge=0)
+    completion_usd_per_1k: float = Field(..., ge=0)
+    organization_id: Optional[UUID] = None  # None: global price
+
+class ModelPriceCreate(ModelPriceBase):
+    effective_from: Optional[datetime] = None  # defaults to now
+
+class ModelPrice(ModelPriceBase):
+    model_config = ConfigDict(from_attributes=True)
+    id: UUID
+    effective_from: datetime
+    created_at: datetime
+
+class PriceRecompute(BaseModel):
+    since: datetime
+    until: datetime
+    organization_id: Optional[UUID] = None  # None: every organization
+    model: Optional[str] = None  # only spans whose model starts with this
+
+class PriceRecomputeResult(BaseModel):
+    projects: int
+    spans: int
+    traces: int
+
+
+# ============================================================================
+# RETENTION SCHEMAS
+# ============================================================================
+
+class RetentionResult(BaseModel):
+    projects: int  # projects with expired traces
+    traces: int
+    spans: int
+    archived_files: int
+    rollups: int  # downsampled rollup rows
+    blobs: int  # payload blobs no remaining row references
+
+class ArchiveWindow(BaseModel):
+    since: datetime
+    until: datetime
+
+class ArchiveRehydrateResult(BaseModel):
+    traces: int
+    spans: int
+
+
+# ============================================================================
+# ANALYTICS SCHEMAS
+# ============================================================================
+
+class UserCost(BaseModel):
+    user_id: str  # "" for traces without a user
+    # Sampling-weighted estimates; sampled_traces is the number actually stored
+    traces: int
+    sampled_traces: int
+    cost_usd: float
+    tokens: int
+
+class SpanLatency(BaseModel):
+    name: str
+    # Sampling-weighted like UserCost
+    spans: int
+    sampled_spans: int
+    errors: int
+    avg_latency_ms: Optional[float] = None
+    max_latency_ms: Optional[float] = None
+
+class ExportRequest(BaseModel):
+    # Whole UTC days; both default to the days not exported yet
+    since: Optional[date] = None
+    until: Optional[date] = None
+
+class ExportResult(BaseModel):
+    days: int
+    traces: int
+    spans: int
+
+
 # ============================================================================
 # DATASET SCHEMAS
 # ============================================================================
@@ -2,11 +2,16 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from uuid import UUID
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from loguru import logger
 
 from ..models import models
 from .notification_service import NotificationService
+from .rollup_service import RollupService, merge_sketches
+
+# Alert metric -> quantile served from the rollup latency sketches
+LATENCY_QUANTILES = {"latency_p50": 0.5, "latency_p95": 0.95, "latency_p99": 0.99}
 
 class AlertEngine:
     """
@@ -41,27 +46,27 @@ class AlertEngine:
         now = datetime.utcnow()
         start_time = now - timedelta(minutes=alert.window_minutes)
         
-        if alert.metric == "latency_p95":
-            # Simple average for demo purposes
-            result = self.db.query(models.Trace.latency_ms).filter(
-                models.Trace.project_id == alert.project_id,
-                models.Trace.start_time >= start_time
+        if alert.metric in LATENCY_QUANTILES:
+            # Merge the per-minute sketches covering the window; the first
+            # bucket may start slightly before the window
+            rows = self.db.execute(
+                RollupService.latency_sketch_query(alert.project_id, start_time, granularity="minute")
             ).all()
-            if not result: return None
-            return float(np.percentile([r[0] for r in result if r[0]], 95))
+            return merge_sketches(rows).quantile(LATENCY_QUANTILES[alert.metric])
             
         elif alert.metric == "error_rate":
-            total = self.db.query(models.Trace).filter(
-                models.Trace.project_id == alert.project_id,
-                models.Trace.start_time >= start_time
-            ).count()
-            if total == 0: return 0.0
-            
-            errors = self.db.query(models.Trace).filter(
-                models.Trace.project_id == alert.project_id,
-                models.Trace.start_time >= start_time,
-                models.Trace.status == "failed"
-            ).count()
+            # Sampling-weighted estimates: each stored trace counts 1/sample_rate times
+            rollup = models.MetricRollup
+            total, errors = self.db.query(
+                func.sum(rollup.est_trace_count),
+                func.sum(rollup.est_error_count)
+            ).filter(
+                rollup.project_id == alert.project_id,
+                rollup.granularity == "minute",
+                rollup.model == "",
+                rollup.bucket_start >= start_time.replace(second=0, microsecond=0)
+            ).one()
+            if not total: return 0.0
             return (errors / total) * 100
             
         return None
@@ -0,0 +1,124 @@
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .analytics_export import get_export_store
+from .trace_archive import TraceArchive
+
+
+class ParquetQueryEngine:
+    """
+    Aggregations over the Parquet export with pyarrow compute, weighted by
+    1 / sample_rate like the Postgres queries.
+
+    A query opens only the project's day partitions in the window and reads
+    only the columns it aggregates, so scanning months of traces costs a
+    few column chunks per day and no Postgres work at all. Windows are whole
+    days, and spans are counted in their trace's day (the export partitions
+    them that way), matching the Postgres queries in AnalyticsService.
+    """
+
+    def __init__(self, store: TraceArchive):
+        self.store = store
+
+    def covered_until(self, project_id: uuid.UUID) -> Optional[date]:
+        """
+        End (exclusive) of the exported days; days are exported in order.
+        """
+        days = self.store.days(project_id)
+        return days[-1] + timedelta(days=1) if days else None
+
+    def _scan(self, table: str, project_id: uuid.UUID, since: date, until: date, columns: List[str]) -> pa.Table:
+        dataset = self.store.dataset(table)
+        if dataset is None:
+            return self.store.schemas[table].empty_table().select(columns)
+        condition = (
+            (ds.field("project_id") == str(project_id))
+            & (ds.field("day") >= since.isoformat())
+            & (ds.field("day") < until.isoformat())
+        )
+        return dataset.to_table(columns=columns, filter=condition)
+
+    @staticmethod
+    def _weights(sample_rate: pa.ChunkedArray) -> pa.ChunkedArray:
+        return pc.divide(1.0, pc.fill_null(pc.cast(sample_rate, pa.float64()), 1.0))
+
+    @staticmethod
+    def _weighted(values: pa.ChunkedArray, weights: pa.ChunkedArray) -> pa.ChunkedArray:
+        return pc.multiply(pc.fill_null(pc.cast(values, pa.float64()), 0.0), weights)
+
+    def cost_by_user(self, project_id: uuid.UUID, since: date, until: date) -> List[Dict[str, Any]]:
+        table = self._scan("traces", project_id, since, until, ["user_id", "total_cost_usd", "total_tokens", "sample_rate"])
+        weights = self._weights(table["sample_rate"])
+        table = pa.table({
+            "user_id": pc.fill_null(table["user_id"], ""),
+            "weight": weights,
+            "cost": self._weighted(table["total_cost_usd"], weights),
+            "tokens": self._weighted(table["total_tokens"], weights),
+        })
+        grouped = table.group_by("user_id").aggregate([
+            ("user_id", "count"),
+            ("weight", "sum"),
+            ("cost", "sum"),
+            ("tokens", "sum"),
+        ])
+        return [
+            {
+                "user_id": row["user_id"],
+                "sampled_traces": row["user_id_count"],
+                "traces": row["weight_sum"] or 0.0,
+                "cost_usd": row["cost_sum"] or 0.0,
+                "tokens": row["tokens_sum"] or 0.0,
+            }
+            for row in grouped.to_pylist()
+        ]
+
+    def latency_by_span_name(self, project_id: uuid.UUID, since: date, until: date) -> List[Dict[str, Any]]:
+        spans = self._scan("spans", project_id, since, until, ["trace_id", "name", "latency_ms", "status"])
+        # Spans are weighted by their trace's sample_rate; both sit in the same day partition
+        rates = self._scan("traces", project_id, since, until, ["id", "sample_rate"])
+        spans = spans.join(rates, keys="trace_id", right_keys="id")
+        weights = self._weights(spans["sample_rate"])
+        latency = pc.cast(spans["latency_ms"], pa.float64())
+        table = pa.table({
+            "name": spans["name"],
+            "weight": weights,
+            "errors": pc.if_else(pc.equal(spans["status"], "error"), weights, 0.0),
+            "latency_weight": pc.if_else(pc.is_valid(latency), weights, 0.0),
+            "latency_sum": pc.multiply(latency, weights),
+            "latency_ms": latency,
+        })
+        grouped = table.group_by("name").aggregate([
+            ("name", "count"),
+            ("weight", "sum"),
+            ("errors", "sum"),
+            ("latency_weight", "sum"),
+            ("latency_sum", "sum"),
+            ("latency_ms", "max"),
+        ])
+        return [
+            {
+                "name": row["name"],
+                "sampled_spans": row["name_count"],
+                "spans": row["weight_sum"] or 0.0,
+                "errors": row["errors_sum"] or 0.0,
+                "latency_count": row["latency_weight_sum"] or 0.0,
+                "latency_sum_ms": row["latency_sum_sum"] or 0.0,
+                "latency_max_ms": row["latency_ms_max"],
+            }
+            for row in grouped.to_pylist()
+        ]
+
+
+engine: Optional[ParquetQueryEngine] = None
+
+
+def get_query_engine() -> ParquetQueryEngine:
+    global engine
+    if engine is None:
+        engine = ParquetQueryEngine(get_export_store())
+    return engine
@@ -0,0 +1,183 @@
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models import models
+from ..schemas import schemas
+from .trace_archive import TraceArchive
+
+
+def _lock_key(project_id: uuid.UUID) -> int:
+    # The other half of the id from the retention job's key, so the two don't block each other
+    return int.from_bytes(project_id.bytes[8:], "big", signed=True)
+
+
+class TraceExporter:
+    """
+    Copies complete (UTC) days of traces and spans from Postgres into the
+    Parquet export store for the analytics engine.
+
+    Each project-day is read in keyset chunks of `chunk_rows` traces (plus
+    their spans) and streamed into one file per table (see DayWriter), so
+    neither side ever holds more than a chunk. Days are exported in order
+    after the last exported one; `export_window` re-exports days on
+    demand, e.g. after late uploads or a cost recompute.
+    """
+
+    def __init__(self, store: TraceArchive, chunk_rows: int):
+        self.store = store
+        self.chunk_rows = chunk_rows
+
+    async def export_pending(self, project_id: uuid.UUID, result: schemas.ExportResult, until: Optional[date] = None):
+        """
+        Export the days after the last exported one, up to (not including) `until` (default: today).
+        """
+        until = until or datetime.utcnow().date()
+        exported = await asyncio.to_thread(self.store.days, project_id)
+        if exported:
+            since = exported[-1] + timedelta(days=1)
+        else:
+            async with AsyncSessionLocal() as db:
+                first = (await db.execute(
+                    select(func.min(models.Trace.__table__.c.start_time))
+                    .where(models.Trace.__table__.c.project_id == project_id)
+                )).scalar()
+            if first is None:
+                return
+            since = first.date()
+        await self.export_window(project_id, since, until, result)
+
+    async def export_window(self, project_id: uuid.UUID, since: date, until: date, result: schemas.ExportResult):
+        day = since
+        while day < until:
+            async with AsyncSessionLocal() as db:
+                counts = await self.export_day(db, project_id, day)
+            if counts is None:
+                # Another process is exporting this project
+                return
+            if counts[0]:
+                result.days += 1
+                result.traces += counts[0]
+                result.spans += counts[1]
+            day += timedelta(days=1)
+
+    async def export_day(self, db: AsyncSession, project_id: uuid.UUID, day: date) -> Optional[List[int]]:
+        """
+        Export one project-day in a single read-only transaction; returns
+        [traces, spans], or None if another process holds the project's lock.
+        """
+        locked = (await db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _lock_key(project_id)}
+        )).scalar()
+        if not locked:
+            return None
+
+        trace = models.Trace.__table__
+        span = models.Span.__table__
+        start = datetime.combine(day, datetime.min.time())
+        query = (
+            select(*trace.c)
+            .where(trace.c.project_id == project_id, trace.c.start_time >= start, trace.c.start_time < start + timedelta(days=1))
+            .order_by(trace.c.start_time, trace.c.id)
+            .limit(self.chunk_rows)
+        )
+        writer = self.store.open_day(project_id, day)
+        counts = [0, 0]
+        last: Optional[Dict[str, Any]] = None
+        try:
+            while True:
+                page = query if last is None else query.where(and_(
+                    trace.c.start_time >= last["start_time"],
+                    or_(trace.c.start_time > last["start_time"], trace.c.id > last["id"]),
+                ))
+                trace_rows = [dict(row) for row in (await db.execute(page)).mappings()]
+                if not trace_rows:
+                    break
+                span_rows = [dict(row) for row in (await db.execute(
+                    select(*span.c).where(span.c.trace_id.in_([row["id"] for row in trace_rows]))
+                )).mappings()]
+                await asyncio.to_thread(writer.write, "traces", trace_rows)
+                await asyncio.to_thread(writer.write, "spans", span_rows)
+                counts[0] += len(trace_rows)
+                counts[1] += len(span_rows)
+                last = trace_rows[-1]
+            await asyncio.to_thread(writer.commit)
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+        finally:
+            await db.rollback()
+        return counts
+
+
+class ExportJob:
+    """
+    Background task that exports finished days of every project every `interval_seconds`.
+    """
+
+    def __init__(self, exporter: TraceExporter, interval_seconds: float):
+        self.exporter = exporter
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Started analytics export job (every {self.interval_seconds}s)")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                result = await self.run_once()
+                if result.days:
+                    logger.info(f"Exported {result.days} project-days ({result.traces} traces, {result.spans} spans)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics export failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> schemas.ExportResult:
+        async with AsyncSessionLocal() as db:
+            project_ids = (await db.execute(select(models.Project.id))).scalars().all()
+        result = schemas.ExportResult(days=0, traces=0, spans=0)
+        for project_id in project_ids:
+            if self._stopping.is_set():
+                break
+            await self.exporter.export_pending(project_id, result)
+        return result
+
+
+store: Optional[TraceArchive] = None
+
+
+def get_export_store() -> TraceArchive:
+    global store
+    if store is None:
+        store = TraceArchive(settings.ANALYTICS_EXPORT_ROOT)
+    return store
+
+
+def create_exporter() -> TraceExporter:
+    return TraceExporter(get_export_store(), chunk_rows=settings.ANALYTICS_EXPORT_CHUNK_ROWS)
+
+
+def create_export_job() -> ExportJob:
+    return ExportJob(create_exporter(), interval_seconds=settings.ANALYTICS_EXPORT_INTERVAL_SECONDS)
@@ -1,55 +1,217 @@
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
 from ..models import models
+from .analytics_engine import get_query_engine
+from .rollup_service import merge_sketches, rollup_cutoff, truncate
+
+
+def _merge_groups(rows: Iterable[Dict[str, Any]], key: str, max_fields: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+    """
+    Combine per-group aggregates from several sources: counters add up, `max_fields` take the larger.
+    """
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for row in rows:
+        current = merged.get(row[key])
+        if current is None:
+            merged[row[key]] = dict(row)
+            continue
+        for field, value in row.items():
+            if field == key or value is None:
+                continue
+            if field in max_fields:
+                current[field] = value if current[field] is None else max(current[field], value)
+            else:
+                current[field] += value
+    return list(merged.values())
+
 
 class AnalyticsService:
     """
     High-performance analytics service for dashboard metrics.
-    Aggregates data across projects and time windows.
+    Reads pre-aggregated metric rollups, so query cost depends on the
+    number of time buckets in the window, not on raw trace volume.
+    Totals use the sampling-weighted `est_*` columns.
+
+    Ad-hoc breakdowns over raw rows (`cost_by_user`, `latency_by_span_name`)
+    weight each stored trace by 1 / sample_rate like the rollups, and are
+    split by day: days older than ANALYTICS_POSTGRES_DAYS that are in
+    the Parquet export are aggregated there by the ParquetQueryEngine, and
+    only the remaining days are queried in Postgres.
     """
-    
+
+    @staticmethod
+    async def route_window(
+        project_id: Any, since: datetime, until: datetime
+    ) -> Tuple[Optional[Tuple[date, date]], Optional[Tuple[datetime, datetime]]]:
+        """
+        Split [since, until), widened to whole days, into the part served
+        from Parquet (days) and the part served from Postgres (datetimes).
+        """
+        first = since.date()
+        end = until.date() if until.time() == time.min else until.date() + timedelta(days=1)
+        split = first
+        if settings.ANALYTICS_EXPORT_ENABLED:
+            covered = await asyncio.to_thread(get_query_engine().covered_until, project_id)
+            recent = datetime.utcnow().date() - timedelta(days=settings.ANALYTICS_POSTGRES_DAYS)
+            if covered is not None:
+                split = max(first, min(covered, recent, end))
+        parquet = (first, split) if split > first else None
+        postgres = (datetime.combine(split, time.min), datetime.combine(end, time.min)) if end > split else None
+        return parquet, postgres
+
     @staticmethod
-    def get_project_summary(db: Session, project_id: Any, days: int = 7) -> Dict[str, Any]:
+    async def cost_by_user(db: AsyncSession, project_id: Any, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        """
+        Traces, cost and tokens per user_id (sampling-weighted, with the
+        stored trace count as `sampled_traces`), highest cost first.
+        """
+        parquet, postgres = await AnalyticsService.route_window(project_id, since, until)
+        rows: List[Dict[str, Any]] = []
+        if parquet:
+            rows += await asyncio.to_thread(get_query_engine().cost_by_user, project_id, *parquet)
+        if postgres:
+            trace = models.Trace.__table__
+            user_id = func.coalesce(trace.c.user_id, "")
+            weight = 1.0 / func.coalesce(trace.c.sample_rate, 1.0)
+            result = await db.execute(
+                select(
+                    user_id.label("user_id"),
+                    func.count().label("sampled_traces"),
+                    func.sum(weight).label("traces"),
+                    func.coalesce(func.sum(trace.c.total_cost_usd * weight), 0.0).label("cost_usd"),
+                    func.coalesce(func.sum(trace.c.total_tokens * weight), 0.0).label("tokens"),
+                ).where(
+                    trace.c.project_id == project_id,
+                    trace.c.start_time >= postgres[0],
+                    trace.c.start_time < postgres[1],
+                ).group_by(user_id)
+            )
+            rows += [dict(row) for row in result.mappings()]
+
+        merged = _merge_groups(rows, "user_id")
+        for row in merged:
+            row["traces"] = round(row["traces"])
+            row["tokens"] = round(row["tokens"])
+        return sorted(merged, key=lambda row: row["cost_usd"], reverse=True)
+
+    @staticmethod
+    async def latency_by_span_name(db: AsyncSession, project_id: Any, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        """
+        Span count, errors and latency per span name (sampling-weighted,
+        with the stored span count as `sampled_spans`), slowest average
+        first. Spans are counted in the window of their trace's start.
+        """
+        parquet, postgres = await AnalyticsService.route_window(project_id, since, until)
+        rows: List[Dict[str, Any]] = []
+        if parquet:
+            rows += await asyncio.to_thread(get_query_engine().latency_by_span_name, project_id, *parquet)
+        if postgres:
+            span = models.Span.__table__
+            trace = models.Trace.__table__
+            weight = 1.0 / func.coalesce(trace.c.sample_rate, 1.0)
+            result = await db.execute(
+                select(
+                    span.c.name,
+                    func.count().label("sampled_spans"),
+                    func.sum(weight).label("spans"),
+                    func.coalesce(func.sum(weight).filter(span.c.status == "error"), 0.0).label("errors"),
+                    func.coalesce(func.sum(weight).filter(span.c.latency_ms.is_not(None)), 0.0).label("latency_count"),
+                    func.coalesce(func.sum(span.c.latency_ms * weight), 0.0).label("latency_sum_ms"),
+                    func.max(span.c.latency_ms).label("latency_max_ms"),
+                )
+                .select_from(span.join(trace, trace.c.id == span.c.trace_id))
+                .where(
+                    trace.c.project_id == project_id,
+                    trace.c.start_time >= postgres[0],
+                    trace.c.start_time < postgres[1],
+                    # Spans start no earlier than their trace; lets Timescale skip older span chunks
+                    span.c.start_time >= postgres[0],
+                )
+                .group_by(span.c.name)
+            )
+            rows += [dict(row) for row in result.mappings()]
+
+        merged = _merge_groups(rows, "name", max_fields=("latency_max_ms",))
+        for row in merged:
+            count = row.pop("latency_count")
+            latency_sum = row.pop("latency_sum_ms")
+            row["avg_latency_ms"] = latency_sum / count if count else None
+            row["max_latency_ms"] = row.pop("latency_max_ms")
+            row["spans"] = round(row["spans"])
+            row["errors"] = round(row["errors"])
+        return sorted(merged, key=lambda row: row["avg_latency_ms"] or 0.0, reverse=True)
+
+    @staticmethod
+    async def get_project_summary(db: AsyncSession, project_id: Any, days: int = 7) -> Dict[str, Any]:
         since = datetime.utcnow() - timedelta(days=days)
-        
+        rollup = models.MetricRollup
+        # Hourly buckets (at most 24 rows per day), unless they are downsampled away
+        hour_cutoff = rollup_cutoff("hour")
+        stats_granularity = "hour" if hour_cutoff is None or since >= hour_cutoff else "day"
+
         # 1. Volume and Basic Stats
-        stats = db.query(
-            func.count(models.Trace.id).label("total_traces"),
-            func.avg(models.Trace.latency_ms).label("avg_latency"),
-            func.sum(models.Trace.total_cost_usd).label("total_cost"),
-            func.sum(models.Trace.total_tokens).label("total_tokens")
-        ).filter(
-            models.Trace.project_id == project_id,
-            models.Trace.start_time >= since
-        ).first()
+        stats = (await db.execute(
+            select(
+                func.sum(rollup.trace_count).label("sampled_traces"),
+                func.sum(rollup.est_trace_count).label("total_traces"),
+                func.sum(rollup.est_latency_sum_ms).label("latency_sum"),
+                func.sum(rollup.est_latency_count).label("latency_count"),
+                func.sum(rollup.est_cost_usd).label("total_cost"),
+                func.sum(rollup.est_total_tokens).label("total_tokens"),
+                func.jordy_merge_counts_agg(rollup.latency_bins).label("latency_bins"),
+                func.sum(rollup.latency_zero_count).label("latency_zero_count")
+            ).where(
+                rollup.project_id == project_id,
+                rollup.granularity == stats_granularity,
+                rollup.model == "",
+                rollup.bucket_start >= truncate(since, stats_granularity)
+            )
+        )).first()
 
         # 2. Daily Volume
-        daily_stats = db.query(
-            func.date_trunc('day', models.Trace.start_time).label("day"),
-            func.count(models.Trace.id).label("count")
-        ).filter(
-            models.Trace.project_id == project_id,
-            models.Trace.start_time >= since
-        ).group_by("day").order_by("day").all()
+        daily_stats = (await db.execute(
+            select(
+                rollup.bucket_start.label("day"),
+                rollup.est_trace_count.label("count")
+            ).where(
+                rollup.project_id == project_id,
+                rollup.granularity == "day",
+                rollup.model == "",
+                rollup.bucket_start >= truncate(since, "day")
+            ).order_by(rollup.bucket_start)
+        )).all()
 
         # 3. Model Distribution
-        model_dist = db.query(
-            models.Span.model,
-            func.count(models.Span.id).label("count")
-        ).join(models.Trace).filter(
-            models.Trace.project_id == project_id,
-            models.Span.span_type == "llm"
-        ).group_by(models.Span.model).all()
+        model_dist = (await db.execute(
+            select(
+                rollup.model,
+                func.sum(rollup.est_span_count).label("count")
+            ).where(
+                rollup.project_id == project_id,
+                rollup.granularity == "day",
+                rollup.model != "",
+                rollup.bucket_start >= truncate(since, "day")
+            ).group_by(rollup.model)
+        )).all()
+
+        avg_latency = (stats.latency_sum or 0) / stats.latency_count if stats.latency_count else 0.0
+        percentiles = merge_sketches([stats]).quantiles((0.5, 0.95, 0.99))
 
         return {
             "summary": {
-                "total_traces": stats.total_traces or 0,
-                "avg_latency": float(stats.avg_latency or 0),
+                "total_traces": round(stats.total_traces or 0),
+                "sampled_traces": int(stats.sampled_traces or 0),
+                "avg_latency": float(avg_latency),
+                "p50_latency": percentiles[0.5],
+                "p95_latency": percentiles[0.95],
+                "p99_latency": percentiles[0.99],
                 "total_cost": float(stats.total_cost or 0),
-                "total_tokens": int(stats.total_tokens or 0)
+                "total_tokens": round(stats.total_tokens or 0)
             },
-            "timeline": [{"day": str(s.day.date()), "count": s.count} for s in daily_stats],
-            "models": [{"model": s.model, "count": s.count} for s in model_dist if s.model]
+            "timeline": [{"day": str(s.day.date()), "count": round(s.count)} for s in daily_stats],
+            "models": [{"model": s.model, "count": round(s.count)} for s in model_dist if s.model]
         }
@@ -0,0 +1,411 @@
+import asyncio
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..core.cache import TTLCache
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models import models
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Postgres rows per INSERT, well under the bind parameter limit
+_PG_CHUNK_ROWS = 500
+# Blob rows per DELETE when collecting unused blobs
+_PG_DELETE_ROWS = 1000
+
+
+def compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Inverse of `compress`; the codec is recognized by its magic bytes.
+    """
+    if data[:4] == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class BlobStore:
+    """
+    Content-addressed store for payload blobs, keyed per project by
+    "sha256:<hex>" of the uncompressed bytes.
+
+    Blobs are compressed (zstd, else zlib) before they reach a backend, and
+    each digest is written once: `put_many` skips digests it stored or saw
+    recently, and backends never overwrite an existing blob. Subclasses
+    implement the object-store primitives `_exists`, `_put` and `_get` on
+    compressed bytes (S3 semantics), or override the batch methods when the
+    backend can do better.
+
+    Backends with `tracks_last_seen` also record when each blob was last
+    written or referenced by ingested rows (`touch_many`), and retention
+    deletes blobs unseen since its cutoff (`delete_unseen`). Others keep
+    every blob.
+    """
+
+    tracks_last_seen = False
+
+    def __init__(self, known_cache_size: int = 100_000, known_ttl_seconds: float = 3600.0):
+        # Digests known to be stored, so a hot system prompt costs no lookup at all
+        self._known = TTLCache(known_cache_size, known_ttl_seconds, 0.0)
+        self.stored = 0
+        self.deduplicated = 0
+
+    async def put_many(self, project_id: UUID, blobs: Dict[str, bytes]) -> int:
+        """
+        Store uncompressed blobs by digest; returns how many were new.
+        """
+        pending = {
+            digest: data for digest, data in blobs.items()
+            if not self._known.get((project_id, digest))[0]
+        }
+        self.deduplicated += len(blobs) - len(pending)
+        if not pending:
+            return 0
+        stored = await self._put_many(project_id, pending)
+        for digest in pending:
+            self._known.set((project_id, digest), True)
+        self.stored += stored
+        self.deduplicated += len(pending) - stored
+        return stored
+
+    async def touch_many(self, project_id: UUID, digests: Iterable[str]):
+        """
+        Record that rows being stored reference these digests. Like
+        `put_many`, a digest costs a backend call at most once per
+        known-digest TTL.
+        """
+        if not self.tracks_last_seen:
+            return
+        pending = [digest for digest in dict.fromkeys(digests) if not self._known.get((project_id, digest))[0]]
+        if not pending:
+            return
+        found = await self._touch_many(project_id, pending)
+        for digest in found:
+            self._known.set((project_id, digest), True)
+        if len(found) < len(pending):
+            logger.warning(f"{len(pending) - len(found)} referenced blobs of project {project_id} are missing")
+
+    async def delete_unseen(self, project_id: UUID, before: datetime) -> int:
+        """
+        Delete a project's blobs last written or touched before `before`
+        less one known-digest TTL (a process may reference a cached digest
+        that long after it last touched it); returns how many were deleted.
+        """
+        if not self.tracks_last_seen:
+            return 0
+        horizon = before - timedelta(seconds=self._known.ttl_seconds)
+        deleted = await self._delete_unseen(project_id, horizon)
+        for digest in deleted:
+            self._known.invalidate((project_id, digest))
+        return len(deleted)
+
+    async def get_many(self, project_id: UUID, digests: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Uncompressed content of the digests that exist.
+        """
+        return await self._get_many(project_id, list(dict.fromkeys(digests)))
+
+    async def get(self, project_id: UUID, digest: str) -> Optional[bytes]:
+        return (await self.get_many(project_id, [digest])).get(digest)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stored": self.stored, "deduplicated": self.deduplicated}
+
+    async def _put_many(self, project_id: UUID, blobs: Dict[str, bytes]) -> int:
+        def put_all() -> int:
+            stored = 0
+            for digest, data in blobs.items():
+                key = self._key(project_id, digest)
+                if not self._exists(key):
+                    self._put(key, compress(data))
+                    stored += 1
+                elif self.tracks_last_seen:
+                    self._touch(key)
+            return stored
+
+        return await asyncio.to_thread(put_all)
+
+    async def _touch_many(self, project_id: UUID, digests: List[str]) -> List[str]:
+        def touch_all() -> List[str]:
+            return [digest for digest in digests if self._touch(self._key(project_id, digest))]
+
+        return await asyncio.to_thread(touch_all)
+
+    async def _get_many(self, project_id: UUID, digests: List[str]) -> Dict[str, bytes]:
+        def get_all() -> Dict[str, bytes]:
+            found = {}
+            for digest in digests:
+                data = self._get(self._key(project_id, digest))
+                if data is not None:
+                    found[digest] = decompress(data)
+            return found
+
+        return await asyncio.to_thread(get_all)
+
+    @staticmethod
+    def _key(project_id: UUID, digest: str) -> str:
+        algorithm, hexdigest = digest.split(":", 1)
+        # Two levels of fan-out keep directories (and S3 listings) small
+        return f"{project_id}/{algorithm}/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}"
+
+    def _exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _put(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def _get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _touch(self, key: str) -> bool:
+        """
+        Mark a blob as just seen; False when it doesn't exist.
+        """
+        raise NotImplementedError
+
+    async def _delete_unseen(self, project_id: UUID, before: datetime) -> List[str]:
+        raise NotImplementedError
+
+
+class FilesystemBlobStore(BlobStore):
+    """
+    Blobs as files under `root`. Writes go to a temporary file that is
+    renamed into place, so readers never see a partial blob. A blob's
+    mtime is when it was last written or touched.
+    """
+
+    tracks_last_seen = True
+
+    def __init__(self, root: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def _put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, key: str) -> bool:
+        try:
+            os.utime(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def _delete_unseen(self, project_id: UUID, before: datetime) -> List[str]:
+        cutoff = before.replace(tzinfo=timezone.utc).timestamp()
+        project_root = os.path.join(self.root, str(project_id))
+
+        def delete_all() -> List[str]:
+            deleted = []
+            for algorithm in os.listdir(project_root) if os.path.isdir(project_root) else ():
+                for directory, _, names in os.walk(os.path.join(project_root, algorithm)):
+                    for name in names:
+                        path = os.path.join(directory, name)
+                        if name.endswith(".tmp") or os.path.getmtime(path) >= cutoff:
+                            continue
+                        os.remove(path)
+                        deleted.append(f"{algorithm}:{name}")
+            return deleted
+
+        return await asyncio.to_thread(delete_all)
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs as objects in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+    Needs boto3, which is not installed by default. S3 keeps no last-seen
+    time, so retention never deletes these blobs; a bucket lifecycle rule
+    would expire hot blobs that recent rows still reference.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _put(self, key: str, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+
+class PostgresBlobStore(BlobStore):
+    """
+    Blobs as compressed bytea rows in `payload_blobs`, written in batches
+    that only bump `last_seen_at` of existing rows. Rows uploaded before
+    blobs were compressed keep their text in `content` and are still readable.
+    """
+
+    tracks_last_seen = True
+
+    async def _put_many(self, project_id: UUID, blobs: Dict[str, bytes]) -> int:
+        table = models.PayloadBlob.__table__
+        now = datetime.utcnow()
+        rows = [
+            {
+                "project_id": project_id, "digest": digest, "data": compress(data),
+                "size_bytes": len(data), "last_seen_at": now,
+            }
+            for digest, data in blobs.items()
+        ]
+        stored = 0
+        async with AsyncSessionLocal() as db:
+            for i in range(0, len(rows), _PG_CHUNK_ROWS):
+                insert = pg_insert(table).values(rows[i:i + _PG_CHUNK_ROWS])
+                result = await db.execute(
+                    insert.on_conflict_do_update(
+                        index_elements=[table.c.project_id, table.c.digest],
+                        set_={"last_seen_at": insert.excluded.last_seen_at},
+                    )
+                    # xmax is 0 only on rows this statement inserted
+                    .returning(literal_column("xmax = 0"))
+                )
+                stored += sum(1 for (inserted,) in result if inserted)
+            await db.commit()
+        return stored
+
+    async def _touch_many(self, project_id: UUID, digests: List[str]) -> List[str]:
+        table = models.PayloadBlob.__table__
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(table)
+                .where(table.c.project_id == project_id, table.c.digest.in_(digests))
+                .values(last_seen_at=datetime.utcnow())
+                .returning(table.c.digest)
+            )
+            found = list(result.scalars())
+            await db.commit()
+        return found
+
+    async def _delete_unseen(self, project_id: UUID, before: datetime) -> List[str]:
+        table = models.PayloadBlob.__table__
+        deleted: List[str] = []
+        while True:
+            unseen = (
+                select(table.c.digest)
+                .where(table.c.project_id == project_id, table.c.last_seen_at < before)
+                .limit(_PG_DELETE_ROWS)
+            )
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    table.delete()
+                    .where(
+                        table.c.project_id == project_id,
+                        table.c.digest.in_(unseen),
+                        # Rechecked on rows touched while the delete waited for them
+                        table.c.last_seen_at < before,
+                    )
+                    .returning(table.c.digest)
+                )
+                batch = list(result.scalars())
+                await db.commit()
+            deleted.extend(batch)
+            if len(batch) < _PG_DELETE_ROWS:
+                return deleted
+
+    async def _get_many(self, project_id: UUID, digests: List[str]) -> Dict[str, bytes]:
+        blob = models.PayloadBlob
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(blob.digest, blob.data, blob.content).where(
+                    blob.project_id == project_id, blob.digest.in_(digests)
+                )
+            )
+            found = {}
+            for digest, data, content in result:
+                found[digest] = decompress(data) if data is not None else content.encode("utf-8")
+            return found
+
+
+def create_blob_store() -> BlobStore:
+    """
+    Build the blob store configured by BLOB_STORE_BACKEND.
+    """
+    options = {
+        "known_cache_size": settings.BLOB_KNOWN_CACHE_SIZE,
+        "known_ttl_seconds": settings.BLOB_KNOWN_TTL_SECONDS,
+    }
+    if settings.BLOB_STORE_BACKEND == "postgres":
+        return PostgresBlobStore(**options)
+    if settings.BLOB_STORE_BACKEND == "filesystem":
+        return FilesystemBlobStore(settings.BLOB_STORE_PATH, **options)
+    if settings.BLOB_STORE_BACKEND == "s3":
+        return S3BlobStore(
+            settings.BLOB_S3_BUCKET,
+            prefix=settings.BLOB_S3_PREFIX,
+            endpoint_url=settings.BLOB_S3_ENDPOINT_URL,
+            region=settings.BLOB_S3_REGION,
+            **options,
+        )
+    raise ValueError(f"Unknown blob store backend: {settings.BLOB_STORE_BACKEND}")
+
+
+blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global blob_store
+    if blob_store is None:
+        blob_store = create_blob_store()
+    return blob_store
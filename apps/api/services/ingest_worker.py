@@ -0,0 +1,153 @@
+import asyncio
+import os
+import socket
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import exc, select
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..core.ingest_queue import QueuedTrace
+from ..models import models
+from .pricing import pricing_catalog
+from .tail_sampler import TailSamplingPolicy
+from .trace_processor import prepare_trace_batch, write_trace_rows
+
+
+class IngestWorkerPool:
+    """
+    Pool of consumers that drain the ingest queue into Postgres in batches.
+
+    A batch is only acked after its transaction commits. If the write fails
+    the messages stay pending and are redelivered, so a slow or unavailable
+    database delays persistence but never loses accepted traces.
+
+    A batch that keeps failing for another reason (one trace the database
+    rejects) would block the messages behind it forever. Once a message has
+    been delivered `max_deliveries` times, its batch is written one trace at
+    a time and only the traces that still fail are dead-lettered.
+
+    Consumer names include the host and pid, so every process has its own
+    pending list; a process that goes away has its messages reclaimed by
+    the others after the queue's idle timeout.
+    """
+
+    def __init__(self, queue: Any, concurrency: int, batch_size: int, block_ms: int, max_deliveries: int = 5):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.max_deliveries = max_deliveries
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._consume(f"{prefix}-worker-{i}")))
+        logger.info(f"Started {self.concurrency} ingest workers")
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _consume(self, consumer: str):
+        backoff = 0.5
+        while not self._stopping.is_set():
+            try:
+                messages = await self.queue.read(consumer, self.batch_size, self.block_ms)
+                if not messages:
+                    continue
+                await self._process(messages)
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingest worker {consumer} failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def _process(self, messages: List[QueuedTrace]):
+        by_project: Dict[UUID, List[QueuedTrace]] = defaultdict(list)
+        for message in messages:
+            by_project[message.project_id].append(message)
+
+        # A failing project must not hold back the others read in the same batch
+        error: Optional[Exception] = None
+        for project_id, project_messages in by_project.items():
+            try:
+                await self._process_project(project_id, project_messages)
+            except Exception as e:
+                logger.error(f"Failed to write {len(project_messages)} queued traces of project {project_id}: {e}")
+                error = error or e
+        if error is not None:
+            raise error
+
+    async def _process_project(self, project_id: UUID, messages: List[QueuedTrace]):
+        try:
+            await self._write(project_id, [m.payload for m in messages])
+        except Exception as e:
+            if _is_transient(e) or max(m.deliveries for m in messages) < self.max_deliveries:
+                raise
+            await self._write_one_by_one(project_id, messages)
+        else:
+            await self.queue.ack([m.message_id for m in messages])
+
+    async def _write_one_by_one(self, project_id: UUID, messages: List[QueuedTrace]):
+        for message in messages:
+            try:
+                await self._write(project_id, [message.payload])
+            except Exception as e:
+                if _is_transient(e):
+                    raise
+                logger.error(
+                    f"Dead-lettering queued trace {message.payload.get('id')} of project {project_id} "
+                    f"after {message.deliveries} deliveries: {e}"
+                )
+                await self.queue.dead_letter(message, str(e))
+            else:
+                await self.queue.ack([message.message_id])
+
+    @staticmethod
+    async def _write(project_id: UUID, payloads: List[Dict[str, Any]]):
+        await pricing_catalog.refresh()
+        async with AsyncSessionLocal() as db:
+            # Read per batch so sampling changes apply without restarting workers
+            project = (await db.execute(
+                select(models.Project.settings, models.Project.organization_id).where(models.Project.id == project_id)
+            )).one_or_none()
+            project_settings, organization_id = project if project is not None else (None, None)
+
+            results, trace_rows, span_rows = prepare_trace_batch(payloads, project_id, organization_id)
+            for result in results:
+                if result.status == "rejected":
+                    # Already validated at accept time, so this is a poison message: drop it
+                    logger.error(f"Dropping queued trace {result.id}: {result.error}")
+
+            sampling = TailSamplingPolicy.from_settings(project_settings)
+            duplicates = await write_trace_rows(db, trace_rows, span_rows, sampling)
+            if duplicates:
+                logger.info(f"Skipped {len(duplicates)} traces of project {project_id} that were already stored")
+
+
+def _is_transient(error: Exception) -> bool:
+    # Connection trouble fails every trace alike; keep retrying instead of dead-lettering
+    if isinstance(error, (OSError, asyncio.TimeoutError, exc.OperationalError, exc.InterfaceError)):
+        return True
+    return bool(getattr(error, "connection_invalidated", False))
+
+
+def create_worker_pool(queue: Any) -> IngestWorkerPool:
+    return IngestWorkerPool(
+        queue,
+        concurrency=settings.INGEST_WORKERS,
+        batch_size=settings.INGEST_WORKER_BATCH_SIZE,
+        block_ms=settings.INGEST_WORKER_BLOCK_MS,
+        max_deliveries=settings.INGEST_MAX_DELIVERIES,
+    )
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from .blob_store import get_blob_store
+
+BLOB_KEY = "$blob"
+TRACE_PAYLOAD_FIELDS = ("input", "output")
+SPAN_PAYLOAD_FIELDS = ("input", "output", "documents")
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get(BLOB_KEY), str)
+
+
+class PayloadOffloader:
+    """
+    Moves large payload values of trace/span rows into the blob store.
+
+    Strings of at least `inline_max_bytes` (a repeated system prompt, a
+    retrieved document) are replaced by `{"$blob": digest, "bytes": n,
+    "preview": ...}`, the same reference the SDK writes, so identical text
+    is stored once however many spans carry it. A field still larger than
+    `inline_max_bytes` once serialized is then offloaded whole, with
+    `"format": "json"` on its reference. Values that already are references
+    are left alone, and their digests collected in `referenced`.
+    """
+
+    def __init__(self, inline_max_bytes: int, preview_chars: int):
+        self.inline_max_bytes = inline_max_bytes
+        self.preview_chars = preview_chars
+        # Strings at most this many chars can't reach the limit (UTF-8 is <= 4 bytes per char)
+        self._fast_chars = inline_max_bytes // 4
+        self.blobs: Dict[str, bytes] = {}
+        self.referenced: Set[str] = set()
+
+    def field(self, value: Any) -> Any:
+        if value is None:
+            return value
+        if is_blob_ref(value):
+            self.referenced.add(value[BLOB_KEY])
+            return value
+        value = self._strings(value)
+        text = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+        if len(text) <= self._fast_chars:
+            return value
+        data = text.encode("utf-8")
+        if len(data) < self.inline_max_bytes:
+            return value
+        ref = self._ref(data, text)
+        ref["format"] = "json"
+        return ref
+
+    def _strings(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) <= self._fast_chars:
+                return value
+            data = value.encode("utf-8")
+            return self._ref(data, value) if len(data) >= self.inline_max_bytes else value
+        if isinstance(value, dict):
+            if is_blob_ref(value):
+                self.referenced.add(value[BLOB_KEY])
+                return value
+            return {k: self._strings(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._strings(v) for v in value]
+        return value
+
+    def _ref(self, data: bytes, text: str) -> Dict[str, Any]:
+        digest = "sha256:" + hashlib.sha256(data).hexdigest()
+        self.blobs[digest] = data
+        return {BLOB_KEY: digest, "bytes": len(data), "preview": text[:self.preview_chars]}
+
+
+async def offload_payloads(
+    project_id: uuid.UUID,
+    trace_rows: Iterable[Dict[str, Any]],
+    span_rows: Iterable[Dict[str, Any]]
+) -> int:
+    """
+    Replace large payload fields of rows about to be inserted with blob
+    references, in place, and store the blobs. Called before the rows are
+    written so a stored row never points at a missing blob; returns the
+    number of distinct blobs offloaded. PAYLOAD_INLINE_MAX_BYTES=0 keeps
+    every payload inline.
+
+    Blobs the rows already reference (uploaded by the SDK) are touched in
+    the store, so retention doesn't collect a blob that new rows still use.
+    """
+    store = get_blob_store()
+    if settings.PAYLOAD_INLINE_MAX_BYTES <= 0:
+        if store.tracks_last_seen:
+            refs: List[Dict[str, Any]] = []
+            for rows, fields in ((trace_rows, TRACE_PAYLOAD_FIELDS), (span_rows, SPAN_PAYLOAD_FIELDS)):
+                for row in rows:
+                    for field in fields:
+                        _collect_refs(row.get(field), refs)
+            await store.touch_many(project_id, [ref[BLOB_KEY] for ref in refs])
+        return 0
+    offloader = PayloadOffloader(settings.PAYLOAD_INLINE_MAX_BYTES, settings.PAYLOAD_PREVIEW_CHARS)
+    for rows, fields in ((trace_rows, TRACE_PAYLOAD_FIELDS), (span_rows, SPAN_PAYLOAD_FIELDS)):
+        for row in rows:
+            for field in fields:
+                if row.get(field) is not None:
+                    row[field] = offloader.field(row[field])
+    if offloader.blobs:
+        await store.put_many(project_id, offloader.blobs)
+    if offloader.referenced:
+        await store.touch_many(project_id, offloader.referenced - offloader.blobs.keys())
+    return len(offloader.blobs)
+
+
+def _collect_refs(value: Any, refs: List[Dict[str, Any]]):
+    if isinstance(value, dict):
+        if is_blob_ref(value):
+            refs.append(value)
+            return
+        for v in value.values():
+            _collect_refs(v, refs)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_refs(v, refs)
+
+
+def _ref_key(ref: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    return ref[BLOB_KEY], ref.get("format")
+
+
+def _expand(value: Any, contents: Dict[Tuple[str, Optional[str]], Any]) -> Any:
+    if isinstance(value, dict):
+        if is_blob_ref(value):
+            return contents.get(_ref_key(value), value)
+        return {k: _expand(v, contents) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand(v, contents) for v in value]
+    return value
+
+
+async def expand_payloads(
+    project_id: uuid.UUID,
+    items: Iterable[Dict[str, Any]],
+    fields: Iterable[str] = SPAN_PAYLOAD_FIELDS,
+    children_keys: Iterable[str] = ()
+):
+    """
+    Swap blob references in the payload fields of `items` (and of the items
+    nested under `children_keys`, e.g. a trace's spans) for the stored
+    content, in place. All
+    blobs are fetched with one `get_many`, plus one more round when a
+    whole-field blob itself holds string references. References whose blob
+    is missing are left as they are.
+    """
+    fields = tuple(fields)
+    children_keys = tuple(children_keys)
+    holders: List[Dict[str, Any]] = []
+    stack = list(items)
+    while stack:
+        item = stack.pop()
+        holders.append(item)
+        for key in children_keys:
+            stack.extend(item.get(key) or [])
+
+    store = get_blob_store()
+    contents: Dict[Tuple[str, Optional[str]], Any] = {}
+    while True:
+        refs: List[Dict[str, Any]] = []
+        for item in holders:
+            for field in fields:
+                _collect_refs(item.get(field), refs)
+        pending = {_ref_key(ref) for ref in refs} - contents.keys()
+        if not pending:
+            return
+        blobs = await store.get_many(project_id, (digest for digest, _ in pending))
+        for digest, fmt in pending:
+            data = blobs.get(digest)
+            # Missing blobs map to their reference, so they are not fetched again
+            if data is None:
+                contents[(digest, fmt)] = next(ref for ref in refs if _ref_key(ref) == (digest, fmt))
+            else:
+                contents[(digest, fmt)] = json.loads(data) if fmt == "json" else data.decode("utf-8")
+        for item in holders:
+            for field in fields:
+                if item.get(field) is not None:
+                    item[field] = _expand(item[field], contents)
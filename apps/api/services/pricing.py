@@ -0,0 +1,317 @@
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models import models
+from ..schemas import schemas
+from .retention import RetentionPolicy
+from .rollup_service import RollupService, truncate
+
+_EPOCH = datetime(1970, 1, 1)
+
+# The start_time bounds let TimescaleDB skip every trace and span chunk
+# outside the batch: a trace's spans start between its start and its end
+TRACE_COST_SQL = """
+UPDATE traces t SET total_cost_usd = s.cost_usd
+FROM (
+    SELECT trace_id, coalesce(sum(cost_usd), 0) AS cost_usd
+    FROM spans
+    WHERE trace_id = ANY(:trace_ids) AND start_time >= :since AND start_time <= :spans_until
+    GROUP BY trace_id
+) s
+WHERE t.id = s.trace_id AND t.start_time >= :since AND t.start_time <= :until
+"""
+
+
+def to_epoch(ts: Optional[datetime]) -> float:
+    """
+    Seconds since the epoch; naive datetimes are read as UTC, like the database columns.
+    """
+    if ts is None:
+        return time.time()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts - _EPOCH).total_seconds()
+
+
+class PriceVersions:
+    """
+    Price versions of one model for one owner, as arrays sorted by effective date.
+    """
+
+    __slots__ = ("effective", "prompt", "completion")
+
+    def __init__(self, rows: List[Any]):
+        rows = sorted(rows, key=lambda row: row.effective_from)
+        self.effective = np.array([to_epoch(row.effective_from) for row in rows], dtype=float)
+        self.prompt = np.array([row.prompt_usd_per_1k for row in rows], dtype=float)
+        self.completion = np.array([row.completion_usd_per_1k for row in rows], dtype=float)
+
+    def lookup(self, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (found, prompt rates, completion rates) of the version in effect at each
+        time; `found` is False for times before the first version.
+        """
+        pos = np.searchsorted(self.effective, times, side="right") - 1
+        found = pos >= 0
+        pos = np.maximum(pos, 0)
+        return found, self.prompt[pos], self.completion[pos]
+
+
+class PricingCatalog:
+    """
+    In-memory copy of model_prices used to price spans on the ingest path.
+
+    Span models match a price by exact name or longest prefix, so "gpt-4o"
+    prices "gpt-4o-2024-08-06". An organization's override wins over the
+    global price of the same (or a shorter) name; at times before the
+    override's first version the global price applies. Models without any
+    price are charged `default_usd_per_1k` for all tokens.
+
+    `refresh()` is meant to be awaited before each write: at most every
+    `refresh_seconds` it compares the table's row count and newest
+    created_at with the loaded copy and reloads only when they differ.
+    `invalidate()` makes the next call check (and reload) right away.
+    """
+
+    def __init__(self, refresh_seconds: float, default_usd_per_1k: float):
+        self.refresh_seconds = refresh_seconds
+        self.default_usd_per_1k = default_usd_per_1k
+        self.reloads = 0
+
+        self._versions: Dict[Tuple[Optional[uuid.UUID], str], PriceVersions] = {}
+        # Priced model names per owner (None: global), longest first
+        self._names: Dict[Optional[uuid.UUID], List[str]] = {}
+        self._resolved: Dict[Tuple[Optional[uuid.UUID], str], Tuple[PriceVersions, ...]] = {}
+        self._fingerprint: Optional[Tuple[Any, ...]] = None
+        self._next_check = 0.0
+        self._lock = asyncio.Lock()
+
+    def load(self, rows: Iterable[Any]):
+        """
+        Replace the lookup tables with `rows` (ModelPrice or anything with its columns).
+        """
+        grouped: Dict[Tuple[Optional[uuid.UUID], str], List[Any]] = defaultdict(list)
+        for row in rows:
+            grouped[(row.organization_id, row.model)].append(row)
+        versions = {key: PriceVersions(group) for key, group in grouped.items()}
+        names: Dict[Optional[uuid.UUID], List[str]] = defaultdict(list)
+        for owner, model in versions:
+            names[owner].append(model)
+        for owner_names in names.values():
+            owner_names.sort(key=len, reverse=True)
+        # Swapped whole, so a concurrent pricing pass sees either the old table or the new one
+        self._versions, self._names, self._resolved = versions, dict(names), {}
+        self.reloads += 1
+
+    def invalidate(self):
+        self._next_check = 0.0
+
+    async def refresh(self):
+        if time.monotonic() < self._next_check:
+            return
+        async with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self._reload_if_changed(db)
+            except Exception as e:
+                # Keep pricing with the last loaded table; the next check retries
+                logger.error(f"Failed to refresh model prices: {e}")
+            self._next_check = time.monotonic() + self.refresh_seconds
+
+    async def _reload_if_changed(self, db: AsyncSession):
+        price = models.ModelPrice
+        fingerprint = tuple((await db.execute(select(func.count(), func.max(price.created_at)))).one())
+        if fingerprint == self._fingerprint:
+            return
+        rows = (await db.execute(select(price))).scalars().all()
+        self.load(rows)
+        self._fingerprint = fingerprint
+        logger.info(f"Loaded {len(rows)} model prices")
+
+    def price_spans(self, span_rows: List[Dict[str, Any]], organization_id: Optional[uuid.UUID] = None):
+        """
+        Set `cost_usd` on span rows in one vectorized pass.
+
+        Rates are looked up once per distinct model for all of its spans, by
+        each span's start_time. Usage reported only as total_tokens is
+        charged at the prompt rate.
+        """
+        n = len(span_rows)
+        if not n:
+            return
+        prompt = np.fromiter((row["prompt_tokens"] or 0 for row in span_rows), dtype=float, count=n)
+        completion = np.fromiter((row["completion_tokens"] or 0 for row in span_rows), dtype=float, count=n)
+        total = np.fromiter((row["total_tokens"] or 0 for row in span_rows), dtype=float, count=n)
+        prompt = np.where((prompt == 0) & (completion == 0), total, prompt)
+        times = np.fromiter((to_epoch(row["start_time"]) for row in span_rows), dtype=float, count=n)
+
+        prompt_rate = np.full(n, self.default_usd_per_1k)
+        completion_rate = np.full(n, self.default_usd_per_1k)
+        by_model: Dict[str, List[int]] = defaultdict(list)
+        for i, row in enumerate(span_rows):
+            if row["model"]:
+                by_model[row["model"]].append(i)
+
+        for model, indexes in by_model.items():
+            pending = np.array(indexes)
+            for versions in self._resolve(organization_id, model):
+                found, prompt_rates, completion_rates = versions.lookup(times[pending])
+                prompt_rate[pending[found]] = prompt_rates[found]
+                completion_rate[pending[found]] = completion_rates[found]
+                pending = pending[~found]
+                if not pending.size:
+                    break
+
+        costs = (prompt * prompt_rate + completion * completion_rate) / 1000
+        for row, cost in zip(span_rows, costs.tolist()):
+            row["cost_usd"] = cost
+
+    def _resolve(self, organization_id: Optional[uuid.UUID], model: str) -> Tuple[PriceVersions, ...]:
+        """
+        Price versions to try for a span model, override first. Cached until the next reload.
+        """
+        key = (organization_id, model)
+        chain = self._resolved.get(key)
+        if chain is None:
+            global_name = self._match(None, model)
+            org_name = self._match(organization_id, model) if organization_id is not None else None
+            chain = ()
+            # A more specific global price beats a broader override ("gpt-4" vs "gpt-4o-mini")
+            if org_name is not None and (global_name is None or len(org_name) >= len(global_name)):
+                chain += (self._versions[(organization_id, org_name)],)
+            if global_name is not None:
+                chain += (self._versions[(None, global_name)],)
+            self._resolved[key] = chain
+        return chain
+
+    def _match(self, owner: Optional[uuid.UUID], model: str) -> Optional[str]:
+        for name in self._names.get(owner, ()):
+            if model.startswith(name):
+                return name
+        return None
+
+
+# Process-wide catalog; other processes pick up price changes within PRICING_REFRESH_SECONDS
+pricing_catalog = PricingCatalog(
+    refresh_seconds=settings.PRICING_REFRESH_SECONDS,
+    default_usd_per_1k=settings.PRICING_DEFAULT_USD_PER_1K,
+)
+
+
+async def recompute_costs(
+    db: AsyncSession,
+    request: schemas.PriceRecompute,
+    catalog: PricingCatalog = pricing_catalog,
+    batch_rows: int = settings.PRICING_RECOMPUTE_BATCH_ROWS,
+) -> schemas.PriceRecomputeResult:
+    """
+    Reprice stored spans that started in [since, until) with the current
+    prices, then correct their traces' total_cost_usd and rebuild the
+    projects' rollups over the (day-aligned) window.
+
+    Spans are read in keyset batches of `batch_rows` per project, ordered on
+    (start_time, id) so each batch is a range scan of the partitioning
+    column, and each batch is committed on its own, so a long window never holds one huge
+    transaction; rerunning after an interruption is safe. The window is
+    clipped to each project's retention: rebuilding rollups for days whose
+    raw rows have expired would erase them.
+    """
+    catalog.invalidate()
+    await catalog.refresh()
+
+    projects_query = select(models.Project.id, models.Project.organization_id, models.Project.settings)
+    if request.organization_id is not None:
+        projects_query = projects_query.where(models.Project.organization_id == request.organization_id)
+    projects = (await db.execute(projects_query)).all()
+
+    span = models.Span.__table__
+    trace = models.Trace.__table__
+    since = truncate(request.since, "day")
+    until = truncate(request.until, "day")
+    if until < request.until:
+        until += timedelta(days=1)
+    result = schemas.PriceRecomputeResult(projects=0, spans=0, traces=0)
+
+    for project_id, organization_id, project_settings in projects:
+        project_since = since
+        policy = RetentionPolicy.from_settings(project_settings)
+        if policy is not None:
+            project_since = max(since, policy.cutoff())
+        if project_since >= until:
+            continue
+        query = (
+            select(
+                span.c.id, span.c.trace_id, span.c.model, span.c.start_time,
+                span.c.prompt_tokens, span.c.completion_tokens, span.c.total_tokens,
+                trace.c.start_time.label("trace_start_time"),
+                trace.c.end_time.label("trace_end_time"),
+            )
+            .select_from(span.join(trace, trace.c.id == span.c.trace_id))
+            .where(
+                trace.c.project_id == project_id,
+                span.c.start_time >= max(request.since, project_since),
+                span.c.start_time < request.until,
+            )
+            .order_by(span.c.start_time, span.c.id)
+            .limit(batch_rows)
+        )
+        if request.model:
+            query = query.where(span.c.model.startswith(request.model, autoescape=True))
+
+        last: Optional[Dict[str, Any]] = None
+        repriced = 0
+        while True:
+            page = query if last is None else query.where(and_(
+                span.c.start_time >= last["start_time"],
+                or_(span.c.start_time > last["start_time"], span.c.id > last["id"]),
+            ))
+            rows = [dict(row) for row in (await db.execute(page)).mappings()]
+            if not rows:
+                break
+            catalog.price_spans(rows, organization_id)
+            # ORM bulk UPDATE by the (id, start_time) primary key: one executemany
+            # for the batch, each row pruned to its own chunk
+            await db.execute(
+                update(models.Span),
+                [{"id": row["id"], "start_time": row["start_time"], "cost_usd": row["cost_usd"]} for row in rows],
+            )
+            trace_ids = list({row["trace_id"] for row in rows})
+            trace_starts = [row["trace_start_time"] for row in rows]
+            trace_ends = [row["trace_end_time"] for row in rows]
+            # A trace that hasn't ended may still get spans, up to now
+            spans_until = datetime.utcnow() if None in trace_ends else max(trace_ends)
+            await db.execute(
+                text(TRACE_COST_SQL),
+                {
+                    "trace_ids": trace_ids,
+                    "since": min(trace_starts),
+                    "until": max(trace_starts),
+                    "spans_until": max(spans_until, max(row["start_time"] for row in rows)),
+                },
+            )
+            await db.commit()
+            repriced += len(rows)
+            result.traces += len(trace_ids)
+            last = rows[-1]
+
+        if repriced:
+            await RollupService.rebuild(db, project_id, project_since, until)
+            await db.commit()
+            result.projects += 1
+            result.spans += repriced
+            logger.info(f"Repriced {repriced} spans of project {project_id}")
+
+    return result
@@ -0,0 +1,248 @@
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models import models
+from ..schemas import schemas
+from .blob_store import get_blob_store
+from .rollup_service import rollup_cutoff, truncate
+from .trace_archive import TraceArchive, get_trace_archive
+
+# Rows referencing expired traces, handled like the ON DELETE rules they had
+# before the FKs into the hypertables were dropped (migration 007)
+DELETE_DEPENDENTS_SQL = (
+    "DELETE FROM evaluations WHERE trace_id = ANY(:ids)",
+    "DELETE FROM feedback WHERE trace_id = ANY(:ids)",
+    "UPDATE dataset_items SET trace_id = NULL, span_id = NULL WHERE trace_id = ANY(:ids)",
+)
+# start_time bounds let Timescale skip chunks that can't hold the rows; a
+# trace's spans start no earlier than the trace itself
+DELETE_SPANS_SQL = "DELETE FROM spans WHERE trace_id = ANY(:ids) AND start_time >= :since"
+DELETE_TRACES_SQL = "DELETE FROM traces WHERE id = ANY(:ids) AND start_time < :cutoff"
+
+DOWNSAMPLE_ROLLUPS_SQL = """
+DELETE FROM metric_rollups r
+USING (
+    SELECT project_id, granularity, bucket_start, model FROM metric_rollups
+    WHERE project_id = :project_id AND granularity = :granularity AND bucket_start < :cutoff
+    LIMIT :limit
+) d
+WHERE r.project_id = d.project_id AND r.granularity = d.granularity
+  AND r.bucket_start = d.bucket_start AND r.model = d.model
+"""
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Per-project retention, read from `project.settings["retention"]`:
+
+        {"traces_days": 30, "archive": true}
+
+    Traces that started more than `traces_days` whole days ago are deleted
+    with their spans, evaluations and feedback; with `archive` they are
+    first written to Parquet (see TraceArchive). Metric rollups are kept,
+    so dashboards still cover the expired range. Without `archive`, payload
+    blobs no row has written or referenced since the cutoff are deleted too
+    (archived rows keep referencing theirs). Missing keys fall back to
+    RETENTION_TRACES_DAYS / RETENTION_ARCHIVE.
+    """
+    traces_days: int
+    archive: bool = False
+
+    @classmethod
+    def from_settings(cls, project_settings: Optional[Dict[str, Any]]) -> Optional["RetentionPolicy"]:
+        config = (project_settings or {}).get("retention") or {}
+        days = config.get("traces_days", settings.RETENTION_TRACES_DAYS)
+        if not days:
+            return None
+        return cls(traces_days=int(days), archive=bool(config.get("archive", settings.RETENTION_ARCHIVE)))
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        # Whole days, so a day's archive partition is complete once written
+        return truncate(now or datetime.utcnow(), "day") - timedelta(days=self.traces_days)
+
+
+def _lock_key(project_id: uuid.UUID) -> int:
+    return int.from_bytes(project_id.bytes[:8], "big", signed=True)
+
+
+class RetentionJob:
+    """
+    Background task that applies retention policies every `interval_seconds`.
+
+    Expired traces are deleted in batches of `batch_rows`, each in its own
+    short transaction, so the job never holds long locks or builds a huge
+    WAL burst. A transaction-level advisory lock per project keeps API
+    processes running the same job from expiring (and archiving) a project
+    at the same time. Rollup downsampling runs in the same pass.
+    """
+
+    def __init__(self, interval_seconds: float, batch_rows: int):
+        self.interval_seconds = interval_seconds
+        self.batch_rows = batch_rows
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Started retention job (every {self.interval_seconds}s)")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                result = await self.run_once()
+                if result.traces or result.rollups:
+                    logger.info(
+                        f"Retention: deleted {result.traces} traces, {result.spans} spans, "
+                        f"{result.blobs} payload blobs and {result.rollups} rollup rows; "
+                        f"wrote {result.archived_files} archive files"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self, project_id: Optional[uuid.UUID] = None) -> schemas.RetentionResult:
+        """
+        Apply every project's policy (or only `project_id`'s) and downsample rollups.
+        """
+        now = datetime.utcnow()
+        query = select(models.Project.id, models.Project.settings)
+        if project_id is not None:
+            query = query.where(models.Project.id == project_id)
+        async with AsyncSessionLocal() as db:
+            projects = (await db.execute(query)).all()
+
+        result = schemas.RetentionResult(projects=0, traces=0, spans=0, archived_files=0, rollups=0, blobs=0)
+        for pid, project_settings in projects:
+            policy = RetentionPolicy.from_settings(project_settings)
+            if policy is not None and await self.expire_project(pid, policy, now, result):
+                result.projects += 1
+            if policy is not None and not policy.archive and not self._stopping.is_set():
+                result.blobs += await get_blob_store().delete_unseen(pid, policy.cutoff(now))
+            result.rollups += await self.downsample_rollups(pid, now)
+        return result
+
+    async def expire_project(
+        self,
+        project_id: uuid.UUID,
+        policy: RetentionPolicy,
+        now: datetime,
+        result: schemas.RetentionResult
+    ) -> bool:
+        cutoff = policy.cutoff(now)
+        archive = get_trace_archive() if policy.archive else None
+        expired = False
+        while not self._stopping.is_set():
+            async with AsyncSessionLocal() as db:
+                batch = await self._expire_batch(db, project_id, cutoff, archive)
+            if batch is None:
+                break
+            traces, spans, files = batch
+            result.traces += traces
+            result.spans += spans
+            result.archived_files += files
+            expired = True
+        return expired
+
+    async def _expire_batch(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        cutoff: datetime,
+        archive: Optional[TraceArchive]
+    ) -> Optional[Tuple[int, int, int]]:
+        """
+        Delete (and archive) the oldest `batch_rows` expired traces of a
+        project in one transaction. None when there is nothing left to do
+        or another process holds the project's lock.
+        """
+        locked = (await db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _lock_key(project_id)}
+        )).scalar()
+        if not locked:
+            return None
+
+        trace = models.Trace.__table__
+        span = models.Span.__table__
+        # Only ids are needed unless the rows are archived first
+        columns = list(trace.c) if archive is not None else [trace.c.id, trace.c.start_time]
+        trace_rows = [dict(row) for row in (await db.execute(
+            select(*columns)
+            .where(trace.c.project_id == project_id, trace.c.start_time < cutoff)
+            .order_by(trace.c.start_time)
+            .limit(self.batch_rows)
+        )).mappings()]
+        if not trace_rows:
+            await db.rollback()
+            return None
+
+        ids = [row["id"] for row in trace_rows]
+        since = trace_rows[0]["start_time"]  # oldest: rows are ordered by start_time
+        files = 0
+        try:
+            if archive is not None:
+                span_rows: List[Dict[str, Any]] = [
+                    dict(row) for row in (await db.execute(
+                        select(*span.c).where(span.c.trace_id.in_(ids), span.c.start_time >= since)
+                    )).mappings()
+                ]
+                # Written before the delete commits: a failure leaves the rows in place
+                files = await archive.write(project_id, trace_rows, span_rows)
+            for statement in DELETE_DEPENDENTS_SQL:
+                await db.execute(text(statement), {"ids": ids})
+            spans = (await db.execute(text(DELETE_SPANS_SQL), {"ids": ids, "since": since})).rowcount
+            traces = (await db.execute(text(DELETE_TRACES_SQL), {"ids": ids, "cutoff": cutoff})).rowcount
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error expiring traces of project {project_id}: {e}")
+            raise
+        return traces, spans, files
+
+    async def downsample_rollups(self, project_id: uuid.UUID, now: datetime) -> int:
+        """
+        Delete a project's minute/hour rollups older than their retention,
+        in batches. Coarser rollups of the same range remain.
+        """
+        deleted = 0
+        for granularity in ("minute", "hour"):
+            cutoff = rollup_cutoff(granularity, now)
+            if cutoff is None:
+                continue
+            params = {"project_id": project_id, "granularity": granularity, "cutoff": cutoff, "limit": self.batch_rows}
+            while True:
+                async with AsyncSessionLocal() as db:
+                    count = (await db.execute(text(DOWNSAMPLE_ROLLUPS_SQL), params)).rowcount
+                    await db.commit()
+                deleted += count
+                if count < self.batch_rows:
+                    break
+        return deleted
+
+
+def create_retention_job() -> RetentionJob:
+    return RetentionJob(
+        interval_seconds=settings.RETENTION_INTERVAL_SECONDS,
+        batch_rows=settings.RETENTION_BATCH_ROWS,
+    )
@@ -0,0 +1,374 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models import models
+from ..utils.sketch import LOG_GAMMA, MIN_VALUE, DDSketch
+
+GRANULARITIES = ("minute", "hour", "day")
+UPSERT_CHUNK_ROWS = 1000
+
+SUM_COLUMNS = (
+    "trace_count", "span_count", "error_count",
+    "total_tokens", "prompt_tokens", "completion_tokens",
+    "cost_usd", "latency_count", "latency_sum_ms", "latency_zero_count",
+    "est_trace_count", "est_span_count", "est_error_count", "est_total_tokens",
+    "est_cost_usd", "est_latency_count", "est_latency_sum_ms",
+)
+
+
+def rollup_cutoff(granularity: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Start of the retained rollups of a granularity: older minute/hour buckets
+    are downsampled away by the retention job. None when all are kept.
+    """
+    days = {
+        "minute": settings.ROLLUP_MINUTE_RETENTION_DAYS,
+        "hour": settings.ROLLUP_HOUR_RETENTION_DAYS,
+    }.get(granularity)
+    if not days:
+        return None
+    return truncate(now or datetime.utcnow(), "day") - timedelta(days=days)
+
+
+def pick_granularity(since: datetime, until: Optional[datetime] = None) -> str:
+    """
+    Coarsest granularity that still resolves the window reasonably and is
+    still retained at `since`.
+    """
+    now = datetime.utcnow()
+    span = (until or now) - since
+    for granularity, max_span in (("minute", timedelta(hours=6)), ("hour", timedelta(days=14))):
+        cutoff = rollup_cutoff(granularity, now)
+        if span <= max_span and (cutoff is None or since >= cutoff):
+            return granularity
+    return "day"
+
+
+def merge_sketches(rows: Iterable[Any]) -> DDSketch:
+    """
+    Merge rollup rows carrying latency_bins/latency_zero_count into one sketch.
+    """
+    sketch = DDSketch()
+    for row in rows:
+        sketch.merge(DDSketch(row.latency_bins, row.latency_zero_count or 0))
+    return sketch
+
+
+def truncate(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupAccumulator:
+    """
+    Folds trace and span rows into one delta row per rollup key.
+
+    Plain counters record what was received; `est_*` columns and the
+    latency sketch weight each trace by 1 / sample_rate so totals stay
+    unbiased when the SDK head-samples. Memory is bounded by the number of
+    distinct (bucket, model) keys, not by the number of rows added.
+    """
+
+    def __init__(self):
+        self._deltas: Dict[Tuple, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def _delta_for(self, project_id, granularity, bucket, model) -> Dict[str, Any]:
+        key = (project_id, granularity, bucket, model)
+        row = self._deltas.get(key)
+        if row is None:
+            row = dict.fromkeys(SUM_COLUMNS, 0)
+            row.update(
+                project_id=project_id, granularity=granularity, bucket_start=bucket, model=model,
+                latency_min_ms=None, latency_max_ms=None, latency_bins=DDSketch(),
+            )
+            self._deltas[key] = row
+        return row
+
+    @staticmethod
+    def _add_latency(row, latency, weight):
+        if latency is None:
+            return
+        row["latency_bins"].add(latency, weight)
+        row["latency_count"] += 1
+        row["latency_sum_ms"] += latency
+        row["est_latency_count"] += weight
+        row["est_latency_sum_ms"] += latency * weight
+        if row["latency_min_ms"] is None or latency < row["latency_min_ms"]:
+            row["latency_min_ms"] = latency
+        if row["latency_max_ms"] is None or latency > row["latency_max_ms"]:
+            row["latency_max_ms"] = latency
+
+    def add_trace(self, trace: Dict[str, Any]):
+        weight = 1.0 / (trace.get("sample_rate") or 1.0)
+        failed = trace.get("status") == models.TraceStatus.FAILED
+        tokens = trace.get("total_tokens") or 0
+        cost = trace.get("total_cost_usd") or 0.0
+        for granularity in GRANULARITIES:
+            row = self._delta_for(trace["project_id"], granularity, truncate(trace["start_time"], granularity), "")
+            row["trace_count"] += 1
+            row["error_count"] += int(failed)
+            row["total_tokens"] += tokens
+            row["prompt_tokens"] += trace.get("prompt_tokens") or 0
+            row["completion_tokens"] += trace.get("completion_tokens") or 0
+            row["cost_usd"] += cost
+            row["est_trace_count"] += weight
+            row["est_error_count"] += weight * failed
+            row["est_total_tokens"] += weight * tokens
+            row["est_cost_usd"] += weight * cost
+            self._add_latency(row, trace.get("latency_ms"), weight)
+
+    def add_span(self, span: Dict[str, Any], project_id: Any, sample_rate: float = 1.0):
+        """
+        Only spans with a model contribute (to that model's rows).
+        """
+        if not span.get("model"):
+            return
+        weight = 1.0 / (sample_rate or 1.0)
+        failed = span.get("status") == "error"
+        tokens = span.get("total_tokens") or 0
+        cost = span.get("cost_usd") or 0.0
+        for granularity in GRANULARITIES:
+            row = self._delta_for(project_id, granularity, truncate(span["start_time"], granularity), span["model"])
+            row["span_count"] += 1
+            row["error_count"] += int(failed)
+            row["total_tokens"] += tokens
+            row["prompt_tokens"] += span.get("prompt_tokens") or 0
+            row["completion_tokens"] += span.get("completion_tokens") or 0
+            row["cost_usd"] += cost
+            row["est_span_count"] += weight
+            row["est_error_count"] += weight * failed
+            row["est_total_tokens"] += weight * tokens
+            row["est_cost_usd"] += weight * cost
+            self._add_latency(row, span.get("latency_ms"), weight)
+
+    def merge(self, other: "RollupAccumulator", weight: float = 1.0):
+        """
+        Add another accumulator's deltas, scaling their sampling-weighted
+        parts (`est_*` and the sketch) by `weight`. Lets spans be folded
+        with weight 1 before their trace's sample_rate is known.
+        """
+        for key, row in other._deltas.items():
+            target = self._delta_for(*key)
+            for col in SUM_COLUMNS:
+                target[col] += row[col] * weight if col.startswith("est_") else row[col]
+            for col, pick in (("latency_min_ms", min), ("latency_max_ms", max)):
+                if row[col] is not None:
+                    target[col] = row[col] if target[col] is None else pick(target[col], row[col])
+            sketch = row["latency_bins"]
+            target["latency_bins"].merge(DDSketch(
+                {index: count * weight for index, count in sketch.bins.items()}, sketch.zero_count * weight
+            ))
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """
+        Return the accumulated deltas as upsert rows and reset.
+        """
+        deltas, self._deltas = self._deltas, {}
+        rows = []
+        # Stable key order keeps concurrent upserts from deadlocking each other
+        for key in sorted(deltas, key=lambda k: (str(k[0]), k[1], k[2], k[3])):
+            row = deltas[key]
+            sketch = row["latency_bins"]
+            row["latency_bins"] = sketch.bins
+            row["latency_zero_count"] = sketch.zero_count
+            rows.append(row)
+        return rows
+
+
+class RollupService:
+    """
+    Maintains per-minute/hour/day metric rollups per project and model.
+    """
+
+    @staticmethod
+    def accumulate(trace_rows: List[Dict[str, Any]], span_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fold prepared trace and span rows into one delta row per rollup key.
+        """
+        accumulator = RollupAccumulator()
+        traces = {}
+        for trace in trace_rows:
+            traces[trace["id"]] = trace
+            accumulator.add_trace(trace)
+        for span in span_rows:
+            trace = traces.get(span["trace_id"])
+            if trace is not None:
+                accumulator.add_span(span, trace["project_id"], trace.get("sample_rate") or 1.0)
+        return accumulator.drain()
+
+    @staticmethod
+    async def commit_deltas(db: AsyncSession, rows: List[Dict[str, Any]]):
+        """
+        Upsert delta rows in a short transaction of their own, once the raw
+        rows they describe are committed. Every batch of a project touches
+        the same minute/hour/day rows, so holding their locks for a whole
+        ingest transaction would serialize concurrent ingests; here they are
+        held for one statement, taken in key order (see `drain`) so
+        overlapping batches cannot deadlock. A failure is logged rather than
+        raised since the raw rows are already stored; `rebuild` repairs the
+        window.
+        """
+        if not rows:
+            return
+        try:
+            await RollupService.upsert(db, rows)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Failed to apply {len(rows)} rollup deltas, rebuild the window to repair: {e}")
+
+    @staticmethod
+    async def upsert(db: AsyncSession, rows: List[Dict[str, Any]]):
+        """
+        Add precomputed delta rows (see RollupAccumulator) to the rollup table.
+        """
+        table = models.MetricRollup.__table__
+        # Chunked to stay under the driver's bind parameter limit
+        for i in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            stmt = pg_insert(table).values(rows[i:i + UPSERT_CHUNK_ROWS])
+            updates = {col: table.c[col] + stmt.excluded[col] for col in SUM_COLUMNS}
+            updates["latency_min_ms"] = func.least(table.c.latency_min_ms, stmt.excluded.latency_min_ms)
+            updates["latency_max_ms"] = func.greatest(table.c.latency_max_ms, stmt.excluded.latency_max_ms)
+            # Sketches merge atomically in SQL by adding bin counts
+            updates["latency_bins"] = func.jordy_merge_counts(table.c.latency_bins, stmt.excluded.latency_bins)
+            await db.execute(
+                stmt.on_conflict_do_update(index_elements=list(table.primary_key.columns), set_=updates)
+            )
+
+    @staticmethod
+    async def rebuild(db: AsyncSession, project_id: Any, since: datetime, until: datetime):
+        """
+        Recompute rollups for a window from raw rows, e.g. after a backfill or
+        cost recalculation. `since` should be day-aligned so day buckets are whole.
+        """
+        params = {"project_id": project_id, "since": since, "until": until}
+        await db.execute(
+            text(
+                "DELETE FROM metric_rollups WHERE project_id = :project_id "
+                "AND bucket_start >= :since AND bucket_start < :until"
+            ),
+            params,
+        )
+        params.update(min_value=MIN_VALUE, log_gamma=LOG_GAMMA)
+        for granularity in GRANULARITIES:
+            await db.execute(text(REBUILD_SQL.format(granularity=granularity)), params)
+            await db.execute(text(REBUILD_SKETCH_SQL.format(granularity=granularity)), params)
+
+    @staticmethod
+    def latency_sketch_query(
+        project_id: Any,
+        since: datetime,
+        until: Optional[datetime] = None,
+        model: str = "",
+        granularity: Optional[str] = None,
+    ):
+        """
+        Rollup rows whose sketches cover [since, until). Works on sync and async sessions.
+        """
+        rollup = models.MetricRollup
+        granularity = granularity or pick_granularity(since, until)
+        query = select(rollup.latency_bins, rollup.latency_zero_count).where(
+            rollup.project_id == project_id,
+            rollup.granularity == granularity,
+            rollup.model == model,
+            rollup.bucket_start >= truncate(since, granularity),
+        )
+        if until is not None:
+            query = query.where(rollup.bucket_start < until)
+        return query
+
+    @staticmethod
+    async def latency_quantiles(
+        db: AsyncSession,
+        project_id: Any,
+        since: datetime,
+        until: Optional[datetime] = None,
+        model: str = "",
+        quantiles: Iterable[float] = (0.5, 0.95, 0.99),
+    ) -> Dict[float, Optional[float]]:
+        result = await db.execute(RollupService.latency_sketch_query(project_id, since, until, model))
+        return merge_sketches(result.all()).quantiles(quantiles)
+
+
+# Same aggregation as `accumulate`, expressed over raw rows
+REBUILD_SQL = """
+INSERT INTO metric_rollups (
+    project_id, granularity, bucket_start, model,
+    trace_count, span_count, error_count,
+    total_tokens, prompt_tokens, completion_tokens, cost_usd,
+    latency_count, latency_sum_ms, latency_min_ms, latency_max_ms,
+    est_trace_count, est_span_count, est_error_count, est_total_tokens,
+    est_cost_usd, est_latency_count, est_latency_sum_ms
+)
+SELECT project_id, '{granularity}', date_trunc('{granularity}', start_time), '',
+       count(*), 0, count(*) FILTER (WHERE status = 'FAILED'),
+       coalesce(sum(total_tokens), 0), coalesce(sum(prompt_tokens), 0),
+       coalesce(sum(completion_tokens), 0), coalesce(sum(total_cost_usd), 0),
+       count(latency_ms), coalesce(sum(latency_ms), 0), min(latency_ms), max(latency_ms),
+       sum(1 / sample_rate), 0, coalesce(sum(1 / sample_rate) FILTER (WHERE status = 'FAILED'), 0),
+       coalesce(sum(total_tokens / sample_rate), 0), coalesce(sum(total_cost_usd / sample_rate), 0),
+       coalesce(sum(1 / sample_rate) FILTER (WHERE latency_ms IS NOT NULL), 0),
+       coalesce(sum(latency_ms / sample_rate), 0)
+FROM traces
+WHERE project_id = :project_id AND start_time >= :since AND start_time < :until
+GROUP BY project_id, date_trunc('{granularity}', start_time)
+UNION ALL
+SELECT t.project_id, '{granularity}', date_trunc('{granularity}', s.start_time), s.model,
+       0, count(*), count(*) FILTER (WHERE s.status = 'error'),
+       coalesce(sum(s.total_tokens), 0), coalesce(sum(s.prompt_tokens), 0),
+       coalesce(sum(s.completion_tokens), 0), coalesce(sum(s.cost_usd), 0),
+       count(s.latency_ms), coalesce(sum(s.latency_ms), 0), min(s.latency_ms), max(s.latency_ms),
+       0, sum(1 / t.sample_rate), coalesce(sum(1 / t.sample_rate) FILTER (WHERE s.status = 'error'), 0),
+       coalesce(sum(s.total_tokens / t.sample_rate), 0), coalesce(sum(s.cost_usd / t.sample_rate), 0),
+       coalesce(sum(1 / t.sample_rate) FILTER (WHERE s.latency_ms IS NOT NULL), 0),
+       coalesce(sum(s.latency_ms / t.sample_rate), 0)
+FROM spans s JOIN traces t ON t.id = s.trace_id
+WHERE t.project_id = :project_id AND s.model IS NOT NULL
+  AND t.start_time >= :since AND t.start_time < :until
+  AND s.start_time >= :since AND s.start_time < :until
+GROUP BY t.project_id, date_trunc('{granularity}', s.start_time), s.model
+"""
+
+# Weighted sketch bins per bucket; NULL index is the zero bucket
+REBUILD_SKETCH_SQL = """
+UPDATE metric_rollups r
+SET latency_bins = b.bins, latency_zero_count = b.zero_count
+FROM (
+    SELECT project_id, bucket, model,
+           coalesce(jsonb_object_agg(idx, n) FILTER (WHERE idx IS NOT NULL), '{{}}'::jsonb) AS bins,
+           coalesce(sum(n) FILTER (WHERE idx IS NULL), 0) AS zero_count
+    FROM (
+        SELECT project_id, date_trunc('{granularity}', start_time) AS bucket, '' AS model,
+               CASE WHEN latency_ms > :min_value THEN ceil(ln(latency_ms) / :log_gamma)::int END AS idx,
+               sum(1 / sample_rate) AS n
+        FROM traces
+        WHERE project_id = :project_id AND start_time >= :since AND start_time < :until
+          AND latency_ms IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        UNION ALL
+        SELECT t.project_id, date_trunc('{granularity}', s.start_time), s.model,
+               CASE WHEN s.latency_ms > :min_value THEN ceil(ln(s.latency_ms) / :log_gamma)::int END,
+               sum(1 / t.sample_rate)
+        FROM spans s JOIN traces t ON t.id = s.trace_id
+        WHERE t.project_id = :project_id AND s.model IS NOT NULL AND s.latency_ms IS NOT NULL
+          AND t.start_time >= :since AND t.start_time < :until
+          AND s.start_time >= :since AND s.start_time < :until
+        GROUP BY 1, 2, 3, 4
+    ) AS binned
+    GROUP BY project_id, bucket, model
+) AS b
+WHERE r.project_id = b.project_id AND r.granularity = '{granularity}'
+  AND r.bucket_start = b.bucket AND r.model = b.model
+"""
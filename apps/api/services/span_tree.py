@@ -0,0 +1,85 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+IO_FIELDS = ("input", "output")
+
+
+def _copy_fields(obj: Any, fields: Iterable[str], include_io: bool) -> Dict[str, Any]:
+    # Deferred I/O columns are never touched when excluded, so nothing lazy-loads
+    return {
+        field: getattr(obj, field) if include_io or field not in IO_FIELDS else None
+        for field in fields
+    }
+
+
+def build_span_tree(spans: List[Any], span_fields: Iterable[str], include_io: bool = True) -> List[Dict[str, Any]]:
+    """
+    Nest a flat span list by parent_span_id and compute per-subtree rollups.
+
+    Each node gets `children` plus `subtree_span_count`, `subtree_tokens`,
+    `subtree_cost_usd` and `subtree_latency_ms` (wall-clock extent from the
+    earliest start to the latest end in the subtree). Spans whose parent is
+    not part of the trace are treated as roots. Runs iteratively so very
+    deep agent traces do not hit the recursion limit.
+    """
+    span_fields = list(span_fields)
+    nodes: Dict[Any, Dict[str, Any]] = {}
+    order: List[Any] = []
+    for span in spans:
+        node = _copy_fields(span, span_fields, include_io)
+        node["children"] = []
+        node["_start"] = span.start_time
+        node["_end"] = span.end_time
+        nodes[span.id] = node
+        order.append(span.id)
+
+    roots: List[Dict[str, Any]] = []
+    for span_id in order:
+        node = nodes[span_id]
+        parent = nodes.get(node.get("parent_span_id"))
+        if parent is None or parent is node:
+            roots.append(node)
+        else:
+            parent["children"].append(node)
+
+    # Post-order traversal: children are rolled up before their parents
+    stack = [(root, False) for root in reversed(roots)]
+    while stack:
+        node, visited = stack.pop()
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node["children"]))
+            continue
+
+        count = 1
+        tokens = node.get("total_tokens") or 0
+        cost = node.get("cost_usd") or 0.0
+        start: Optional[Any] = node.pop("_start")
+        end: Optional[Any] = node.pop("_end")
+        for child in node["children"]:
+            count += child["subtree_span_count"]
+            tokens += child["subtree_tokens"]
+            cost += child["subtree_cost_usd"]
+            child_start, child_end = child.pop("_subtree_start"), child.pop("_subtree_end")
+            if child_start is not None and (start is None or child_start < start):
+                start = child_start
+            if child_end is not None and (end is None or child_end > end):
+                end = child_end
+
+        node["subtree_span_count"] = count
+        node["subtree_tokens"] = tokens
+        node["subtree_cost_usd"] = cost
+        node["subtree_latency_ms"] = (end - start).total_seconds() * 1000 if start and end else None
+        node["_subtree_start"] = start
+        node["_subtree_end"] = end
+
+    for root in roots:
+        root.pop("_subtree_start", None)
+        root.pop("_subtree_end", None)
+    return roots
+
+
+def build_trace_tree(trace: Any, trace_fields: Iterable[str], span_fields: Iterable[str], include_io: bool = True) -> Dict[str, Any]:
+    tree = _copy_fields(trace, trace_fields, include_io)
+    tree["span_count"] = len(trace.spans)
+    tree["spans"] = build_span_tree(trace.spans, span_fields, include_io)
+    return tree
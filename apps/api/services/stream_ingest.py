@@ -0,0 +1,259 @@
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from ..core.dedup import get_seen_traces
+from ..models import models
+from ..schemas import schemas
+from ..utils.wire import InvalidRecord
+from .payloads import offload_payloads
+from .pricing import pricing_catalog
+from .rollup_service import RollupAccumulator, RollupService
+from .tail_sampler import TailSamplingPolicy, trace_id_ratio
+from .trace_processor import add_span_totals, build_span_row, build_trace_header, validate_trace
+
+# Rejections reported back in full; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class StreamIngestor:
+    """
+    Writes a stream of trace and span records with bounded memory.
+
+    Record layout: a trace header (a TraceCreate, `"type": "trace"` optional,
+    inline `spans` allowed) followed by any number of `"type": "span"`
+    records (SpanCreate) belonging to it. The next header or the end of the
+    stream closes the open trace. Only the open trace's aggregates and up to
+    `chunk_rows` pending rows are held; each full chunk is inserted and
+    committed, then its rollup deltas are applied.
+
+    With a tail sampling policy the trace-id rate is checked when the
+    header arrives, and traces it keeps are written as they stream. The
+    spans of any other trace are held until it closes and the full policy
+    (errors, latency) decides; a trace that outgrows `chunk_rows` held spans
+    is always kept, like a failed or slow one. Span rollups of the open
+    trace are collected unweighted and kept with the closed trace until
+    its row is inserted; they are scaled by its effective sample_rate then.
+    Spans are priced a chunk at a time, before they are added to the trace
+    totals.
+
+    A trace whose id was written recently (see SeenTraceIds) is skipped with
+    all of its spans and counted in `duplicates`, so a re-sent stream adds
+    nothing. An older duplicate is found when ON CONFLICT DO NOTHING leaves
+    its trace row out of the insert's RETURNING: it is counted in
+    `duplicates`, adds no rollups, and its spans in the same chunk are
+    dropped (spans flushed in earlier chunks hit the same conflict).
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        chunk_rows: int,
+        sampling: Optional[TailSamplingPolicy] = None,
+        organization_id: Optional[uuid.UUID] = None,
+    ):
+        self.db = db
+        self.project_id = project_id
+        self.organization_id = organization_id
+        self.chunk_rows = chunk_rows
+        self.sampling = sampling
+
+        self._open_trace: Optional[Dict[str, Any]] = None
+        self._open_trace_stored = True
+        self._open_span_count = 0
+        # Priced spans of an open trace that sampling may still drop
+        self._held: List[Dict[str, Any]] = []
+        # Span deltas of the open trace, weighted once the trace closes
+        self._open_rollups = RollupAccumulator()
+        self._trace_rows: List[Dict[str, Any]] = []
+        self._span_rows: List[Dict[str, Any]] = []
+        # Spans of the open trace not yet priced and folded into its totals
+        self._unpriced: List[Dict[str, Any]] = []
+        # Span deltas and span count of each closed trace in the pending chunk,
+        # rolled up only if its row is actually inserted
+        self._closed_rollups: Dict[uuid.UUID, Tuple[RollupAccumulator, int]] = {}
+        self._seen_traces = get_seen_traces()
+        # Closed traces in the pending chunk, marked as seen once it commits
+        self._closed_ids: List[uuid.UUID] = []
+        # Set while the spans of an already stored trace are being skipped
+        self._skipping: Optional[uuid.UUID] = None
+
+        self.accepted_traces = 0
+        self.accepted_spans = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.errors: List[schemas.StreamRecordError] = []
+
+    async def run(self, records: AsyncIterator[Any]) -> schemas.TraceStreamResult:
+        await pricing_catalog.refresh()
+        record_no = 0
+        async for record in records:
+            record_no += 1
+            try:
+                await self._handle(record)
+            except (ValidationError, ValueError) as e:
+                self._reject(record_no, str(e))
+        self._close_trace()
+        await self._flush()
+        return schemas.TraceStreamResult(
+            accepted_traces=self.accepted_traces,
+            accepted_spans=self.accepted_spans,
+            rejected=self.rejected,
+            duplicates=self.duplicates,
+            errors=self.errors,
+        )
+
+    async def _handle(self, record: Any):
+        if isinstance(record, InvalidRecord):
+            raise ValueError(f"Invalid JSON: {record.error}")
+        if not isinstance(record, dict):
+            raise ValueError("Record must be an object")
+
+        record_type = record.pop("type", "trace")
+        if record_type == "span" and self._skipping is not None:
+            span_in = schemas.SpanCreate.model_validate(record)
+            if span_in.trace_id not in (None, self._skipping):
+                raise ValueError("Span does not belong to the open trace")
+            return
+        if record_type == "span":
+            if self._open_trace is None:
+                raise ValueError("Span record without a valid open trace")
+            span_in = schemas.SpanCreate.model_validate(record)
+            trace_id = span_in.trace_id or self._open_trace["id"]
+            if trace_id != self._open_trace["id"]:
+                raise ValueError("Span does not belong to the open trace")
+            self._add_span(build_span_row(span_in, trace_id))
+        elif record_type == "trace":
+            # Close first: spans after an invalid header must not join the previous trace
+            self._close_trace()
+            self._skipping = None
+            trace_in = validate_trace(record)
+            if await self._seen_traces.seen(self.project_id, [trace_in.id]):
+                self.duplicates += 1
+                self._skipping = trace_in.id
+                return
+            self._open(trace_in)
+        else:
+            raise ValueError(f"Unknown record type: {record_type}")
+
+        if len(self._unpriced) + len(self._span_rows) + len(self._trace_rows) >= self.chunk_rows:
+            await self._flush()
+
+    def _open(self, trace_in: schemas.TraceCreate):
+        spans = trace_in.spans
+        trace_in.spans = []
+        self._open_trace = build_trace_header(trace_in, self.project_id)
+        self._open_trace_stored = (
+            self.sampling is None or trace_id_ratio(self._open_trace["id"]) < self.sampling.rate
+        )
+        self._open_span_count = 0
+        self.accepted_traces += 1
+        for span_in in spans:
+            self._add_span(build_span_row(span_in, self._open_trace["id"]))
+
+    def _add_span(self, span_row: Dict[str, Any]):
+        self._unpriced.append(span_row)
+        self.accepted_spans += 1
+
+    def _fold_spans(self):
+        trace = self._open_trace
+        if trace is None or not self._unpriced:
+            return
+        pricing_catalog.price_spans(self._unpriced, self.organization_id)
+        for span_row in self._unpriced:
+            add_span_totals(trace, span_row)
+            self._open_rollups.add_span(span_row, self.project_id)
+        self._open_span_count += len(self._unpriced)
+        if self._open_trace_stored:
+            self._span_rows.extend(self._unpriced)
+        else:
+            self._held.extend(self._unpriced)
+            if len(self._held) > self.chunk_rows:
+                # Too large to hold until it closes: always kept (see _close_trace)
+                self._open_trace_stored = True
+                self._span_rows.extend(self._held)
+                self._held = []
+        self._unpriced = []
+
+    def _close_trace(self):
+        if self._open_trace is None:
+            return
+        self._fold_spans()
+        trace = self._open_trace
+        stored = self._open_trace_stored
+        if self.sampling is not None:
+            large = self._open_span_count > self.chunk_rows
+            stored = stored or self.sampling.keep(trace)
+            if stored and not large:
+                trace["sample_rate"] = self.sampling.effective_rate(trace)
+        if stored:
+            self._span_rows.extend(self._held)
+            self._closed_rollups[trace["id"]] = (self._open_rollups, self._open_span_count)
+            self._trace_rows.append(trace)
+        self._held = []
+        self._open_rollups = RollupAccumulator()
+        self._closed_ids.append(trace["id"])
+        self._open_trace = None
+
+    async def _flush(self):
+        self._fold_spans()
+        if not (self._trace_rows or self._span_rows):
+            return
+        await offload_payloads(self.project_id, self._trace_rows, self._span_rows)
+        traces = models.Trace.__table__
+        spans = models.Span.__table__
+        rollups = RollupAccumulator()
+        try:
+            if self._trace_rows:
+                inserted = set((await self.db.execute(
+                    pg_insert(traces)
+                    .on_conflict_do_nothing(index_elements=[traces.c.id, traces.c.start_time])
+                    .returning(traces.c.id),
+                    self._trace_rows,
+                )).scalars())
+                self._drop_stored(inserted)
+            for trace in self._trace_rows:
+                span_rollups, _ = self._closed_rollups[trace["id"]]
+                rollups.merge(span_rollups, 1.0 / (trace["sample_rate"] or 1.0))
+                rollups.add_trace(trace)
+            if self._span_rows:
+                await self.db.execute(
+                    pg_insert(spans).on_conflict_do_nothing(index_elements=[spans.c.id, spans.c.start_time]),
+                    self._span_rows,
+                )
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"Error flushing trace stream chunk: {e}")
+            raise
+        await RollupService.commit_deltas(self.db, rollups.drain())
+        await self._seen_traces.mark(self.project_id, self._closed_ids)
+        self._closed_ids = []
+        self._closed_rollups = {}
+        self._trace_rows = []
+        self._span_rows = []
+
+    def _drop_stored(self, inserted: Set[uuid.UUID]):
+        """
+        Drop traces the insert skipped as already stored, with their pending spans.
+        """
+        stored = {row["id"] for row in self._trace_rows} - inserted
+        if not stored:
+            return
+        for trace_id in stored:
+            _, span_count = self._closed_rollups.pop(trace_id)
+            self.accepted_traces -= 1
+            self.accepted_spans -= span_count
+            self.duplicates += 1
+        self._trace_rows = [row for row in self._trace_rows if row["id"] not in stored]
+        self._span_rows = [row for row in self._span_rows if row["trace_id"] not in stored]
+
+    def _reject(self, record_no: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.StreamRecordError(record=record_no, error=error))
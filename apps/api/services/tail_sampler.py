@@ -0,0 +1,84 @@
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..models import models
+
+
+def trace_id_ratio(trace_id: uuid.UUID) -> float:
+    """
+    Map a trace id to [0, 1) deterministically. Matches the SDK head sampler,
+    so a server rate at or above the SDK rate keeps every head-sampled trace.
+    """
+    return int.from_bytes(trace_id.bytes[:8], "big") / 2 ** 64
+
+
+@dataclass(frozen=True)
+class TailSamplingPolicy:
+    """
+    Per-project tail sampling, read from `project.settings["sampling"]`:
+
+        {"rate": 0.1, "keep_errors": true, "slow_ms": 5000}
+
+    Decided once the whole trace has arrived. Kept traces store the
+    probability they were kept with (SDK head sampling included) as their
+    `sample_rate`, and rollups and raw-row analytics weight them by its
+    inverse, so dropped traces are accounted for without being stored.
+    """
+    rate: float = 1.0
+    keep_errors: bool = True
+    slow_ms: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls, project_settings: Optional[Dict[str, Any]]) -> Optional["TailSamplingPolicy"]:
+        config = (project_settings or {}).get("sampling")
+        if not config:
+            return None
+        policy = cls(
+            rate=float(config.get("rate", 1.0)),
+            keep_errors=bool(config.get("keep_errors", True)),
+            slow_ms=config.get("slow_ms"),
+        )
+        return None if policy.rate >= 1.0 else policy
+
+    def always_keep(self, trace_row: Dict[str, Any]) -> bool:
+        if self.keep_errors and trace_row.get("status") == models.TraceStatus.FAILED:
+            return True
+        latency = trace_row.get("latency_ms")
+        return self.slow_ms is not None and latency is not None and latency >= self.slow_ms
+
+    def keep(self, trace_row: Dict[str, Any]) -> bool:
+        return self.always_keep(trace_row) or trace_id_ratio(trace_row["id"]) < self.rate
+
+    def effective_rate(self, trace_row: Dict[str, Any]) -> float:
+        """
+        Probability a kept trace had of being stored. Head and tail sampling
+        compare the same trace-id ratio, so a head-sampled trace (ratio below
+        its `sample_rate`) passes the tail rate with probability
+        min(head, rate) / head: the rates combine as a minimum, not a product.
+        """
+        head = trace_row.get("sample_rate") or 1.0
+        return head if self.always_keep(trace_row) else min(head, self.rate)
+
+
+def apply_tail_sampling(
+    policy: Optional[TailSamplingPolicy],
+    trace_rows: List[Dict[str, Any]],
+    span_rows: List[Dict[str, Any]],
+):
+    """
+    Select the prepared rows to store and set each kept trace's effective `sample_rate`.
+    """
+    if policy is None:
+        return trace_rows, span_rows
+    spans_by_trace: Dict[Any, List[Dict[str, Any]]] = {}
+    for span in span_rows:
+        spans_by_trace.setdefault(span["trace_id"], []).append(span)
+
+    kept_traces, kept_spans = [], []
+    for trace in trace_rows:
+        if policy.keep(trace):
+            trace["sample_rate"] = policy.effective_rate(trace)
+            kept_traces.append(trace)
+            kept_spans.extend(spans_by_trace.get(trace["id"], []))
+    return kept_traces, kept_spans
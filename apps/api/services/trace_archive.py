@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from sqlalchemy import JSON, Boolean, DateTime, Enum, Float, Integer, Table
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models import models
+
+ARCHIVE_TABLES: Dict[str, Table] = {
+    "traces": models.Trace.__table__,
+    "spans": models.Span.__table__,
+}
+# Hive-style partition columns in the file paths: <table>/project_id=<uuid>/day=<YYYY-MM-DD>/
+PARTITION_SCHEMA = pa.schema([("project_id", pa.string()), ("day", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+INSERT_CHUNK_ROWS = 1000
+# The single file of a day written by DayWriter
+DAY_FILE_NAME = "day.parquet"
+
+
+def arrow_type(column_type: Any) -> pa.DataType:
+    """
+    Parquet type for a column. UUIDs and enums become strings and JSON(B)
+    becomes its text, so archives read the same in any Parquet tool.
+    """
+    if isinstance(column_type, ARRAY):
+        return pa.list_(arrow_type(column_type.item_type))
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def arrow_schema(table: Table) -> pa.Schema:
+    """
+    Schema of the archived files; partition columns live in the path only.
+    """
+    return pa.schema([
+        (column.name, arrow_type(column.type))
+        for column in table.columns if column.name not in PARTITION_SCHEMA.names
+    ])
+
+
+def to_archive_value(column_type: Any, value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(column_type, UUID):
+        return str(value)
+    if isinstance(column_type, Enum):
+        return value.value if hasattr(value, "value") else str(value)
+    if isinstance(column_type, JSON):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+    return value
+
+
+def from_archive_value(column_type: Any, value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(column_type, UUID):
+        return uuid.UUID(value)
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        return column_type.enum_class(value)
+    if isinstance(column_type, JSON):
+        return json.loads(value)
+    return value
+
+
+def to_archive_rows(table: Table, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    columns = [(column.name, column.type) for column in table.columns if column.name not in PARTITION_SCHEMA.names]
+    return [{name: to_archive_value(type_, row.get(name)) for name, type_ in columns} for row in rows]
+
+
+def from_archive_rows(table: Table, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    columns = [(column.name, column.type) for column in table.columns]
+    return [{name: from_archive_value(type_, row.get(name)) for name, type_ in columns} for row in rows]
+
+
+def group_by_day(
+    trace_rows: List[Dict[str, Any]],
+    span_rows: List[Dict[str, Any]]
+) -> Dict[date, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """
+    Split rows into day partitions by their trace's start day, so a trace
+    and all of its spans always land in the same partition.
+    """
+    days: Dict[date, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+    trace_days = {}
+    for row in trace_rows:
+        day = row["start_time"].date()
+        trace_days[row["id"]] = day
+        days.setdefault(day, ([], []))[0].append(row)
+    for row in span_rows:
+        day = trace_days.get(row["trace_id"]) or row["start_time"].date()
+        days.setdefault(day, ([], []))[1].append(row)
+    return days
+
+
+class DayWriter:
+    """
+    Streams one project-day of traces and spans into a single Parquet file
+    per table, one row group per `write`, so a day of any size is written
+    with bounded memory. Files get a hidden temporary name (skipped by
+    dataset discovery) until `commit` moves them into place, replacing an
+    earlier export of the same day; `abort` discards them.
+    """
+
+    def __init__(self, archive: "TraceArchive", project_id: uuid.UUID, day: date):
+        self.archive = archive
+        self.dirs = {table: archive._dir(table, project_id, day) for table in ARCHIVE_TABLES}
+        self._tmp_name = f".{uuid.uuid4().hex}.tmp"
+        self._writers: Dict[str, pq.ParquetWriter] = {}
+
+    def write(self, table: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        filesystem = self.archive.filesystem
+        schema = self.archive.schemas[table]
+        writer = self._writers.get(table)
+        if writer is None:
+            filesystem.create_dir(self.dirs[table], recursive=True)
+            writer = pq.ParquetWriter(
+                f"{self.dirs[table]}/{self._tmp_name}", schema, compression="zstd", filesystem=filesystem
+            )
+            self._writers[table] = writer
+        writer.write_table(pa.Table.from_pylist(to_archive_rows(ARCHIVE_TABLES[table], rows), schema=schema))
+
+    def commit(self) -> int:
+        filesystem = self.archive.filesystem
+        for table, writer in self._writers.items():
+            writer.close()
+            directory = self.dirs[table]
+            for info in filesystem.get_file_info(pafs.FileSelector(directory)):
+                if info.base_name.endswith(".parquet"):
+                    filesystem.delete_file(info.path)
+            filesystem.move(f"{directory}/{self._tmp_name}", f"{directory}/{DAY_FILE_NAME}")
+        files, self._writers = len(self._writers), {}
+        return files
+
+    def abort(self):
+        for table, writer in self._writers.items():
+            writer.close()
+            self.archive.filesystem.delete_file(f"{self.dirs[table]}/{self._tmp_name}")
+        self._writers = {}
+
+
+class TraceArchive:
+    """
+    Traces and spans as zstd-compressed Parquet files, partitioned by
+    project and day:
+
+        <root>/traces/project_id=<uuid>/day=2025-07-01/<name>.parquet
+        <root>/spans/project_id=<uuid>/day=2025-07-01/<name>.parquet
+
+    Used for the retention archive of expired rows and for the analytics
+    export of whole days (see DayWriter), each under its own root.
+    `root` is a local path or any URI pyarrow understands (s3://bucket/prefix,
+    gs://...). Columns mirror the tables, with UUIDs and enums as strings and
+    JSONB as JSON text. Files are never modified; each retention batch adds
+    one file per table and day, named after its first trace, so rewriting a
+    batch that failed to commit replaces its file instead of duplicating it.
+    """
+
+    def __init__(self, root: str):
+        if "://" not in root:
+            root = os.path.abspath(root)
+        self.filesystem, self.base = pafs.FileSystem.from_uri(root)
+        self.schemas = {name: arrow_schema(table) for name, table in ARCHIVE_TABLES.items()}
+
+    def _dir(self, table: str, project_id: uuid.UUID, day: Optional[date] = None) -> str:
+        path = f"{self.base}/{table}/project_id={project_id}"
+        return path if day is None else f"{path}/day={day.isoformat()}"
+
+    def open_day(self, project_id: uuid.UUID, day: date) -> DayWriter:
+        return DayWriter(self, project_id, day)
+
+    async def write(
+        self,
+        project_id: uuid.UUID,
+        trace_rows: List[Dict[str, Any]],
+        span_rows: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Archive one batch of a project's rows; returns the number of files written.
+        """
+        return await asyncio.to_thread(self._write, project_id, trace_rows, span_rows)
+
+    def _write(self, project_id: uuid.UUID, trace_rows: List[Dict[str, Any]], span_rows: List[Dict[str, Any]]) -> int:
+        files = 0
+        for day, (day_traces, day_spans) in group_by_day(trace_rows, span_rows).items():
+            first = min(day_traces, key=lambda row: (row["start_time"], str(row["id"])), default=None)
+            name = f"{first['start_time']:%H%M%S%f}-{first['id']}" if first else f"spans-{day_spans[0]['id']}"
+            for table, rows in (("traces", day_traces), ("spans", day_spans)):
+                if not rows:
+                    continue
+                directory = self._dir(table, project_id, day)
+                self.filesystem.create_dir(directory, recursive=True)
+                data = pa.Table.from_pylist(to_archive_rows(ARCHIVE_TABLES[table], rows), schema=self.schemas[table])
+                pq.write_table(data, f"{directory}/{name}.parquet", compression="zstd", filesystem=self.filesystem)
+                files += 1
+        return files
+
+    def dataset(self, table: str) -> Optional[ds.Dataset]:
+        """
+        All archived files of one table as a pyarrow dataset, with
+        `project_id` and `day` partition columns. None when nothing is
+        archived yet.
+        """
+        path = f"{self.base}/{table}"
+        if self.filesystem.get_file_info(path).type == pafs.FileType.NotFound:
+            return None
+        schema = pa.unify_schemas([self.schemas[table], PARTITION_SCHEMA])
+        return ds.dataset(
+            path, schema=schema, format="parquet", partitioning=PARTITIONING, filesystem=self.filesystem
+        )
+
+    def days(self, project_id: uuid.UUID) -> List[date]:
+        selector = pafs.FileSelector(self._dir("traces", project_id), allow_not_found=True)
+        return sorted(
+            date.fromisoformat(info.base_name.split("=", 1)[1])
+            for info in self.filesystem.get_file_info(selector)
+            if info.type == pafs.FileType.Directory and info.base_name.startswith("day=")
+        )
+
+    def read(
+        self,
+        table: str,
+        project_id: uuid.UUID,
+        since: datetime,
+        until: datetime,
+        columns: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> pa.Table:
+        """
+        Archived rows of a project with start_time in [since, until). Only
+        the day partitions overlapping the window are opened.
+        """
+        dataset = self.dataset(table)
+        if dataset is None:
+            return pa.unify_schemas([self.schemas[table], PARTITION_SCHEMA]).empty_table()
+        condition = (
+            (ds.field("project_id") == str(project_id))
+            & (ds.field("day") >= since.date().isoformat())
+            & (ds.field("day") <= until.date().isoformat())
+        )
+        if table == "traces":
+            condition &= (ds.field("start_time") >= pa.scalar(since, pa.timestamp("us"))) & (
+                ds.field("start_time") < pa.scalar(until, pa.timestamp("us"))
+            )
+        if limit is not None:
+            return dataset.head(limit, columns=columns, filter=condition)
+        return dataset.to_table(columns=columns, filter=condition)
+
+    async def rehydrate(self, db: AsyncSession, project_id: uuid.UUID, since: datetime, until: datetime) -> Tuple[int, int]:
+        """
+        Copy archived traces that started in [since, until), with all their
+        spans, back into Postgres (ON CONFLICT DO NOTHING, so rows that are
+        still stored are left alone). Rollups are not touched: they were
+        kept when the rows expired. Returns (traces, spans) inserted.
+        """
+        trace_rows, span_rows = await asyncio.to_thread(self._load, project_id, since, until)
+        traces, spans = ARCHIVE_TABLES["traces"], ARCHIVE_TABLES["spans"]
+        inserted = [0, 0]
+        for i, (table, rows) in enumerate(((traces, trace_rows), (spans, span_rows))):
+            for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                result = await db.execute(
+                    pg_insert(table)
+                    .on_conflict_do_nothing(index_elements=[table.c.id, table.c.start_time])
+                    .returning(table.c.id),
+                    rows[start:start + INSERT_CHUNK_ROWS],
+                )
+                inserted[i] += len(result.all())
+        await db.commit()
+        return inserted[0], inserted[1]
+
+    def _load(self, project_id: uuid.UUID, since: datetime, until: datetime) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        trace_rows = self.read("traces", project_id, since, until).to_pylist()
+        if not trace_rows:
+            return [], []
+        # Spans share their trace's day partition; keep those of the selected traces
+        spans = self.read("spans", project_id, since, until)
+        spans = spans.filter(pc.is_in(spans["trace_id"], value_set=pa.array([row["id"] for row in trace_rows])))
+        return (
+            from_archive_rows(ARCHIVE_TABLES["traces"], trace_rows),
+            from_archive_rows(ARCHIVE_TABLES["spans"], spans.to_pylist()),
+        )
+
+
+archive: Optional[TraceArchive] = None
+
+
+def get_trace_archive() -> TraceArchive:
+    global archive
+    if archive is None:
+        archive = TraceArchive(settings.ARCHIVE_ROOT)
+    return archive
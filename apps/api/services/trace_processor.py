@@ -1,106 +1,393 @@
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy import case, cast, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
+from ..core.dedup import get_seen_traces
 from ..models import models
 from ..schemas import schemas
+from .payloads import offload_payloads
+from .pricing import pricing_catalog
+from .rollup_service import RollupAccumulator, RollupService
+from .tail_sampler import TailSamplingPolicy, apply_tail_sampling
+
+
+def validate_trace(raw: Union[Dict[str, Any], schemas.TraceCreate]) -> schemas.TraceCreate:
+    """
+    Validate a raw trace without touching the database.
+    Pins the trace id so queued and direct writes report the same id.
+    """
+    trace_in = schemas.TraceCreate.model_validate(raw)
+    for span_in in trace_in.spans:
+        models.SpanType(span_in.span_type)
+    if trace_in.id is None:
+        trace_in.id = uuid.uuid4()
+    return trace_in
+
+
+def build_span_row(span_in: schemas.SpanCreate, trace_id: uuid.UUID) -> Dict[str, Any]:
+    """
+    Column dict for one span, with latency filled in. `cost_usd` is left at
+    zero for `PricingCatalog.price_spans` to set for a whole batch of rows.
+    """
+    # Calculate latency for the span
+    latency = None
+    if span_in.end_time and span_in.start_time:
+        latency = (span_in.end_time - span_in.start_time).total_seconds() * 1000
+
+    return {
+        "id": span_in.id or uuid.uuid4(),
+        "trace_id": trace_id,
+        "parent_span_id": span_in.parent_span_id,
+        "name": span_in.name,
+        "span_type": models.SpanType(span_in.span_type),
+        "start_time": span_in.start_time,
+        "end_time": span_in.end_time,
+        "latency_ms": latency,
+        "input": span_in.input,
+        "output": span_in.output,
+        "attributes": span_in.attributes,
+        "model": span_in.model,
+        "prompt_tokens": span_in.prompt_tokens,
+        "completion_tokens": span_in.completion_tokens,
+        "total_tokens": span_in.total_tokens,
+        "cost_usd": 0.0,
+        "status": span_in.status,
+        "error_message": span_in.error_message,
+    }
+
+
+def build_trace_header(trace_in: schemas.TraceCreate, project_id: uuid.UUID) -> Dict[str, Any]:
+    """
+    Trace column dict with zeroed aggregates; spans are folded in with `add_span_totals`.
+    """
+    trace_row = {
+        "id": trace_in.id or uuid.uuid4(),
+        "project_id": project_id,
+        "name": trace_in.name,
+        "session_id": trace_in.session_id,
+        "user_id": trace_in.user_id,
+        "start_time": trace_in.start_time,
+        "end_time": trace_in.end_time,
+        "input": trace_in.input,
+        "output": trace_in.output,
+        "metadata": trace_in.metadata,
+        "tags": trace_in.tags,
+        "status": models.TraceStatus.COMPLETED if trace_in.end_time else models.TraceStatus.RUNNING,
+        "error_message": None,
+        "latency_ms": None,
+        "sample_rate": trace_in.sample_rate,
+        "total_tokens": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_cost_usd": 0.0,
+    }
+    if trace_in.end_time and trace_in.start_time:
+        trace_row["latency_ms"] = (trace_in.end_time - trace_in.start_time).total_seconds() * 1000
+    return trace_row
+
+
+def add_span_totals(trace_row: Dict[str, Any], span_row: Dict[str, Any]):
+    """
+    Fold one span's usage and status into its trace's aggregates.
+    """
+    trace_row["total_tokens"] += span_row["total_tokens"] or 0
+    trace_row["prompt_tokens"] += span_row["prompt_tokens"] or 0
+    trace_row["completion_tokens"] += span_row["completion_tokens"] or 0
+    trace_row["total_cost_usd"] += span_row["cost_usd"]
+
+    if span_row["status"] == "error" and trace_row["status"] != models.TraceStatus.FAILED:
+        trace_row["status"] = models.TraceStatus.FAILED
+        trace_row["error_message"] = span_row["error_message"]
+
+
+def build_trace_rows(
+    trace_in: schemas.TraceCreate,
+    project_id: uuid.UUID,
+    organization_id: Optional[uuid.UUID] = None
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Turn an incoming trace into column dicts for the traces and spans tables.
+    Calculating latency, token counts, and costs (at the organization's
+    prices) at the trace level.
+    """
+    trace_row = build_trace_header(trace_in, project_id)
+    span_rows = [build_span_row(span_in, trace_row["id"]) for span_in in trace_in.spans]
+    pricing_catalog.price_spans(span_rows, organization_id)
+    for span_row in span_rows:
+        add_span_totals(trace_row, span_row)
+    return trace_row, span_rows
+
 
 async def process_incoming_trace(
-    db: Session, 
-    trace_in: schemas.TraceCreate, 
-    project_id: uuid.UUID
-) -> models.Trace:
-    """
-    Core logic for ingesting and processing traces.
-    Calculating latency, token counts, and costs at the trace level.
-    """
-    trace_id = trace_in.id or uuid.uuid4()
-    
-    # Create the trace object
-    db_trace = models.Trace(
-        id=trace_id,
-        project_id=project_id,
-        name=trace_in.name,
-        session_id=trace_in.session_id,
-        user_id=trace_in.user_id,
-        start_time=trace_in.start_time,
-        end_time=trace_in.end_time,
-        input=trace_in.input,
-        output=trace_in.output,
-        metadata=trace_in.metadata,
-        tags=trace_in.tags,
-        status=models.TraceStatus.COMPLETED if trace_in.end_time else models.TraceStatus.RUNNING
+    db: AsyncSession,
+    trace_in: schemas.TraceCreate,
+    project_id: uuid.UUID,
+    sampling: Optional[TailSamplingPolicy] = None,
+    organization_id: Optional[uuid.UUID] = None
+) -> Dict[str, Any]:
+    """
+    Core logic for ingesting and processing a single trace.
+    Idempotent: sending a trace again writes nothing and returns the stored
+    row (or the rebuilt one, if tail sampling didn't store it).
+    """
+    await pricing_catalog.refresh()
+    trace_row, span_rows = build_trace_rows(trace_in, project_id, organization_id)
+    duplicates = await write_trace_rows(db, [trace_row], span_rows, sampling)
+    if duplicates:
+        return await load_trace_row(db, trace_row["id"], project_id) or trace_row
+    return trace_row
+
+
+async def load_trace_row(db: AsyncSession, trace_id: uuid.UUID, project_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    table = models.Trace.__table__
+    stored = (await db.execute(
+        select(*table.c).where(table.c.id == trace_id, table.c.project_id == project_id).limit(1)
+    )).mappings().first()
+    return dict(stored) if stored is not None else None
+
+
+def prepare_trace_batch(
+    traces_in: List[Dict[str, Any]],
+    project_id: uuid.UUID,
+    organization_id: Optional[uuid.UUID] = None
+) -> Tuple[List[schemas.TraceIngestResult], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Validate raw traces one by one and build rows for the accepted ones.
+    Spans of the whole batch are priced in one pass before the trace totals
+    are summed.
+    """
+    results: List[schemas.TraceIngestResult] = []
+    trace_rows: List[Dict[str, Any]] = []
+    span_rows: List[Dict[str, Any]] = []
+    seen_ids = set()
+
+    for raw in traces_in:
+        trace_id: Optional[uuid.UUID] = None
+        try:
+            trace_in = validate_trace(raw)
+            trace_row = build_trace_header(trace_in, project_id)
+            rows = [build_span_row(span_in, trace_row["id"]) for span_in in trace_in.spans]
+            trace_id = trace_row["id"]
+            if trace_id in seen_ids:
+                raise ValueError("Duplicate trace id in batch")
+        except (ValidationError, ValueError) as e:
+            results.append(schemas.TraceIngestResult(id=trace_id, status="rejected", error=str(e)))
+            continue
+
+        seen_ids.add(trace_id)
+        trace_rows.append(trace_row)
+        span_rows.extend(rows)
+        results.append(schemas.TraceIngestResult(id=trace_id, status="accepted"))
+
+    pricing_catalog.price_spans(span_rows, organization_id)
+    traces_by_id = {trace_row["id"]: trace_row for trace_row in trace_rows}
+    for span_row in span_rows:
+        add_span_totals(traces_by_id[span_row["trace_id"]], span_row)
+    return results, trace_rows, span_rows
+
+
+async def write_trace_rows(
+    db: AsyncSession,
+    trace_rows: List[Dict[str, Any]],
+    span_rows: List[Dict[str, Any]],
+    sampling: Optional[TailSamplingPolicy] = None
+) -> Set[uuid.UUID]:
+    """
+    Insert prepared trace and span rows (all of one project) in one transaction.
+    Rollups are built from the stored rows only, weighted by their
+    (tail-sampling adjusted) sample_rate, so a rebuild from raw rows
+    reproduces them; they are applied after the commit (see
+    RollupService.commit_deltas).
+
+    Traces already written are skipped along with their spans and rollups
+    and their ids returned: recent ones are found in the seen-set without
+    touching the database, older ones by ON CONFLICT DO NOTHING. Large
+    payloads of the stored rows go to the blob store first.
+    """
+    if not trace_rows:
+        return set()
+    project_id = trace_rows[0]["project_id"]
+    seen_traces = get_seen_traces()
+    duplicates = await seen_traces.seen(project_id, [row["id"] for row in trace_rows])
+    trace_rows, span_rows = _without_traces(duplicates, trace_rows, span_rows)
+    if not trace_rows:
+        return duplicates
+
+    kept_traces, kept_spans = apply_tail_sampling(sampling, trace_rows, span_rows)
+    await offload_payloads(project_id, kept_traces, kept_spans)
+    traces = models.Trace.__table__
+    spans = models.Span.__table__
+    try:
+        # executemany: SQLAlchemy batches these into multi-row VALUES statements
+        if kept_traces:
+            inserted = set((await db.execute(
+                pg_insert(traces)
+                .on_conflict_do_nothing(index_elements=[traces.c.id, traces.c.start_time])
+                .returning(traces.c.id),
+                kept_traces,
+            )).scalars())
+            stored = {row["id"] for row in kept_traces} - inserted
+            if stored:
+                duplicates |= stored
+                trace_rows, span_rows = _without_traces(stored, trace_rows, span_rows)
+                kept_traces, kept_spans = _without_traces(stored, kept_traces, kept_spans)
+        if kept_spans:
+            await db.execute(
+                pg_insert(spans).on_conflict_do_nothing(index_elements=[spans.c.id, spans.c.start_time]),
+                kept_spans,
+            )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error processing trace batch: {e}")
+        raise
+    await RollupService.commit_deltas(db, RollupService.accumulate(kept_traces, kept_spans))
+    await seen_traces.mark(project_id, [row["id"] for row in trace_rows])
+    return duplicates
+
+
+def _without_traces(
+    trace_ids: Set[uuid.UUID],
+    trace_rows: List[Dict[str, Any]],
+    span_rows: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    if not trace_ids:
+        return trace_rows, span_rows
+    return (
+        [row for row in trace_rows if row["id"] not in trace_ids],
+        [row for row in span_rows if row["trace_id"] not in trace_ids],
     )
-    
-    db.add(db_trace)
-    
-    total_tokens = 0
-    prompt_tokens = 0
-    completion_tokens = 0
-    total_cost = 0.0
-    
-    # Process spans
-    for span_in in trace_in.spans:
-        span_id = span_in.id or uuid.uuid4()
-        
-        # Calculate latency for the span
-        latency = None
-        if span_in.end_time and span_in.start_time:
-            latency = (span_in.end_time - span_in.start_time).total_seconds() * 1000
-            
-        # Basic cost estimation logic (simplified)
-        span_cost = 0.0
-        if span_in.total_tokens:
-            # Placeholder: 0.002 per 1k tokens
-            span_cost = (span_in.total_tokens / 1000) * 0.002
-            
-        db_span = models.Span(
-            id=span_id,
-            trace_id=trace_id,
-            parent_span_id=span_in.parent_span_id,
-            name=span_in.name,
-            span_type=span_in.span_type,
-            start_time=span_in.start_time,
-            end_time=span_in.end_time,
-            latency_ms=latency,
-            input=span_in.input,
-            output=span_in.output,
-            attributes=span_in.attributes,
-            model=span_in.model,
-            prompt_tokens=span_in.prompt_tokens,
-            completion_tokens=span_in.completion_tokens,
-            total_tokens=span_in.total_tokens,
-            cost_usd=span_cost
-        )
-        
-        db.add(db_span)
-        
-        # Aggregate metrics
-        if span_in.total_tokens:
-            total_tokens += span_in.total_tokens
-        if span_in.prompt_tokens:
-            prompt_tokens += span_in.prompt_tokens
-        if span_in.completion_tokens:
-            completion_tokens += span_in.completion_tokens
-        total_cost += span_cost
-
-    # Update trace with aggregated metrics
-    db_trace.total_tokens = total_tokens
-    db_trace.prompt_tokens = prompt_tokens
-    db_trace.completion_tokens = completion_tokens
-    db_trace.total_cost_usd = total_cost
-    
-    if db_trace.end_time and db_trace.start_time:
-        db_trace.latency_ms = (db_trace.end_time - db_trace.start_time).total_seconds() * 1000
-    
+
+
+async def process_trace_batch(
+    db: AsyncSession,
+    traces_in: List[Dict[str, Any]],
+    project_id: uuid.UUID,
+    sampling: Optional[TailSamplingPolicy] = None,
+    organization_id: Optional[uuid.UUID] = None
+) -> schemas.TraceBatchResult:
+    """
+    Validate and persist many traces in a single transaction.
+
+    Every trace is validated on its own and reported back as accepted,
+    rejected, or duplicate (already stored, e.g. by an earlier attempt of a
+    retried request). Accepted traces and spans are written with one
+    multi-row INSERT per table instead of a flush, commit and refresh per trace.
+    """
+    await pricing_catalog.refresh()
+    results, trace_rows, span_rows = prepare_trace_batch(traces_in, project_id, organization_id)
+    duplicates = await write_trace_rows(db, trace_rows, span_rows, sampling)
+    for result in results:
+        if result.id in duplicates and result.status == "accepted":
+            result.status = "duplicate"
+    return batch_result(results)
+
+
+def batch_result(results: List[schemas.TraceIngestResult]) -> schemas.TraceBatchResult:
+    counts = {"accepted": 0, "queued": 0, "rejected": 0, "duplicate": 0}
+    for result in results:
+        counts[result.status] += 1
+    return schemas.TraceBatchResult(
+        accepted=counts["accepted"] + counts["queued"],
+        rejected=counts["rejected"],
+        duplicates=counts["duplicate"],
+        results=results,
+    )
+
+
+async def append_trace_spans(
+    db: AsyncSession,
+    trace_in: schemas.TraceCreate,
+    project_id: uuid.UUID,
+    organization_id: Optional[uuid.UUID] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Add a chunk of spans to a running trace, creating the trace on first sight.
+
+    Spans are inserted first with ON CONFLICT DO NOTHING, and only the newly
+    inserted ones are added to the stored token and cost aggregates (in the
+    trace upsert itself) and to the rollups, so the caller never resends
+    earlier spans and a retried chunk changes nothing. A chunk with an
+    `end_time` closes the trace (COMPLETED, or FAILED if any span errored)
+    and only then counts it in the trace-level rollups; span-level rollups
+    are updated per chunk. Returns the stored trace row, or None if the
+    trace belongs to another project or was closed before these spans arrived.
+    """
+    await pricing_catalog.refresh()
+    trace_row = build_trace_header(trace_in, project_id)
+    span_rows = [build_span_row(span_in, trace_row["id"]) for span_in in trace_in.spans]
+    pricing_catalog.price_spans(span_rows, organization_id)
+    await offload_payloads(project_id, [trace_row], span_rows)
+
+    table = models.Trace.__table__
+    spans = models.Span.__table__
     try:
-        db.commit()
-        db.refresh(db_trace)
-        return db_trace
+        # Spans have no FK to the (hypertable) traces, so they can go in before the trace row
+        new_spans: List[Dict[str, Any]] = []
+        if span_rows:
+            inserted = set((await db.execute(
+                pg_insert(spans)
+                .on_conflict_do_nothing(index_elements=[spans.c.id, spans.c.start_time])
+                .returning(spans.c.id),
+                span_rows,
+            )).scalars())
+            new_spans = [span_row for span_row in span_rows if span_row["id"] in inserted]
+        for span_row in new_spans:
+            add_span_totals(trace_row, span_row)
+        if trace_in.end_time is None:
+            # Errors are remembered in error_message; the status flips when the trace closes
+            trace_row["status"] = models.TraceStatus.RUNNING
+
+        stmt = pg_insert(table).values(trace_row)
+        error_message = func.coalesce(table.c.error_message, stmt.excluded.error_message)
+        # Explicit casts: bare CASE parameters would be typed as text, not the enum
+        status = case(
+            (stmt.excluded.end_time.is_(None), cast(models.TraceStatus.RUNNING, table.c.status.type)),
+            (error_message.is_not(None), cast(models.TraceStatus.FAILED, table.c.status.type)),
+            else_=cast(models.TraceStatus.COMPLETED, table.c.status.type),
+        )
+        updates = {
+            col: table.c[col] + stmt.excluded[col]
+            for col in ("total_tokens", "prompt_tokens", "completion_tokens", "total_cost_usd")
+        }
+        updates.update(
+            status=status,
+            error_message=error_message,
+            end_time=stmt.excluded.end_time,
+            latency_ms=stmt.excluded.latency_ms,
+            output=func.coalesce(stmt.excluded.output, table.c.output),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.id, table.c.start_time],
+            set_=updates,
+            where=(table.c.project_id == stmt.excluded.project_id) & (table.c.status == models.TraceStatus.RUNNING),
+        ).returning(*table.c)
+
+        stored = (await db.execute(stmt)).mappings().one_or_none()
+        if stored is None:
+            await db.rollback()
+            if not new_spans:
+                # A retry of a chunk applied before the trace closed
+                return await load_trace_row(db, trace_row["id"], project_id)
+            return None
+
+        stored = dict(stored)
+        await db.commit()
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error processing trace: {e}")
+        await db.rollback()
+        logger.error(f"Error appending spans to trace: {e}")
         raise
+
+    rollups = RollupAccumulator()
+    for span_row in new_spans:
+        rollups.add_span(span_row, project_id, stored["sample_rate"] or 1.0)
+    if stored["status"] != models.TraceStatus.RUNNING:
+        rollups.add_trace(stored)
+    await RollupService.commit_deltas(db, rollups.drain())
+    return stored
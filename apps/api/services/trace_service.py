@@ -7,8 +7,17 @@ from datetime import datetime
 class TraceService:
     @staticmethod
     def create_trace(db: Session, project_id: uuid.UUID, trace_data: schemas.TraceCreate):
+        # Keep the client's id so a retried create returns the first copy instead of a duplicate
+        if trace_data.id is not None:
+            existing = db.query(models.Trace).filter(
+                models.Trace.id == trace_data.id,
+                models.Trace.project_id == project_id,
+            ).first()
+            if existing is not None:
+                return existing
+
         db_trace = models.Trace(
-            id=uuid.uuid4(),
+            id=trace_data.id or uuid.uuid4(),
             project_id=project_id,
             status="running",
             start_time=datetime.utcnow(),
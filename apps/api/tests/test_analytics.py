@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from ..core.config import settings
+from ..services import analytics_service
+from ..services.analytics_engine import ParquetQueryEngine
+from ..services.analytics_service import AnalyticsService, _merge_groups
+from ..services.trace_archive import TraceArchive
+
+PROJECT = uuid.uuid4()
+
+
+def route(since, until):
+    return asyncio.run(AnalyticsService.route_window(PROJECT, since, until))
+
+
+def test_merge_adds_counters_and_keeps_max():
+    rows = [
+        {"name": "llm", "spans": 2, "latency_sum_ms": 30.0, "latency_max_ms": 20.0},
+        {"name": "tool", "spans": 1, "latency_sum_ms": 5.0, "latency_max_ms": None},
+        {"name": "llm", "spans": 3, "latency_sum_ms": 60.0, "latency_max_ms": 40.0},
+    ]
+    merged = {row["name"]: row for row in _merge_groups(rows, "name", max_fields=("latency_max_ms",))}
+    assert merged["llm"] == {"name": "llm", "spans": 5, "latency_sum_ms": 90.0, "latency_max_ms": 40.0}
+    assert merged["tool"]["latency_max_ms"] is None
+
+
+def test_window_stays_in_postgres_without_export(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_EXPORT_ENABLED", False)
+    parquet, postgres = route(datetime(2025, 1, 1, 9), datetime(2025, 3, 1, 12))
+    assert parquet is None
+    # Widened to whole days
+    assert postgres == (datetime(2025, 1, 1), datetime(2025, 3, 2))
+
+
+def test_old_exported_days_go_to_parquet(monkeypatch):
+    today = datetime.utcnow().date()
+    monkeypatch.setattr(settings, "ANALYTICS_EXPORT_ENABLED", True)
+    monkeypatch.setattr(settings, "ANALYTICS_POSTGRES_DAYS", 7)
+    engine = SimpleNamespace(covered_until=lambda project_id: today - timedelta(days=1))
+    monkeypatch.setattr(analytics_service, "get_query_engine", lambda: engine)
+
+    since = datetime.combine(today - timedelta(days=90), datetime.min.time())
+    until = datetime.combine(today, datetime.min.time())
+    parquet, postgres = route(since, until)
+    split = today - timedelta(days=7)
+    assert parquet == (since.date(), split)
+    assert postgres == (datetime.combine(split, datetime.min.time()), until)
+
+    # Export lagging behind: Postgres serves everything after the last exported day
+    engine.covered_until = lambda project_id: today - timedelta(days=30)
+    parquet, postgres = route(since, until)
+    assert parquet == (since.date(), today - timedelta(days=30))
+
+    # Nothing exported yet
+    engine.covered_until = lambda project_id: None
+    assert route(since, until)[0] is None
+
+
+def test_parquet_aggregates_are_sampling_weighted(tmp_path):
+    day = date(2025, 7, 1)
+    start = datetime(2025, 7, 1, 12)
+    traces = [
+        {"id": uuid.uuid4(), "project_id": PROJECT, "start_time": start, "user_id": "ann",
+         "total_cost_usd": 0.5, "total_tokens": 100, "sample_rate": 0.25},
+        {"id": uuid.uuid4(), "project_id": PROJECT, "start_time": start, "user_id": None,
+         "total_cost_usd": 1.0, "total_tokens": 10, "sample_rate": 1.0},
+    ]
+    spans = [
+        {"id": uuid.uuid4(), "trace_id": traces[0]["id"], "start_time": start, "name": "llm",
+         "latency_ms": 100.0, "status": "ok"},
+        {"id": uuid.uuid4(), "trace_id": traces[1]["id"], "start_time": start, "name": "llm",
+         "latency_ms": 500.0, "status": "error"},
+    ]
+    store = TraceArchive(str(tmp_path))
+    writer = store.open_day(PROJECT, day)
+    writer.write("traces", traces)
+    writer.write("spans", spans)
+    writer.commit()
+
+    engine = ParquetQueryEngine(store)
+    users = {row["user_id"]: row for row in engine.cost_by_user(PROJECT, day, day + timedelta(days=1))}
+    assert users["ann"] == {"user_id": "ann", "sampled_traces": 1, "traces": 4.0, "cost_usd": 2.0, "tokens": 400.0}
+    assert users[""]["traces"] == 1.0
+
+    (llm,) = engine.latency_by_span_name(PROJECT, day, day + timedelta(days=1))
+    assert llm["sampled_spans"] == 2
+    assert llm["spans"] == 5.0 and llm["errors"] == 1.0
+    # Weighted mean: (4 * 100 + 1 * 500) / 5
+    assert llm["latency_sum_ms"] / llm["latency_count"] == 180.0
+    assert llm["latency_max_ms"] == 500.0
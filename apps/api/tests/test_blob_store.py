@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from ..services import payloads
+from ..services.blob_store import FilesystemBlobStore, compress, decompress
+from ..core.config import settings
+from ..services.payloads import BLOB_KEY, PayloadOffloader, expand_payloads, offload_payloads
+
+
+def _digest(data: bytes) -> str:
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def test_compress_roundtrip():
+    data = ("You are a helpful assistant. " * 200).encode("utf-8")
+    packed = compress(data)
+    assert len(packed) < len(data)
+    assert decompress(packed) == data
+
+
+def test_filesystem_store_writes_each_digest_once(tmp_path):
+    store = FilesystemBlobStore(str(tmp_path))
+    project = uuid.uuid4()
+    data = b"system prompt " * 100
+    digest = _digest(data)
+
+    async def run():
+        assert await store.put_many(project, {digest: data}) == 1
+        assert await store.put_many(project, {digest: data}) == 0
+        # A fresh process (empty known-digest cache) still finds the stored file
+        assert await FilesystemBlobStore(str(tmp_path)).put_many(project, {digest: data}) == 0
+        assert await store.get(project, digest) == data
+        assert await store.get(uuid.uuid4(), digest) is None
+
+    asyncio.run(run())
+    assert store.stats() == {"stored": 1, "deduplicated": 1}
+
+
+def test_offloader_references_large_strings_and_fields():
+    offloader = PayloadOffloader(inline_max_bytes=256, preview_chars=10)
+    prompt = "x" * 300
+    assert offloader.field({"q": "short"}) == {"q": "short"}
+
+    value = offloader.field({"system": prompt, "user": "hi"})
+    assert value["user"] == "hi"
+    assert value["system"] == {BLOB_KEY: _digest(prompt.encode()), "bytes": 300, "preview": "x" * 10}
+    # The same prompt on another span adds no second blob
+    offloader.field({"system": prompt})
+    assert len(offloader.blobs) == 1
+
+    many = {f"k{i}": "value" for i in range(40)}
+    ref = offloader.field(many)
+    assert ref["format"] == "json"
+    assert json.loads(offloader.blobs[ref[BLOB_KEY]]) == many
+    assert offloader.field(ref) is ref
+
+
+def test_expand_payloads_restores_nested_references(tmp_path, monkeypatch):
+    store = FilesystemBlobStore(str(tmp_path))
+    monkeypatch.setattr(payloads, "get_blob_store", lambda: store)
+    project = uuid.uuid4()
+    offloader = PayloadOffloader(inline_max_bytes=256, preview_chars=10)
+    original = {"system": "p" * 300, "history": [f"turn {i}" for i in range(40)]}
+    trace = {"input": None, "spans": [{"input": offloader.field(original), "output": {"text": "ok"}}]}
+
+    async def run():
+        await store.put_many(project, offloader.blobs)
+        await expand_payloads(project, [trace], children_keys=("spans",))
+
+    asyncio.run(run())
+    assert trace["spans"][0]["input"] == original
+    assert trace["spans"][0]["output"] == {"text": "ok"}
+
+
+def test_filesystem_store_deletes_blobs_unseen_since_cutoff(tmp_path):
+    store = FilesystemBlobStore(str(tmp_path), known_ttl_seconds=3600)
+    project = uuid.uuid4()
+    old, hot, stale = b"old prompt", b"hot prompt", b"stale prompt"
+    blobs = {_digest(data): data for data in (old, hot, stale)}
+    day = 24 * 3600
+
+    async def run():
+        await store.put_many(project, blobs)
+        for data in blobs.values():
+            path = store._path(store._key(project, _digest(data)))
+            os.utime(path, (time.time() - 3 * day, time.time() - 3 * day))
+        # Within one known-digest TTL of the cutoff: a cached reference may still be in flight
+        path = store._path(store._key(project, _digest(stale)))
+        os.utime(path, (time.time() - day - 1800, time.time() - day - 1800))
+        # Referenced by new rows after its known-digest entry expired
+        store._known.clear()
+        await store.touch_many(project, [_digest(hot)])
+
+        assert await store.delete_unseen(project, datetime.utcnow() - timedelta(days=1)) == 1
+        assert await store.get(project, _digest(old)) is None
+        assert await store.get(project, _digest(hot)) == hot
+        assert await store.get(project, _digest(stale)) == stale
+        # The deleted digest is no longer known, so an upload writes it again
+        assert await store.put_many(project, {_digest(old): old}) == 1
+
+    asyncio.run(run())
+
+
+def test_offload_touches_blobs_the_sdk_uploaded(tmp_path, monkeypatch):
+    store = FilesystemBlobStore(str(tmp_path))
+    monkeypatch.setattr(payloads, "get_blob_store", lambda: store)
+    monkeypatch.setattr(settings, "PAYLOAD_INLINE_MAX_BYTES", 256)
+    project = uuid.uuid4()
+    data = b"uploaded by the sdk"
+    digest = _digest(data)
+    ref = {BLOB_KEY: digest, "bytes": len(data), "preview": "uploaded"}
+    touched = []
+
+    def touch(key):
+        touched.append(key)
+        return True
+
+    monkeypatch.setattr(store, "_touch", touch)
+
+    async def run():
+        span = {"input": {"messages": [ref]}, "output": None}
+        await offload_payloads(project, [{"input": None, "output": None}], [span])
+        await offload_payloads(project, [], [span])
+
+    asyncio.run(run())
+    # Touched once; the second batch finds the digest in the known cache
+    assert touched == [store._key(project, digest)]
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from ..core import cache as cache_module
+from ..core.cache import CacheInvalidations, TTLCache
+
+
+def test_hit_and_miss_counters():
+    cache = TTLCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60)
+    assert cache.get("key") == (False, None)
+    cache.set("key", "project")
+    assert cache.get("key") == (True, "project")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_negative_entries_are_cached():
+    cache = TTLCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60)
+    cache.set_missing("bad-key")
+    assert cache.get("bad-key") == (True, None)
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(max_size=10, ttl_seconds=0.01, negative_ttl_seconds=0.01)
+    cache.set("key", "project")
+    time.sleep(0.02)
+    assert cache.get("key") == (False, None)
+
+
+def test_lru_eviction_and_invalidate():
+    cache = TTLCache(max_size=2, ttl_seconds=60, negative_ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    cache.invalidate("a")
+    assert cache.get("a") == (False, None)
+
+
+class FakePubSub:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.channels = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+        self.subscription = None
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        self.subscription.messages.put_nowait({"type": "message", "data": message.encode()})
+
+    def pubsub(self):
+        return self.subscription
+
+
+def make_invalidations(cache, redis):
+    invalidations = CacheInvalidations.__new__(CacheInvalidations)
+    invalidations.cache = cache
+    invalidations.channel = "keys"
+    invalidations.retry_seconds = 0
+    invalidations._publisher = invalidations._subscriber = redis
+    invalidations._task = None
+    invalidations.received = invalidations.errors = 0
+    return invalidations
+
+
+def test_published_invalidations_drop_keys_in_every_process(monkeypatch):
+    cache = TTLCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60)
+    redis = FakeRedis()
+    invalidations = make_invalidations(cache, redis)
+    monkeypatch.setattr(cache_module, "project_key_cache", TTLCache(10, 60, 60))
+    monkeypatch.setattr(cache_module, "get_key_invalidations", lambda: invalidations)
+
+    async def run():
+        redis.subscription = FakePubSub()
+        cache.set("stale", 0)
+        invalidations.start()
+        await asyncio.sleep(0)
+        # Anything cached before subscribing may have missed an invalidation
+        assert redis.subscription.channels == ["keys"]
+        assert cache.get("stale") == (False, None)
+
+        cache.set("old-key", 1)
+        cache.set("other-key", 2)
+        # Rotating a key in this process reaches the listener of another one
+        cache_module.invalidate_project_key("old-key")
+        await asyncio.sleep(0)
+        await invalidations.stop()
+
+    asyncio.run(run())
+    assert redis.published == [("keys", "old-key")]
+    assert cache.get("old-key") == (False, None)
+    assert cache.get("other-key") == (True, 2)
+    assert invalidations.received == 1
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from ..core import database
+from ..core.config import settings
+
+
+def test_async_engine_uses_the_configured_pool():
+    engine = database.async_engine
+    assert engine.url.drivername == "postgresql+asyncpg"
+    pool = engine.pool
+    assert pool.size() == settings.DB_POOL_SIZE
+    assert pool._max_overflow == settings.DB_MAX_OVERFLOW
+    assert pool._timeout == settings.DB_POOL_TIMEOUT
+    assert pool._recycle == settings.DB_POOL_RECYCLE
+    assert pool._pre_ping
+
+
+def test_async_session_dependency_yields_one_session_and_closes_it():
+    async def run():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        # Handlers read ORM objects after commit without a reload
+        assert db.bind is database.async_engine
+        assert db.sync_session.expire_on_commit is False
+        closed = []
+        db.sync_session.close = lambda: closed.append(True)
+        with pytest.raises(StopAsyncIteration):
+            await dependency.__anext__()
+        return closed
+
+    assert asyncio.run(run()) == [True]
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import uuid
+
+from ..core.dedup import RecentIdSet, SeenTraceIds
+
+
+def test_ids_are_remembered_for_at_least_one_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    ids = RecentIdSet(ttl_seconds=60, max_size=100)
+    ids.add_many(["a"])
+    now[0] += 59
+    ids.add_many(["b"])
+    now[0] += 2
+    # "a" moved to the previous generation; both are still known
+    assert "a" in ids and "b" in ids
+    now[0] += 60
+    assert "a" not in ids
+    now[0] += 121
+    assert "b" not in ids
+    assert len(ids) == 0
+
+
+def test_size_bound_rotates_early():
+    ids = RecentIdSet(ttl_seconds=3600, max_size=2)
+    ids.add_many(["a", "b", "c", "d", "e"])
+    assert len(ids) <= 4
+    assert "e" in ids and "a" not in ids
+
+
+def test_seen_only_after_mark():
+    seen = SeenTraceIds(ttl_seconds=60, local_max_size=100)
+    project, other = uuid.uuid4(), uuid.uuid4()
+    first, second = uuid.uuid4(), uuid.uuid4()
+
+    async def run():
+        assert await seen.seen(project, [first, second]) == set()
+        await seen.mark(project, [first])
+        assert await seen.seen(project, [first, second]) == {first}
+        # Scoped per project
+        assert await seen.seen(other, [first]) == set()
+
+    asyncio.run(run())
+    assert seen.stats()["duplicates"] == 1
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+
+import pytest
+
+from ..core.ingest_queue import IngestQueueFull, RedisStreamQueue
+
+PROJECT = uuid.uuid4()
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeRedis:
+    """
+    The stream commands RedisStreamQueue uses, over an in-memory stream and
+    one consumer group's pending entries list.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        # message id -> [consumer, times delivered, idle past the claim timeout]
+        self.pending = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def xlen(self, stream):
+        return len(self.entries)
+
+    async def xadd(self, stream, fields):
+        message_id = f"{len(self.entries) + 1}-0"
+        self.entries[message_id] = {k.encode(): v.encode() for k, v in fields.items()}
+        return message_id.encode()
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id, count):
+        claimed = []
+        for message_id, entry in sorted(self.pending.items()):
+            if len(claimed) < count and entry[2]:
+                entry[:] = [consumer, entry[1] + 1, False]
+                claimed.append((message_id.encode(), self.entries[message_id]))
+        return "0-0", claimed, []
+
+    async def xreadgroup(self, group, consumer, streams, count, block):
+        return []
+
+    async def xpending_range(self, stream, group, min, max, count, consumername=None):
+        key = lambda message_id: tuple(int(part) for part in message_id.decode().split("-"))
+        matches = [
+            {"message_id": message_id.encode(), "consumer": entry[0].encode(), "times_delivered": entry[1]}
+            for message_id, entry in sorted(self.pending.items())
+            if key(min) <= key(message_id.encode()) <= key(max)
+            and (consumername is None or entry[0] == consumername)
+        ]
+        return matches[:count]
+
+
+def make_queue(redis, maxlen=100):
+    queue = RedisStreamQueue.__new__(RedisStreamQueue)
+    queue.redis = redis
+    queue.stream = "ingest"
+    queue.group = "workers"
+    queue.maxlen = maxlen
+    queue.claim_idle_ms = 0
+    queue._group_ready = True
+    return queue
+
+
+def test_claimed_messages_report_their_own_delivery_counts():
+    redis = FakeRedis()
+    queue = make_queue(redis)
+
+    async def run():
+        await queue.publish_many(PROJECT, [{"id": str(i)} for i in range(6)])
+        # Every other entry is pending on a dead consumer and gets claimed; the
+        # entries between them are still being worked on by a live one
+        for i, message_id in enumerate(sorted(redis.entries)):
+            redis.pending[message_id] = ["live", 1, False] if i % 2 else ["dead", 4, True]
+        return await queue.read("worker", 3, 0)
+
+    messages = asyncio.run(run())
+    assert [m.payload["id"] for m in messages] == ["0", "2", "4"]
+    assert [m.deliveries for m in messages] == [5, 5, 5]
+
+
+def test_full_backlog_rejects_instead_of_trimming():
+    redis = FakeRedis()
+    queue = make_queue(redis, maxlen=3)
+
+    async def run():
+        await queue.publish_many(PROJECT, [{"id": "a"}, {"id": "b"}])
+        with pytest.raises(IngestQueueFull):
+            await queue.publish_many(PROJECT, [{"id": "c"}, {"id": "d"}])
+        await queue.publish(PROJECT, {"id": "c"})
+        with pytest.raises(IngestQueueFull):
+            await queue.publish(PROJECT, {"id": "d"})
+
+    asyncio.run(run())
+    assert len(redis.entries) == 3
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import uuid
+
+import pytest
+
+from ..core.ingest_queue import FileQueue
+from ..services.ingest_worker import IngestWorkerPool
+
+PROJECT = uuid.uuid4()
+
+
+def test_failing_batch_is_split_and_poison_trace_dead_lettered(tmp_path, monkeypatch):
+    queue = FileQueue(str(tmp_path), visibility_timeout=0)
+    pool = IngestWorkerPool(queue, concurrency=1, batch_size=10, block_ms=0, max_deliveries=2)
+    written = []
+
+    async def write(project_id, payloads):
+        if any(payload["id"] == "bad" for payload in payloads):
+            raise ValueError("value too long for type character varying(255)")
+        written.extend(payload["id"] for payload in payloads)
+
+    monkeypatch.setattr(pool, "_write", write)
+
+    async def run():
+        for trace_id in ("a", "bad", "b"):
+            await queue.publish(PROJECT, {"id": trace_id})
+
+        messages = await queue.read("worker", 10, 0)
+        assert [m.deliveries for m in messages] == [1, 1, 1]
+        with pytest.raises(ValueError):
+            await pool._process(messages)
+
+        # Redelivered; the second delivery reaches the limit
+        messages = await queue.read("worker", 10, 0)
+        assert [m.deliveries for m in messages] == [2, 2, 2]
+        await pool._process(messages)
+        assert await queue.read("worker", 10, 0) == []
+
+    asyncio.run(run())
+    assert written == ["a", "b"]
+    with open(os.path.join(tmp_path, "dead.log")) as f:
+        dead = [json.loads(line) for line in f]
+    assert [record["payload"]["id"] for record in dead] == ["bad"]
+    assert "character varying" in dead[0]["error"]
+
+
+def test_connection_errors_are_never_dead_lettered(tmp_path, monkeypatch):
+    queue = FileQueue(str(tmp_path), visibility_timeout=0)
+    pool = IngestWorkerPool(queue, concurrency=1, batch_size=10, block_ms=0, max_deliveries=1)
+
+    async def write(project_id, payloads):
+        raise ConnectionRefusedError("database is down")
+
+    monkeypatch.setattr(pool, "_write", write)
+
+    async def run():
+        await queue.publish(PROJECT, {"id": "a"})
+        with pytest.raises(ConnectionRefusedError):
+            await pool._process(await queue.read("worker", 10, 0))
+        assert len(await queue.read("worker", 10, 0)) == 1
+
+    asyncio.run(run())
+    assert not os.path.exists(os.path.join(tmp_path, "dead.log"))
+
+
+def test_failing_project_does_not_hold_back_others(tmp_path, monkeypatch):
+    queue = FileQueue(str(tmp_path), visibility_timeout=0)
+    pool = IngestWorkerPool(queue, concurrency=1, batch_size=10, block_ms=0)
+    other = uuid.uuid4()
+    written = []
+
+    async def write(project_id, payloads):
+        if project_id == PROJECT:
+            raise ConnectionRefusedError("database is down")
+        written.extend(payload["id"] for payload in payloads)
+
+    monkeypatch.setattr(pool, "_write", write)
+
+    async def run():
+        await queue.publish(PROJECT, {"id": "a"})
+        await queue.publish(other, {"id": "b"})
+        with pytest.raises(ConnectionRefusedError):
+            await pool._process(await queue.read("worker", 10, 0))
+        # Only the failed project's message is redelivered
+        return await queue.read("worker", 10, 0)
+
+    redelivered = asyncio.run(run())
+    assert written == ["b"]
+    assert [m.payload["id"] for m in redelivered] == ["a"]
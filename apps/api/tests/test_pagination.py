@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from ..utils.pagination import build_page, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 6, 1, 12, 30, 15, 123456)
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(ts, row_id)) == (ts, row_id)
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_build_page_sets_next_cursor_only_when_more_rows():
+    rows = [SimpleNamespace(id=uuid.uuid4(), start_time=datetime(2025, 6, 1, 0, i)) for i in range(3)]
+
+    items, next_cursor = build_page(rows, 3, "start_time")
+    assert items == rows and next_cursor is None
+
+    items, next_cursor = build_page(rows, 2, "start_time")
+    assert items == rows[:2]
+    assert decode_cursor(next_cursor) == (rows[1].start_time, rows[1].id)
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from ..schemas import schemas
+from ..services import pricing
+from ..services.pricing import PricingCatalog, recompute_costs
+
+ORG = uuid.uuid4()
+
+
+def price(model, prompt, completion, effective_from, organization_id=None):
+    return SimpleNamespace(
+        organization_id=organization_id,
+        model=model,
+        prompt_usd_per_1k=prompt,
+        completion_usd_per_1k=completion,
+        effective_from=effective_from,
+    )
+
+
+def span(model, prompt=0, completion=0, total=0, start=datetime(2024, 6, 1)):
+    return {
+        "model": model,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": total,
+        "start_time": start,
+        "cost_usd": 0.0,
+    }
+
+
+def make_catalog():
+    catalog = PricingCatalog(refresh_seconds=60, default_usd_per_1k=0.002)
+    catalog.load([
+        price("gpt-4o", 0.005, 0.015, datetime(2024, 1, 1)),
+        price("gpt-4o", 0.0025, 0.01, datetime(2024, 8, 1)),
+        price("gpt-4o-mini", 0.00015, 0.0006, datetime(2024, 1, 1)),
+        price("gpt-4o", 0.002, 0.008, datetime(2024, 7, 1), organization_id=ORG),
+    ])
+    return catalog
+
+
+def test_prompt_and_completion_rates_by_effective_date():
+    rows = [
+        span("gpt-4o", prompt=1000, completion=1000, start=datetime(2024, 6, 1)),
+        span("gpt-4o", prompt=1000, completion=1000, start=datetime(2024, 9, 1)),
+        span("gpt-4o", prompt=1000, start=datetime(2024, 8, 1, tzinfo=timezone.utc)),
+    ]
+    make_catalog().price_spans(rows)
+    assert [round(r["cost_usd"], 6) for r in rows] == [0.02, 0.0125, 0.0025]
+
+
+def test_longest_prefix_match_and_default_rate():
+    rows = [
+        span("gpt-4o-mini-2024-07-18", prompt=2000, completion=1000),
+        span("gpt-4o-2024-05-13", completion=1000),
+        span("some-local-model", total=1000),
+        span(None, total=500),
+        span("gpt-4o"),
+    ]
+    make_catalog().price_spans(rows)
+    assert [round(r["cost_usd"], 6) for r in rows] == [0.0009, 0.015, 0.002, 0.001, 0.0]
+
+
+def test_total_tokens_without_split_use_prompt_rate():
+    rows = [span("gpt-4o", total=2000)]
+    make_catalog().price_spans(rows)
+    assert round(rows[0]["cost_usd"], 6) == 0.01
+
+
+def test_org_override_falls_back_to_global_before_its_first_version():
+    rows = [
+        span("gpt-4o", prompt=1000, start=datetime(2024, 6, 1)),
+        span("gpt-4o", prompt=1000, start=datetime(2024, 7, 15)),
+        span("gpt-4o-mini", prompt=1000, start=datetime(2024, 7, 15)),
+    ]
+    make_catalog().price_spans(rows, ORG)
+    assert [round(r["cost_usd"], 6) for r in rows] == [0.005, 0.002, 0.00015]
+
+
+def test_reload_replaces_prices():
+    catalog = make_catalog()
+    rows = [span("gpt-4o", prompt=1000)]
+    catalog.price_spans(rows)
+    catalog.load([price("gpt-4o", 0.001, 0.001, datetime(2024, 1, 1))])
+    catalog.price_spans(rows)
+    assert round(rows[0]["cost_usd"], 6) == 0.001
+    assert catalog.reloads == 2
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def mappings(self):
+        return self.rows
+
+
+class FakeSession:
+    """
+    Answers the project query, then one page of spans; records every other statement.
+    """
+
+    def __init__(self, projects, spans):
+        self.results = [projects, spans, []]
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            self.statements.append((statement, params))
+            return FakeResult([])
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        pass
+
+
+def test_recompute_bounds_span_and_trace_updates_by_start_time(monkeypatch):
+    catalog = make_catalog()
+
+    async def refresh():
+        pass
+
+    async def rebuild(db, project_id, since, until):
+        pass
+
+    monkeypatch.setattr(catalog, "refresh", refresh)
+    monkeypatch.setattr(pricing.RollupService, "rebuild", rebuild)
+    trace_id = uuid.uuid4()
+    spans = [
+        dict(span("gpt-4o", prompt=1000, start=datetime(2024, 6, 1, 12, minute)),
+             id=uuid.uuid4(), trace_id=trace_id,
+             trace_start_time=datetime(2024, 6, 1, 12), trace_end_time=datetime(2024, 6, 1, 13))
+        for minute in (0, 5)
+    ]
+    db = FakeSession([(uuid.uuid4(), ORG, {})], spans)
+    request = schemas.PriceRecompute(since=datetime(2024, 6, 1), until=datetime(2024, 6, 2))
+
+    result = asyncio.run(recompute_costs(db, request, catalog=catalog, batch_rows=10))
+
+    assert result.spans == 2 and result.traces == 1
+    (_, span_params), (_, trace_params) = db.statements
+    assert [(row["id"], row["start_time"]) for row in span_params] == [(s["id"], s["start_time"]) for s in spans]
+    assert trace_params["since"] == datetime(2024, 6, 1, 12)
+    assert trace_params["spans_until"] == datetime(2024, 6, 1, 13)
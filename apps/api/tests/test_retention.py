@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime, timedelta
+
+from ..core.config import settings
+from ..models import models
+from ..services import rollup_service
+from ..services.retention import RetentionPolicy
+from ..services.trace_archive import ARCHIVE_TABLES, from_archive_rows, group_by_day, to_archive_rows
+
+
+def test_policy_from_project_settings(monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_TRACES_DAYS", None)
+    assert RetentionPolicy.from_settings({}) is None
+    assert RetentionPolicy.from_settings({"retention": {"archive": True}}) is None
+    assert RetentionPolicy.from_settings({"retention": {"traces_days": 30, "archive": True}}) == RetentionPolicy(30, True)
+
+    monkeypatch.setattr(settings, "RETENTION_TRACES_DAYS", 90)
+    assert RetentionPolicy.from_settings(None) == RetentionPolicy(90, False)
+    # A project can opt out of the default
+    assert RetentionPolicy.from_settings({"retention": {"traces_days": None}}) is None
+
+
+def test_cutoff_is_day_aligned():
+    policy = RetentionPolicy(traces_days=7)
+    assert policy.cutoff(datetime(2025, 7, 20, 15, 30)) == datetime(2025, 7, 13)
+
+
+def test_granularity_skips_downsampled_rollups(monkeypatch):
+    now = datetime.utcnow()
+    monkeypatch.setattr(settings, "ROLLUP_MINUTE_RETENTION_DAYS", 7)
+    monkeypatch.setattr(settings, "ROLLUP_HOUR_RETENTION_DAYS", 90)
+    pick = rollup_service.pick_granularity
+    assert pick(now - timedelta(hours=1)) == "minute"
+    assert pick(now - timedelta(days=30), now - timedelta(days=30) + timedelta(hours=1)) == "hour"
+    assert pick(now - timedelta(days=200), now - timedelta(days=199)) == "day"
+
+    monkeypatch.setattr(settings, "ROLLUP_MINUTE_RETENTION_DAYS", None)
+    assert pick(now - timedelta(days=30), now - timedelta(days=30) + timedelta(hours=1)) == "minute"
+
+
+def test_spans_are_archived_with_their_trace_day():
+    trace_id = uuid.uuid4()
+    trace = {"id": trace_id, "start_time": datetime(2025, 7, 1, 23, 59)}
+    late_span = {"id": uuid.uuid4(), "trace_id": trace_id, "start_time": datetime(2025, 7, 2, 0, 1)}
+    days = group_by_day([trace], [late_span])
+    assert list(days) == [datetime(2025, 7, 1).date()]
+    assert days[datetime(2025, 7, 1).date()] == ([trace], [late_span])
+
+
+def test_archive_rows_round_trip():
+    table = ARCHIVE_TABLES["traces"]
+    row = {column.name: None for column in table.columns}
+    row.update(
+        id=uuid.uuid4(),
+        project_id=uuid.uuid4(),
+        status=models.TraceStatus.FAILED,
+        start_time=datetime(2025, 7, 1, 12),
+        input={"question": "why?", "$blob": None},
+        tags=["a", "b"],
+        total_tokens=12,
+    )
+    archived = to_archive_rows(table, [row])[0]
+    # project_id is a partition column, stored in the file path only
+    assert "project_id" not in archived
+    assert archived["status"] == "failed"
+    assert archived["input"] == '{"question":"why?","$blob":null}'
+
+    archived["project_id"] = str(row["project_id"])
+    assert from_archive_rows(table, [archived])[0] == row
@@ -0,0 +1,47 @@
+import random
+
+from ..utils.sketch import RELATIVE_ACCURACY, DDSketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(5, 1.2) for _ in range(20000)]
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        expected = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - expected) <= expected * RELATIVE_ACCURACY
+
+
+def test_merge_matches_single_sketch():
+    rng = random.Random(11)
+    values = [rng.expovariate(1 / 300) for _ in range(5000)]
+    whole = DDSketch()
+    parts = [DDSketch() for _ in range(4)]
+    for i, value in enumerate(values):
+        whole.add(value)
+        parts[i % 4].add(value)
+
+    merged = DDSketch()
+    for part in parts:
+        # Round-trip through the JSONB representation
+        merged.merge(DDSketch(dict(part.bins), part.zero_count))
+
+    assert merged.count == whole.count
+    assert merged.quantiles((0.5, 0.99)) == whole.quantiles((0.5, 0.99))
+
+
+def test_zero_bucket_and_empty_sketch():
+    assert DDSketch().quantile(0.5) is None
+    sketch = DDSketch()
+    sketch.add(0.0, count=9)
+    sketch.add(100.0)
+    assert sketch.quantile(0.5) == 0.0
+    assert abs(sketch.quantile(1.0) - 100.0) <= 100.0 * RELATIVE_ACCURACY
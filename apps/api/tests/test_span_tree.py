@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from ..services.span_tree import build_span_tree
+
+FIELDS = ["id", "parent_span_id", "name", "input", "output", "total_tokens", "cost_usd"]
+T0 = datetime(2025, 6, 1, 12, 0, 0)
+
+
+def make_span(name, parent=None, start=0, end=1, tokens=None, cost=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        parent_span_id=parent.id if parent else None,
+        name=name,
+        input={"q": name},
+        output={"a": name},
+        total_tokens=tokens,
+        cost_usd=cost,
+        start_time=T0 + timedelta(milliseconds=start),
+        end_time=T0 + timedelta(milliseconds=end),
+    )
+
+
+def test_nests_children_and_rolls_up_subtrees():
+    root = make_span("agent", start=0, end=100)
+    retrieval = make_span("retrieval", root, start=10, end=30)
+    llm = make_span("llm", root, start=40, end=150, tokens=120, cost=0.01)
+    tool = make_span("tool", llm, start=50, end=60, tokens=30, cost=0.002)
+
+    (tree,) = build_span_tree([root, retrieval, llm, tool], FIELDS)
+
+    assert [c["name"] for c in tree["children"]] == ["retrieval", "llm"]
+    assert tree["subtree_span_count"] == 4
+    assert tree["subtree_tokens"] == 150
+    assert abs(tree["subtree_cost_usd"] - 0.012) < 1e-9
+    # The llm child outlives the root span, so the subtree extent is 0..150ms
+    assert tree["subtree_latency_ms"] == 150
+    assert tree["children"][1]["subtree_span_count"] == 2
+    assert "_subtree_start" not in tree
+
+
+def test_orphans_become_roots_and_io_can_be_excluded():
+    missing_parent = SimpleNamespace(id=uuid.uuid4())
+    orphan = make_span("orphan", missing_parent)
+    root = make_span("root")
+
+    roots = build_span_tree([orphan, root], FIELDS, include_io=False)
+
+    assert [r["name"] for r in roots] == ["orphan", "root"]
+    assert roots[0]["input"] is None and roots[0]["output"] is None
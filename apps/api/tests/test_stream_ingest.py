@@ -0,0 +1,112 @@
+import asyncio
+import uuid
+
+from ..services.rollup_service import RollupService
+from ..services.stream_ingest import StreamIngestor
+from ..services.tail_sampler import TailSamplingPolicy, trace_id_ratio
+
+PROJECT = uuid.uuid4()
+
+
+class FakeSession:
+    """
+    Records multi-row inserts by table; RETURNING reports every row as
+    inserted except those with an id in `stored`.
+    """
+
+    def __init__(self, stored=()):
+        self.rows = {}
+        self.stored = set(stored)
+
+    async def execute(self, statement, params=None):
+        table = getattr(statement, "table", None)
+        if isinstance(params, list) and table is not None:
+            params = [row for row in params if row["id"] not in self.stored]
+            self.rows.setdefault(table.name, []).extend(params)
+        return FakeResult([row["id"] for row in params] if isinstance(params, list) else [])
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return iter(self.ids)
+
+
+def run_stream(ingestor, records):
+    async def run():
+        for record in records:
+            await ingestor._handle(record)
+        ingestor._close_trace()
+    asyncio.run(run())
+
+
+def trace_records(status="ok", spans=3):
+    while True:
+        trace_id = uuid.uuid4()
+        if trace_id_ratio(trace_id) >= 0.5:
+            break
+    records = [{"id": str(trace_id), "name": "agent", "start_time": "2025-07-01T12:00:00", "end_time": "2025-07-01T12:00:01"}]
+    for i in range(spans):
+        records.append({
+            "type": "span", "name": f"step-{i}", "span_type": "llm", "model": "gpt-4o", "total_tokens": 10,
+            "start_time": "2025-07-01T12:00:00", "end_time": "2025-07-01T12:00:00.5",
+            "status": status if i == spans - 1 else "ok",
+        })
+    return records
+
+
+def record_rollups(monkeypatch):
+    upserted = []
+
+    async def upsert(db, rows):
+        upserted.extend(rows)
+
+    monkeypatch.setattr(RollupService, "upsert", upsert)
+    return upserted
+
+
+def test_failed_streamed_trace_survives_sampling(monkeypatch):
+    upserted = record_rollups(monkeypatch)
+    ingestor = StreamIngestor(FakeSession(), PROJECT, chunk_rows=100, sampling=TailSamplingPolicy(rate=0.1))
+    run_stream(ingestor, trace_records() + trace_records(status="error"))
+    # The first trace is sampled out; the failed one is kept at its head rate
+    (failed,) = ingestor._trace_rows
+    assert failed["sample_rate"] == 1.0
+    assert {row["trace_id"] for row in ingestor._span_rows} == {failed["id"]}
+    asyncio.run(ingestor._flush())
+    (rollup,) = [row for row in upserted if row["granularity"] == "day" and row["model"]]
+    assert rollup["span_count"] == 3 and rollup["est_span_count"] == 3.0
+
+
+def test_trace_already_stored_is_not_rolled_up(monkeypatch):
+    upserted = record_rollups(monkeypatch)
+    old, new = trace_records(), trace_records()
+    # Stored by an earlier request but no longer in the seen-trace cache
+    db = FakeSession(stored=[uuid.UUID(old[0]["id"])])
+    ingestor = StreamIngestor(db, PROJECT, chunk_rows=100)
+    run_stream(ingestor, old + new)
+    asyncio.run(ingestor._flush())
+
+    assert [row["id"] for row in db.rows["traces"]] == [uuid.UUID(new[0]["id"])]
+    assert {row["trace_id"] for row in db.rows["spans"]} == {uuid.UUID(new[0]["id"])}
+    (trace_rollup,) = [row for row in upserted if row["granularity"] == "day" and not row["model"]]
+    (span_rollup,) = [row for row in upserted if row["granularity"] == "day" and row["model"]]
+    assert trace_rollup["trace_count"] == 1 and span_rollup["span_count"] == 3
+    assert (ingestor.accepted_traces, ingestor.accepted_spans, ingestor.duplicates) == (1, 3, 1)
+
+
+def test_oversized_trace_is_kept_instead_of_held():
+    db = FakeSession()
+    ingestor = StreamIngestor(db, PROJECT, chunk_rows=2, sampling=TailSamplingPolicy(rate=0.1))
+    run_stream(ingestor, trace_records(spans=5))
+    asyncio.run(ingestor._flush())
+    assert len(db.rows["traces"]) == 1 and len(db.rows["spans"]) == 5
+    assert ingestor._held == []
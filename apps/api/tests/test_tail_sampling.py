@@ -0,0 +1,27 @@
+import uuid
+
+from ..models import models
+from ..services.tail_sampler import TailSamplingPolicy, apply_tail_sampling, trace_id_ratio
+
+
+def trace_with_ratio(low: float, high: float, **fields):
+    while True:
+        trace_id = uuid.uuid4()
+        if low <= trace_id_ratio(trace_id) < high:
+            return {"id": trace_id, "sample_rate": 1.0, **fields}
+
+
+def test_kept_traces_store_their_effective_rate():
+    policy = TailSamplingPolicy(rate=0.1, slow_ms=1000)
+    kept = trace_with_ratio(0.0, 0.05)
+    dropped = trace_with_ratio(0.5, 1.0)
+    failed = trace_with_ratio(0.5, 1.0, status=models.TraceStatus.FAILED)
+    slow = trace_with_ratio(0.5, 1.0, latency_ms=2000.0)
+    head_sampled = trace_with_ratio(0.0, 0.05, sample_rate=0.5)
+    rare = trace_with_ratio(0.0, 0.01, sample_rate=0.05)
+    spans = [{"trace_id": dropped["id"]}, {"trace_id": kept["id"]}]
+
+    traces, kept_spans = apply_tail_sampling(policy, [kept, dropped, failed, slow, head_sampled, rare], spans)
+    assert traces == [kept, failed, slow, head_sampled, rare]
+    assert kept_spans == [{"trace_id": kept["id"]}]
+    assert [trace["sample_rate"] for trace in traces] == [0.1, 1.0, 1.0, 0.1, 0.05]
@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+
+from ..services import trace_processor
+from ..services.rollup_service import RollupService
+from ..services.trace_processor import prepare_trace_batch, process_trace_batch, write_trace_rows
+
+PROJECT = uuid.uuid4()
+
+
+class FakeSession:
+    """
+    Logs inserts (by table), commits and rollbacks; RETURNING reports every
+    row as inserted except those with an id in `stored`.
+    """
+
+    def __init__(self, stored=()):
+        self.log = []
+        self.rows = {}
+        self.stored = set(stored)
+
+    async def execute(self, statement, params=None):
+        table = getattr(statement, "table", None)
+        if isinstance(params, list) and table is not None:
+            params = [row for row in params if row["id"] not in self.stored]
+            self.rows.setdefault(table.name, []).extend(params)
+            self.log.append(table.name)
+        return FakeResult([row["id"] for row in params] if isinstance(params, list) else [])
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def rollback(self):
+        self.log.append("rollback")
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return iter(self.ids)
+
+
+def payload(**fields):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": "agent",
+        "start_time": "2025-07-01T12:00:00",
+        "end_time": "2025-07-01T12:00:01",
+        "spans": [{
+            "name": "call", "span_type": "llm", "model": "gpt-4o", "total_tokens": 10,
+            "start_time": "2025-07-01T12:00:00", "end_time": "2025-07-01T12:00:00.5",
+        }],
+        **fields,
+    }
+
+
+def record_rollups(monkeypatch, db, fail=False):
+    upserted = []
+
+    async def upsert(session, rows):
+        db.log.append("rollups")
+        if fail:
+            raise RuntimeError("deadlock detected")
+        upserted.extend(rows)
+
+    monkeypatch.setattr(RollupService, "upsert", upsert)
+    return upserted
+
+
+def test_rollups_are_applied_after_the_rows_commit(monkeypatch):
+    db = FakeSession()
+    upserted = record_rollups(monkeypatch, db)
+    _, trace_rows, span_rows = prepare_trace_batch([payload(), payload()], PROJECT)
+    asyncio.run(write_trace_rows(db, trace_rows, span_rows))
+
+    # The hot per-project rollup rows are locked only in their own short transaction
+    assert db.log == ["traces", "spans", "commit", "rollups", "commit"]
+    (day,) = [row for row in upserted if row["granularity"] == "day" and not row["model"]]
+    assert day["trace_count"] == 2
+
+
+def test_failed_rollup_upsert_keeps_the_stored_rows(monkeypatch):
+    db = FakeSession()
+    record_rollups(monkeypatch, db, fail=True)
+    _, trace_rows, span_rows = prepare_trace_batch([payload()], PROJECT)
+    assert asyncio.run(write_trace_rows(db, trace_rows, span_rows)) == set()
+    assert db.log == ["traces", "spans", "commit", "rollups", "rollback"]
+    assert len(db.rows["traces"]) == 1 and len(db.rows["spans"]) == 1
+
+
+def test_batch_reports_accepted_rejected_and_duplicate_traces(monkeypatch):
+    async def refresh():
+        pass
+
+    monkeypatch.setattr(trace_processor.pricing_catalog, "refresh", refresh)
+    stored_before = payload()
+    repeated = payload()
+    batch = [
+        payload(),
+        payload(sample_rate=0),  # invalid
+        repeated,
+        dict(repeated),  # same id twice in one batch
+        stored_before,  # written by an earlier attempt of this request
+        payload(),
+    ]
+    db = FakeSession(stored=[uuid.UUID(stored_before["id"])])
+    record_rollups(monkeypatch, db)
+    result = asyncio.run(process_trace_batch(db, batch, PROJECT))
+
+    assert (result.accepted, result.rejected, result.duplicates) == (3, 2, 1)
+    assert [r.status for r in result.results] == [
+        "accepted", "rejected", "accepted", "rejected", "duplicate", "accepted",
+    ]
+    # One multi-row INSERT per table for the whole batch
+    assert db.log[:3] == ["traces", "spans", "commit"]
+    assert len(db.rows["traces"]) == 3 and len(db.rows["spans"]) == 3
+
+    # A retry of the same batch is recognized from the seen-set, before any insert
+    retry = FakeSession()
+    record_rollups(monkeypatch, retry)
+    again = asyncio.run(process_trace_batch(retry, [repeated], PROJECT))
+    assert (again.accepted, again.duplicates) == (0, 1)
+    assert retry.log == []
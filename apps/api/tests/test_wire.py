@@ -0,0 +1,147 @@
+import asyncio
+import gzip
+import json
+
+import msgpack
+import pytest
+import zstandard
+from fastapi import HTTPException
+
+from ..utils.wire import DECOMPRESS_STEP, InvalidRecord, _decompressor, iter_records, read_document, read_trace_batch
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, headers: dict, chunk: int = 1024):
+        self.headers = {k.lower(): v for k, v in headers.items()}
+        self._body = body
+        self._chunk = chunk
+
+    async def stream(self):
+        for i in range(0, len(self._body), self._chunk):
+            yield self._body[i:i + self._chunk]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+TRACES = [{"name": f"t{i}", "start_time": "2025-06-01T12:00:00", "input": {"q": "x" * 500}} for i in range(5)]
+
+
+def test_gzip_json_envelope():
+    body = gzip.compress(json.dumps({"traces": TRACES}).encode())
+    request = FakeRequest(body, {"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert run(read_trace_batch(request, 1 << 20, 100)) == TRACES
+
+
+def test_msgpack_stream_of_traces():
+    body = b"".join(msgpack.packb(t) for t in TRACES)
+    request = FakeRequest(body, {"Content-Type": "application/msgpack"}, chunk=7)
+    assert run(read_trace_batch(request, 1 << 20, 100)) == TRACES
+
+
+def test_single_document_msgpack():
+    request = FakeRequest(msgpack.packb(TRACES[0]), {"Content-Type": "application/msgpack"})
+    assert run(read_document(request, 1 << 20)) == TRACES[0]
+
+
+def test_decompressed_size_limit():
+    body = gzip.compress(b"[" + b"0," * 500_000 + b"0]")
+    request = FakeRequest(body, {"Content-Encoding": "gzip"})
+    with pytest.raises(HTTPException) as exc:
+        run(read_document(request, 64 * 1024))
+    assert exc.value.status_code == 413
+
+
+def test_zstd_output_is_bounded_per_step():
+    bomb = zstandard.ZstdCompressor().compress(b"\0" * (64 << 20))
+    decompressor = _decompressor("zstd")
+    steps = decompressor.decompress(bomb[:64 * 1024])
+    assert len(next(iter(steps))) <= DECOMPRESS_STEP
+
+
+def test_zstd_json_across_chunks():
+    body = zstandard.ZstdCompressor().compress(json.dumps({"traces": TRACES}).encode())
+    request = FakeRequest(body, {"Content-Type": "application/json", "Content-Encoding": "zstd"}, chunk=11)
+    assert run(read_trace_batch(request, 1 << 20, 100)) == TRACES
+
+    body = zstandard.ZstdCompressor().compress(b"[" + b"0," * 500_000 + b"0]")
+    request = FakeRequest(body, {"Content-Encoding": "zstd"})
+    with pytest.raises(HTTPException) as exc:
+        run(read_document(request, 64 * 1024))
+    assert exc.value.status_code == 413
+
+
+def test_batch_limit_stops_early():
+    body = b"".join(msgpack.packb(t) for t in TRACES)
+    request = FakeRequest(body, {"Content-Type": "application/msgpack"})
+    with pytest.raises(HTTPException) as exc:
+        run(read_trace_batch(request, 1 << 20, 3))
+    assert exc.value.status_code == 413
+
+
+def test_truncated_msgpack_rejected():
+    body = msgpack.packb(TRACES[0])[:-3]
+    request = FakeRequest(body, {"Content-Type": "application/msgpack"})
+    with pytest.raises(HTTPException) as exc:
+        run(read_document(request, 1 << 20))
+    assert exc.value.status_code == 400
+
+
+def test_unsupported_encoding():
+    request = FakeRequest(b"{}", {"Content-Encoding": "br"})
+    with pytest.raises(HTTPException) as exc:
+        run(read_document(request, 1 << 20))
+    assert exc.value.status_code == 415
+
+
+async def collect(records):
+    return [r async for r in records]
+
+
+def test_ndjson_records_across_chunks():
+    body = b"\n".join(json.dumps(t).encode() for t in TRACES) + b"\n\n"
+    request = FakeRequest(gzip.compress(body), {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}, chunk=13)
+    assert run(collect(iter_records(request, 1 << 20))) == TRACES
+
+
+def test_ndjson_invalid_line_is_reported_in_place():
+    body = b'{"name": "a"}\n{not json\n{"name": "b"}'
+    request = FakeRequest(body, {"Content-Type": "application/x-ndjson"}, chunk=5)
+    records = run(collect(iter_records(request, 1 << 20)))
+    assert records[0] == {"name": "a"} and records[2] == {"name": "b"}
+    assert isinstance(records[1], InvalidRecord)
+
+
+def test_ndjson_record_size_limit():
+    body = json.dumps({"input": "x" * 10_000}).encode() + b"\n"
+    request = FakeRequest(body, {"Content-Type": "application/x-ndjson"}, chunk=256)
+    with pytest.raises(HTTPException) as exc:
+        run(collect(iter_records(request, 1024)))
+    assert exc.value.status_code == 413
+
+
+def test_sdk_wire_formats_round_trip():
+    # The SDK is a sibling package; installed alongside the API in development
+    client_module = pytest.importorskip("jordy_observe.client")
+    wire_module = pytest.importorskip("jordy_observe.wire")
+    client = client_module.JordyClient("key", background=False)
+    traces = []
+    for i in range(3):
+        trace = client.trace(f"job-{i}")
+        trace.set_input({"q": "x" * 2000})
+        with trace.span("call", span_type="llm") as span:
+            span.set_llm_metadata("gpt-4o", 10, 20)
+        trace.end_ns = trace.start_ns + 1000
+        traces.append(trace)
+    expected = [json.loads(json.dumps(trace.to_dict())) for trace in traces]
+
+    for encoding in ("json", "msgpack"):
+        for compression in (None, "gzip", "zstd"):
+            wire = wire_module.WireFormat(encoding=encoding, compression=compression)
+            body = wire.compress(wire.batch([wire.encode_trace(trace) for trace in traces]))
+            request = FakeRequest(body, wire.headers, chunk=333)
+            assert run(read_trace_batch(request, 1 << 20, 100)) == expected, (encoding, compression)
+
+            single = FakeRequest(wire.compress(wire.encode_trace(traces[0])), wire.headers, chunk=333)
+            assert run(read_document(single, 1 << 20)) == expected[0], (encoding, compression)
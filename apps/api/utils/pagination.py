@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value: datetime, row_id: UUID) -> str:
+    """
+    Opaque cursor for the last row of a page, keyed on (timestamp, id).
+    """
+    raw = json.dumps([sort_value.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_condition(sort_column: Any, id_column: Any, cursor: str, descending: bool = True):
+    """
+    WHERE clause selecting rows strictly after the cursor in (sort, id) order.
+
+    The leading `sort <= value` bound is kept separate from the tie-break so
+    Postgres can use a plain index on the timestamp column for the range scan.
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    if descending:
+        return and_(
+            sort_column <= sort_value,
+            or_(sort_column < sort_value, id_column < row_id),
+        )
+    return and_(
+        sort_column >= sort_value,
+        or_(sort_column > sort_value, id_column > row_id),
+    )
+
+
+def build_page(rows: List[Any], limit: int, sort_attr: str) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim a `limit + 1` result to one page and derive the next cursor.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_attr), last.id)
@@ -0,0 +1,63 @@
+import math
+from typing import Dict, Iterable, Optional
+
+# Every stored sketch uses the same accuracy so any two of them can be merged
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Values at or below this (in ms) land in the zero bucket
+MIN_VALUE = 1e-3
+
+
+def bin_index(value: float) -> int:
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Values are counted in logarithmic bins, so any quantile is returned
+    within RELATIVE_ACCURACY of the true value and two sketches merge by
+    adding bin counts. Bins are keyed by string index so they round-trip
+    through JSONB unchanged.
+    """
+
+    def __init__(self, bins: Optional[Dict[str, int]] = None, zero_count: int = 0):
+        self.bins: Dict[str, int] = dict(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= MIN_VALUE:
+            self.zero_count += count
+            return
+        key = str(bin_index(value))
+        self.bins[key] = self.bins.get(key, 0) + count
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(int(k) for k in self.bins):
+            seen += self.bins[str(index)]
+            if seen > rank:
+                # Midpoint of the bin in relative terms
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** max(int(k) for k in self.bins) / (GAMMA + 1)
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[float, Optional[float]]:
+        return {q: self.quantile(q) for q in qs}
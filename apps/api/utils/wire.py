@@ -0,0 +1,280 @@
+import json
+import zlib
+from typing import Any, AsyncIterator, Iterable, List, Optional
+
+import msgpack
+from fastapi import HTTPException, Request
+
+try:
+    import zstandard
+except ImportError:  # zstd request bodies are optional
+    zstandard = None
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Upper bound on decompressed output produced per step, so a tiny compressed
+# chunk can't balloon in memory before the size limit is checked
+DECOMPRESS_STEP = 256 * 1024
+
+
+class _Identity:
+    def decompress(self, data: bytes) -> Iterable[bytes]:
+        return (data,)
+
+    def flush(self) -> Iterable[bytes]:
+        return ()
+
+
+class _Zlib:
+    def __init__(self, wbits: int):
+        self._d = zlib.decompressobj(wbits)
+
+    def decompress(self, data: bytes) -> Iterable[bytes]:
+        chunk = self._d.decompress(data, DECOMPRESS_STEP)
+        yield chunk
+        while self._d.unconsumed_tail:
+            yield self._d.decompress(self._d.unconsumed_tail, DECOMPRESS_STEP)
+
+    def flush(self) -> Iterable[bytes]:
+        return (self._d.flush(),)
+
+
+DECOMPRESS_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class _NeedInput(Exception):
+    pass
+
+
+class _PushSource:
+    """
+    File-like source for zstd's pull-based stream_reader, filled as request
+    chunks arrive. Running dry raises _NeedInput instead of returning b"",
+    which the reader would take for the end of the stream.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.finished = False
+
+    def read(self, size: int) -> bytes:
+        if not self.buffer:
+            if self.finished:
+                return b""
+            raise _NeedInput()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class _Zstd:
+    def __init__(self):
+        if zstandard is None:
+            raise HTTPException(status_code=415, detail="zstd request bodies are not supported by this server")
+        self._source = _PushSource()
+        # Caps the decoder's window memory regardless of what the frame header asks for.
+        # stream_reader (unlike decompressobj) bounds the output of each step.
+        self._reader = zstandard.ZstdDecompressor(max_window_size=1 << 23).stream_reader(
+            self._source, read_size=DECOMPRESS_STEP, read_across_frames=True
+        )
+
+    def _drain(self) -> Iterable[bytes]:
+        while True:
+            try:
+                # read1 only pulls more input once it has no output to return,
+                # so _NeedInput never discards decompressed data
+                data = self._reader.read1(DECOMPRESS_STEP)
+            except _NeedInput:
+                return
+            if not data:
+                return
+            yield data
+
+    def decompress(self, data: bytes) -> Iterable[bytes]:
+        self._source.buffer += data
+        return self._drain()
+
+    def flush(self) -> Iterable[bytes]:
+        self._source.finished = True
+        return self._drain()
+
+
+def _decompressor(content_encoding: str):
+    encoding = content_encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return _Identity()
+    if encoding in ("gzip", "x-gzip"):
+        return _Zlib(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _Zlib(zlib.MAX_WBITS)
+    if encoding == "zstd":
+        return _Zstd()
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def _media_type(request: Request, allowed) -> str:
+    content_type = request.headers.get("content-type") or "application/json"
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type not in allowed:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {content_type}")
+    return media_type
+
+
+async def iter_body(request: Request, max_bytes: Optional[int]) -> AsyncIterator[bytes]:
+    """
+    Stream the request body, decompressed per Content-Encoding, enforcing a
+    limit on the decompressed size (413) so compressed bombs are rejected early.
+    `max_bytes=None` is for callers that bound memory per record instead.
+    """
+    decompressor = _decompressor(request.headers.get("content-encoding", ""))
+    total = 0
+    try:
+        async for chunk in request.stream():
+            for data in decompressor.decompress(chunk):
+                total += len(data)
+                if max_bytes is not None and total > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Decoded body exceeds {max_bytes} bytes")
+                if data:
+                    yield data
+        for data in decompressor.flush():
+            total += len(data)
+            if max_bytes is not None and total > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Decoded body exceeds {max_bytes} bytes")
+            if data:
+                yield data
+    except DECOMPRESS_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Could not decompress request body: {e}")
+
+
+async def _iter_msgpack(request: Request, max_bytes: Optional[int], max_buffer: int) -> AsyncIterator[Any]:
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=max_buffer)
+    fed = 0
+    try:
+        async for data in iter_body(request, max_bytes):
+            unpacker.feed(data)
+            fed += len(data)
+            for document in unpacker:
+                yield document
+    except msgpack.BufferFull:
+        raise HTTPException(status_code=413, detail=f"msgpack record exceeds {max_buffer} bytes")
+    except (msgpack.FormatError, msgpack.StackError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {e}")
+    if fed == 0 or unpacker.tell() != fed:
+        raise HTTPException(status_code=400, detail="Empty or truncated msgpack body")
+
+
+async def iter_documents(request: Request, max_bytes: int) -> AsyncIterator[Any]:
+    """
+    Yield the decoded top-level documents of a request body.
+
+    msgpack bodies may hold several concatenated objects; each is yielded as
+    soon as its last byte arrives, so the decoded body is never buffered
+    whole. A JSON body is a single document and is parsed once complete.
+    """
+    media_type = _media_type(request, JSON_TYPES + MSGPACK_TYPES)
+    if media_type in MSGPACK_TYPES:
+        async for document in _iter_msgpack(request, max_bytes, max_bytes):
+            yield document
+        return
+
+    chunks: List[bytes] = []
+    async for data in iter_body(request, max_bytes):
+        chunks.append(data)
+    try:
+        yield json.loads(b"".join(chunks))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
+
+async def read_document(request: Request, max_bytes: int) -> Any:
+    """
+    Decode a body holding exactly one document.
+    """
+    document: Optional[Any] = None
+    count = 0
+    async for document in iter_documents(request, max_bytes):
+        count += 1
+    if count != 1:
+        raise HTTPException(status_code=400, detail="Expected a single document in request body")
+    return document
+
+
+async def read_trace_batch(request: Request, max_bytes: int, max_traces: int) -> List[Any]:
+    """
+    Decode a batch body into raw trace dicts.
+
+    Accepts either one `{"traces": [...]}` envelope (JSON or msgpack) or, for
+    msgpack, a stream of concatenated trace maps. Stops with 413 as soon as
+    the batch grows past `max_traces`.
+    """
+    traces: List[Any] = []
+    async for document in iter_documents(request, max_bytes):
+        if isinstance(document, dict) and isinstance(document.get("traces"), list):
+            traces.extend(document["traces"])
+        else:
+            traces.append(document)
+        if len(traces) > max_traces:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_traces} traces")
+    return traces
+
+
+class InvalidRecord:
+    """
+    Yielded for an NDJSON line that is not valid JSON, so the caller can
+    reject that record and keep reading.
+    """
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _parse_json_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidRecord(str(e))
+
+
+async def _iter_ndjson(request: Request, max_record_bytes: int) -> AsyncIterator[Any]:
+    pending: List[bytes] = []
+    pending_size = 0
+    async for data in iter_body(request, None):
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            pending.append(data[start:end])
+            line = b"".join(pending)
+            pending, pending_size = [], 0
+            start = end + 1
+            if len(line) > max_record_bytes:
+                raise HTTPException(status_code=413, detail=f"NDJSON record exceeds {max_record_bytes} bytes")
+            if line.strip():
+                yield _parse_json_line(line)
+        if start < len(data):
+            pending.append(data[start:])
+            pending_size += len(data) - start
+            if pending_size > max_record_bytes:
+                raise HTTPException(status_code=413, detail=f"NDJSON record exceeds {max_record_bytes} bytes")
+    line = b"".join(pending)
+    if line.strip():
+        yield _parse_json_line(line)
+
+
+async def iter_records(request: Request, max_record_bytes: int) -> AsyncIterator[Any]:
+    """
+    Yield records from an unbounded NDJSON or msgpack stream body.
+
+    Only the record being parsed is held in memory, so the total body size is
+    not limited; `max_record_bytes` caps any single record (413).
+    """
+    media_type = _media_type(request, NDJSON_TYPES + MSGPACK_TYPES)
+    if media_type in NDJSON_TYPES:
+        async for record in _iter_ndjson(request, max_record_bytes):
+            yield record
+        return
+    async for record in _iter_msgpack(request, None, max_record_bytes):
+        yield record
@@ -0,0 +1,67 @@
+"""
+Overhead of @observe and the LLM client patches.
+
+    python benchmarks/bench_observe.py [--calls 1000000]
+
+Reports nanoseconds per call for a plain function, the same function under
+@observe with no active trace (the disabled path: no trace and no default
+client), and under @observe inside a trace (span recorded, args captured).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jordy_observe import JordyClient, observe  # noqa: E402
+from jordy_observe.integrations._patch import patch_method, unpatch_all  # noqa: E402
+
+
+def plain(x):
+    return x
+
+
+observed = observe(plain)
+
+
+class FakeLLM:
+    def create(self, **kwargs):
+        return None
+
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter_ns()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter_ns() - start) / calls
+
+
+def bench(calls):
+    baseline = per_call_ns(plain, calls)
+    disabled = per_call_ns(observed, calls)
+
+    llm = FakeLLM()
+    unpatched = per_call_ns(lambda i: llm.create(model="m"), calls)
+    patch_method(FakeLLM, "create", "fake", lambda response: {}, is_async=False)
+    patched = per_call_ns(lambda i: llm.create(model="m"), calls)
+    unpatch_all()
+
+    client = JordyClient(api_key="bench", background=False)
+    enabled_calls = min(calls, 100_000)
+    with client.start_trace("bench") as trace:
+        client.ingest_trace = lambda t: None
+        enabled = per_call_ns(observed, enabled_calls)
+        trace.spans.clear()
+
+    print(f"plain call:                 {baseline:8.1f} ns")
+    print(f"@observe, no trace:         {disabled:8.1f} ns  (+{disabled - baseline:.1f} ns)")
+    print(f"patched LLM call, no trace: {patched:8.1f} ns  (+{patched - unpatched:.1f} ns)")
+    print(f"@observe inside a trace:    {enabled:8.1f} ns  (+{enabled - baseline:.1f} ns)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+    bench(args.calls)
@@ -0,0 +1,68 @@
+"""
+Per-span overhead of the SDK hot path.
+
+    python benchmarks/bench_spans.py [--spans 200] [--traces 200]
+
+Reports the time and allocated bytes per span spent on the request thread
+(opening/closing spans and setting fields) and, separately, the per-span
+cost of serializing the finished trace, which runs on the exporter thread.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jordy_observe import JordyClient  # noqa: E402
+from jordy_observe.wire import WireFormat  # noqa: E402
+
+
+def build_trace(client, spans):
+    trace = client.trace("bench")
+    with trace.span("agent", span_type="agent") as root:
+        root.set_attribute("step", 0)
+        for i in range(spans - 1):
+            with trace.span("tool_call", span_type="tool") as span:
+                span.log_input({"i": i})
+                span.set_llm_metadata("gpt-4o-mini", 12, 30)
+    return trace
+
+
+def bench(traces, spans):
+    client = JordyClient(api_key="bench", background=False)
+    build_trace(client, spans)  # warm up
+
+    start = time.perf_counter()
+    built = [build_trace(client, spans) for _ in range(traces)]
+    record_s = time.perf_counter() - start
+
+    wire = WireFormat(compression=None)
+    start = time.perf_counter()
+    for trace in built:
+        wire.encode_trace(trace)
+    encode_s = time.perf_counter() - start
+
+    del built
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build_trace(client, spans) for _ in range(20)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    alloc = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+
+    total = traces * spans
+    print(f"spans recorded:        {total}")
+    print(f"record   per span:     {record_s / total * 1e6:8.2f} us")
+    print(f"retained per span:     {alloc / (20 * spans):8.0f} bytes")
+    print(f"encode   per span:     {encode_s / total * 1e6:8.2f} us (exporter thread)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200)
+    parser.add_argument("--traces", type=int, default=200)
+    args = parser.parse_args()
+    bench(args.traces, args.spans)
@@ -0,0 +1,101 @@
+"""
+Bytes on the wire and server decode CPU per upload format.
+
+    python benchmarks/bench_wire.py [--traces 100] [--spans 20]
+
+Builds batches of traces with LLM-sized prompts and completions, encodes
+them the way the exporter does, and decodes them with the API's streaming
+decoder (apps/api/utils/wire.py) in 64 KiB chunks, as uvicorn delivers them.
+Needs msgpack and zstandard installed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "..", "apps"))
+
+from jordy_observe import JordyClient, WireFormat  # noqa: E402
+from api.utils.wire import read_trace_batch  # noqa: E402
+
+WORDS = (
+    "the model should answer using only the retrieved context and cite each source "
+    "customer account invoice refund policy shipping delay order status escalate "
+    "summarize the conversation tool call returned json with fields id name price"
+).split()
+
+FORMATS = [
+    ("json", None),
+    ("json", "gzip"),
+    ("json", "zstd"),
+    ("msgpack", None),
+    ("msgpack", "gzip"),
+    ("msgpack", "zstd"),
+]
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_traces(count, spans):
+    rng = random.Random(42)
+    client = JordyClient(api_key="bench", background=False)
+    traces = []
+    for _ in range(count):
+        trace = client.trace("rag-agent")
+        trace.set_input({"question": text(rng, 40)})
+        for i in range(spans):
+            with trace.span(f"llm-{i}", span_type="llm") as span:
+                span.log_input({"prompt": text(rng, 600)})
+                span.log_output({"completion": text(rng, 150)})
+                span.set_llm_metadata("gpt-4o", 800, 200)
+        traces.append(trace)
+    return traces
+
+
+class FakeRequest:
+    def __init__(self, body, headers, chunk=64 * 1024):
+        self.headers = {k.lower(): v for k, v in headers.items()}
+        self._body = body
+        self._chunk = chunk
+
+    async def stream(self):
+        for i in range(0, len(self._body), self._chunk):
+            yield self._body[i:i + self._chunk]
+
+
+def bench(count, spans, rounds=5):
+    traces = build_traces(count, spans)
+    print(f"{count} traces x {spans} spans per batch\n")
+    print(f"{'format':<16}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+    baseline = None
+    for encoding, compression in FORMATS:
+        wire = WireFormat(encoding, compression)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            payload = wire.compress(wire.batch([wire.encode_trace(t) for t in traces]))
+        encode_ms = (time.perf_counter() - start) / rounds * 1000
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            decoded = asyncio.run(read_trace_batch(FakeRequest(payload, wire.headers), 1 << 30, 10 ** 6))
+        decode_ms = (time.perf_counter() - start) / rounds * 1000
+        assert len(decoded) == count
+
+        baseline = baseline or len(payload)
+        name = f"{encoding}+{compression or 'none'}"
+        print(f"{name:<16}{len(payload):>12}{baseline / len(payload):>7.1f}x{encode_ms:>12.1f}{decode_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--traces", type=int, default=100)
+    parser.add_argument("--spans", type=int, default=20)
+    args = parser.parse_args()
+    bench(args.traces, args.spans)
@@ -1,3 +1,16 @@
 from .client import JordyClient, Trace, Span
+from .exporter import BatchExporter
+from .payload import PayloadLimiter
+from .retry import CircuitBreaker
+from .spool import DiskSpool
+from .sampling import Sampler
+from .wire import WireFormat
+from .async_client import AsyncJordyClient, AsyncTrace
+from .observe import observe, set_default_client
+from .context import ContextExecutor, get_current_span, get_current_trace, inject, submit, wrap
 
-__all__ = ["JordyClient", "Trace", "Span"]
+__all__ = [
+    "JordyClient", "AsyncJordyClient", "Trace", "AsyncTrace", "Span", "BatchExporter", "Sampler", "WireFormat",
+    "CircuitBreaker", "DiskSpool", "PayloadLimiter", "observe", "set_default_client",
+    "ContextExecutor", "get_current_span", "get_current_trace", "inject", "submit", "wrap",
+]
@@ -0,0 +1,311 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import context
+from .client import Trace
+from .exporter import BlobUpload, TraceChunk
+from .payload import PayloadLimiter
+from .sampling import Sampler
+from .wire import WireFormat
+
+
+class AsyncTrace(Trace):
+    """
+    Trace used by AsyncJordyClient; its spans are opened with `async with`.
+    """
+
+
+class AsyncJordyClient:
+    """
+    asyncio-native client. Finished traces go on an in-memory queue and a
+    flusher task posts them in batches over one shared keep-alive HTTP/2
+    connection pool, so instrumented code never awaits the network.
+
+    The client belongs to the event loop it is created (or first used) on.
+    Traces and spans ended in other threads are handed to that loop with
+    `call_soon_threadsafe`, since asyncio.Queue is not thread-safe.
+
+    Needs the `async` extra: pip install jordy-observe[async]
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "http://localhost:8000",
+        max_queue_size: int = 2048,
+        max_batch_size: int = 100,
+        max_batch_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        timeout: float = 5.0,
+        http2: bool = True,
+        max_connections: int = 10,
+        sampler: Optional[Sampler] = None,
+        wire: Optional[WireFormat] = None,
+        span_window: Optional[int] = None,
+        payload_limits: Optional[PayloadLimiter] = None,
+    ):
+        if span_window is not None and span_window < 1:
+            raise ValueError("span_window must be at least 1")
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("AsyncJordyClient requires httpx: pip install jordy-observe[async]") from e
+
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.sampler = sampler
+        # Upload finished spans of a still-open trace every `span_window` spans
+        self.span_window = span_window
+        self.payload_limits = payload_limits
+        if payload_limits is not None:
+            payload_limits.uploader = self._upload_blob
+        self.wire = wire or WireFormat()
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"X-API-KEY": self.api_key, "Content-Type": "application/json"},
+            timeout=timeout,
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self.sampled_out = 0
+
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue_size)
+        self._flush_requested = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+
+    async def __aenter__(self) -> "AsyncJordyClient":
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def trace(self, name: str, parent: Optional[Dict[str, str]] = None) -> AsyncTrace:
+        return AsyncTrace(self, name, parent=parent)
+
+    @asynccontextmanager
+    async def start_trace(self, name: str, parent: Optional[Dict[str, str]] = None):
+        t = AsyncTrace(self, name, parent=parent)
+        try:
+            with context.use_trace(t):
+                yield t
+        finally:
+            t.end()
+
+    def ingest_trace(self, trace: Trace) -> bool:
+        """
+        Queue a finished trace. Never awaits; returns False if dropped.
+        """
+        if self._closed:
+            self.dropped += 1
+            return False
+        if self.sampler is not None and not self.sampler.apply(trace):
+            self.sampled_out += 1
+            return False
+        return self._put(trace)
+
+    def ingest_chunk(self, chunk: TraceChunk) -> bool:
+        """
+        Queue spans of a still-running trace (see `span_window`).
+        """
+        if self._closed:
+            self.dropped += 1
+            return False
+        return self._put(chunk)
+
+    def _upload_blob(self, digest: str, data: bytes):
+        if self._closed or not self._put(BlobUpload(digest, data)):
+            # Never uploaded: the next payload with this content uploads it again
+            self.payload_limits.forget(digest)
+
+    def _put(self, item: Any) -> bool:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and (self._loop is None or running is self._loop):
+            self._loop = running
+            return self._put_on_loop(item)
+
+        # Called from another thread: enqueue on the client's loop instead
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self.dropped += 1
+            return False
+        try:
+            loop.call_soon_threadsafe(self._put_on_loop, item)
+        except RuntimeError:
+            # The loop closed in the meantime
+            self.dropped += 1
+            return False
+        return True
+
+    def _put_on_loop(self, item: Any) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if isinstance(item, BlobUpload):
+                self.payload_limits.forget(item.digest)
+            return False
+        if self._flusher is None or self._flusher.done():
+            self._flusher = self._loop.create_task(self._run())
+        return True
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every trace queued so far has been exported (or failed).
+        """
+        if self._flusher is None:
+            return True
+        self._flush_requested.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def aclose(self, timeout: Optional[float] = 10.0):
+        """
+        Flush pending traces, stop the flusher task and close the connection pool.
+        """
+        if self._closed:
+            return
+        await self.flush(timeout)
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.http.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+        }
+
+    async def _run(self):
+        while True:
+            traces = await self._collect()
+            if not traces:
+                continue
+            try:
+                await self._export(traces)
+            finally:
+                for _ in traces:
+                    self._queue.task_done()
+
+    async def _collect(self) -> List[Any]:
+        """
+        Gather one batch, bounded by count and age.
+        """
+        traces = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(traces) < self.max_batch_size:
+            remaining = 0 if self._flush_requested.is_set() else deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    traces.append(await asyncio.wait_for(self._queue.get(), remaining))
+                else:
+                    traces.append(self._queue.get_nowait())
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+        if self._queue.empty():
+            self._flush_requested.clear()
+        return traces
+
+    async def _export(self, items: List[Any]):
+        traces = [item for item in items if not isinstance(item, (TraceChunk, BlobUpload))]
+        # Blobs and chunks go first and in order: traces in this batch may reference the blobs
+        for item in items:
+            if isinstance(item, TraceChunk):
+                await self._export_chunk(item)
+            elif isinstance(item, BlobUpload):
+                await self._export_blob(item)
+        if not traces:
+            return
+        # Encoding and compression run in a worker thread so large batches don't stall the loop
+        payloads = await asyncio.to_thread(self._encode, traces)
+        for count, payload in payloads:
+            try:
+                response = await self.http.post(
+                    "/api/v1/traces/batch", content=payload, headers=self.wire.headers
+                )
+                response.raise_for_status()
+                result = response.json()
+                self.exported += result.get("accepted", count) + result.get("duplicates", 0)
+                self.failed += result.get("rejected", 0)
+            except Exception as e:
+                self.failed += count
+                print(f"Failed to ingest traces to Jordy Observe: {e}")
+
+    async def _export_chunk(self, chunk: TraceChunk):
+        try:
+            payload = await asyncio.to_thread(lambda: self.wire.compress(self.wire.encode_trace(chunk)))
+            response = await self.http.post(
+                f"/api/v1/traces/{chunk.trace_id}/spans", content=payload, headers=self.wire.headers
+            )
+            response.raise_for_status()
+            self.exported += chunk.final
+        except Exception as e:
+            self.failed += 1
+            print(f"Failed to upload spans to Jordy Observe: {e}")
+
+    async def _export_blob(self, blob: BlobUpload):
+        headers = dict(self.wire.headers)
+        headers["Content-Type"] = "text/plain; charset=utf-8"
+        try:
+            payload = await asyncio.to_thread(self.wire.compress, blob.data)
+            response = await self.http.put(f"/api/v1/blobs/{blob.digest}", content=payload, headers=headers)
+            response.raise_for_status()
+        except Exception as e:
+            self.failed += 1
+            self.payload_limits.forget(blob.digest)
+            print(f"Failed to upload payload blob to Jordy Observe: {e}")
+
+    def _encode(self, traces: List[Any]) -> List[Tuple[int, bytes]]:
+        bodies = []
+        for trace in traces:
+            try:
+                bodies.append(self.wire.encode_trace(trace))
+            except Exception as e:
+                self.failed += 1
+                print(f"Failed to serialize trace for Jordy Observe: {e}")
+        return [
+            (len(batch), self.wire.compress(self.wire.batch(batch)))
+            for batch in self._split(bodies)
+        ]
+
+    def _split(self, bodies: List[bytes]):
+        batch: List[bytes] = []
+        size = 0
+        for body in bodies:
+            if batch and size + len(body) > self.max_batch_bytes:
+                yield batch
+                batch, size = [], 0
+            batch.append(body)
+            size += len(body)
+        if batch:
+            yield batch
@@ -1,135 +1,437 @@
 import requests
+import threading
 import uuid
-import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from contextlib import contextmanager
 
+from . import context
+from .exporter import BatchExporter, BlobUpload, TraceChunk
+from .payload import PayloadLimiter
+from .retry import RETRYABLE_STATUSES, CircuitBreaker
+from .sampling import Sampler
+from .spool import DiskSpool
+from .wire import WireFormat
+from .utils import format_id, new_id, now_ns, ns_to_datetime, ns_to_iso
+
 class Span:
-    def __init__(self, name: str, span_type: str = "custom", parent: Optional["Span"] = None):
-        self.id = uuid.uuid4()
+    """
+    One unit of work inside a trace.
+
+    Kept deliberately small because agents open hundreds of these per
+    request: slots instead of a __dict__, integer ids and monotonic ns
+    timestamps, and no per-span dicts until something is stored in them.
+    Conversion to UUID strings and ISO timestamps happens in `to_dict`,
+    which the background exporter calls off the request thread.
+
+    Usable directly as a (sync or async) context manager; see `Trace.span`.
+    """
+
+    __slots__ = (
+        "span_id", "name", "span_type", "parent", "_trace", "start_ns", "end_ns",
+        "input", "output", "_attributes", "model", "prompt_tokens", "completion_tokens",
+        "status", "error_message", "_scope",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        span_type: str = "custom",
+        parent: Optional["Span"] = None,
+        trace: Optional["Trace"] = None,
+    ):
+        self.span_id = new_id()
         self.name = name
         self.span_type = span_type
         self.parent = parent
-        self.start_time = datetime.utcnow()
-        self.end_time: Optional[datetime] = None
+        self._trace = trace
+        self.start_ns = now_ns()
+        self.end_ns: Optional[int] = None
         self.input: Optional[Dict[str, Any]] = None
         self.output: Optional[Dict[str, Any]] = None
-        self.attributes: Dict[str, Any] = {}
+        self._attributes: Optional[Dict[str, Any]] = None
         self.model: Optional[str] = None
-        self.tokens: Dict[str, int] = {}
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.status = "ok"
+        self.error_message: Optional[str] = None
+        self._scope = None
+
+    @property
+    def id(self) -> uuid.UUID:
+        return uuid.UUID(int=self.span_id)
+
+    @property
+    def start_time(self) -> datetime:
+        return ns_to_datetime(self.start_ns)
+
+    @property
+    def end_time(self) -> Optional[datetime]:
+        return ns_to_datetime(self.end_ns) if self.end_ns is not None else None
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
+
+    @property
+    def tokens(self) -> Dict[str, int]:
+        # A streamed call records its model without usage
+        if self.model is None or self.prompt_tokens is None or self.completion_tokens is None:
+            return {}
+        return {
+            "prompt": self.prompt_tokens,
+            "completion": self.completion_tokens,
+            "total": self.prompt_tokens + self.completion_tokens,
+        }
 
     def log_input(self, input_data: Dict[str, Any]):
-        self.input = input_data
+        self.input = self._limit(input_data)
 
     def log_output(self, output_data: Dict[str, Any]):
-        self.output = output_data
+        self.output = self._limit(output_data)
+
+    def _limit(self, data: Any) -> Any:
+        trace = self._trace
+        if trace is None or trace.client.payload_limits is None:
+            return data
+        return trace.client.payload_limits.apply(data)
 
     def set_attribute(self, key: str, value: Any):
         self.attributes[key] = value
 
     def set_llm_metadata(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
         self.model = model
-        self.tokens = {
-            "prompt": prompt_tokens,
-            "completion": completion_tokens,
-            "total": prompt_tokens + completion_tokens
-        }
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def set_error(self, message: str):
+        self.status = "error"
+        self.error_message = message
 
     def end(self):
-        self.end_time = datetime.utcnow()
+        self.end_ns = now_ns()
+        if self._trace is not None:
+            self._trace._span_ended()
+
+    def __enter__(self) -> "Span":
+        self._scope = context.activate_span(self._trace, self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.set_error(f"{exc_type.__name__}: {exc_val}")
+        if self.end_ns is None:
+            self.end()
+        context.deactivate_span(self._scope)
+        # Drop the back-reference so finished traces are freed without the cycle collector
+        self._scope = self._trace = None
+        return False
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.__exit__(exc_type, exc_val, exc_tb)
 
     def to_dict(self) -> Dict[str, Any]:
+        has_usage = self.prompt_tokens is not None and self.completion_tokens is not None
         return {
-            "id": str(self.id),
+            "id": format_id(self.span_id),
             "name": self.name,
             "span_type": self.span_type,
-            "parent_span_id": str(self.parent.id) if self.parent else None,
-            "start_time": self.start_time.isoformat(),
-            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "parent_span_id": format_id(self.parent.span_id) if self.parent else None,
+            "start_time": ns_to_iso(self.start_ns),
+            "end_time": ns_to_iso(self.end_ns) if self.end_ns is not None else None,
             "input": self.input,
             "output": self.output,
-            "attributes": self.attributes,
+            "attributes": self._attributes or {},
             "model": self.model,
-            "prompt_tokens": self.tokens.get("prompt"),
-            "completion_tokens": self.tokens.get("completion"),
-            "total_tokens": self.tokens.get("total")
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens if has_usage else None,
+            "status": self.status,
+            "error_message": self.error_message
         }
 
 class Trace:
-    def __init__(self, client: "JordyClient", name: str):
+    def __init__(self, client: "JordyClient", name: str, parent: Optional[Dict[str, str]] = None):
         self.client = client
-        self.id = uuid.uuid4()
+        self.trace_id = new_id()
         self.name = name
-        self.start_time = datetime.utcnow()
-        self.end_time: Optional[datetime] = None
+        self.start_ns = now_ns()
+        self.end_ns: Optional[int] = None
         self.spans: List[Span] = []
-        self.active_span: Optional[Span] = None
         self.input: Optional[Dict[str, Any]] = None
         self.output: Optional[Dict[str, Any]] = None
+        # Links to the trace that spawned this one in another process, if any
+        self.metadata: Dict[str, Any] = context.extract(parent)
+        # Set by the client's sampler when the trace is kept
+        self.sample_rate = 1.0
+        # None until the first chunk of spans is uploaded early (see JordyClient span_window);
+        # then True, or False if head sampling dropped the trace
+        self.streamed: Optional[bool] = None
+        self._ended_spans = 0
+        # Guards moving finished spans out of this trace; only needed when span_window is set
+        self._stream_lock = threading.Lock() if client.span_window is not None else None
 
-    @contextmanager
-    def span(self, name: str, span_type: str = "custom"):
-        parent = self.active_span
-        span = Span(name, span_type, parent=parent)
-        self.spans.append(span)
-        
-        previous_span = self.active_span
-        self.active_span = span
-        try:
-            yield span
-        finally:
-            span.end()
-            self.active_span = previous_span
+    @property
+    def id(self) -> uuid.UUID:
+        return uuid.UUID(int=self.trace_id)
+
+    @property
+    def start_time(self) -> datetime:
+        return ns_to_datetime(self.start_ns)
+
+    @property
+    def end_time(self) -> Optional[datetime]:
+        return ns_to_datetime(self.end_ns) if self.end_ns is not None else None
+
+    @property
+    def active_span(self) -> Optional[Span]:
+        """
+        Innermost open span of this trace in the current thread/task.
+        """
+        if context.get_current_trace() is not self:
+            return None
+        return context.get_current_span()
+
+    def span(self, name: str, span_type: str = "custom") -> Span:
+        """
+        Open a child of the current span; use as `with trace.span(...) as span`
+        (or `async with`). Exceptions escaping the block mark the span as errored.
+        """
+        # Parent comes from the caller's context, so concurrent spans on one
+        # trace (threads, asyncio tasks) each nest under their own parent
+        span = Span(name, span_type, parent=self.active_span, trace=self)
+        if self._stream_lock is None:
+            self.spans.append(span)
+        else:
+            # _span_ended may be swapping the list in another thread
+            with self._stream_lock:
+                self.spans.append(span)
+        return span
 
     def set_input(self, input_data: Dict[str, Any]):
-        self.input = input_data
+        self.input = self._limit(input_data)
 
     def set_output(self, output_data: Dict[str, Any]):
-        self.output = output_data
+        self.output = self._limit(output_data)
+
+    def _limit(self, data: Any) -> Any:
+        limits = self.client.payload_limits
+        return data if limits is None else limits.apply(data)
 
     def end(self):
-        self.end_time = datetime.utcnow()
-        # Automatically send to client
-        self.client.ingest_trace(self)
+        self.end_ns = now_ns()
+        if self.streamed is None:
+            # Automatically send to client
+            self.client.ingest_trace(self)
+        elif self.streamed:
+            # Remaining spans go with the closing chunk
+            with self._stream_lock:
+                spans, self.spans = self.spans, []
+            self.client.ingest_chunk(TraceChunk(self, spans, final=True))
+        else:
+            self.client.sampled_out += 1
 
-    def to_dict(self) -> Dict[str, Any]:
+    def _span_ended(self):
+        """
+        Upload finished spans early once `span_window` of them have piled up,
+        so a long-running trace holds at most a window of spans in memory.
+        """
+        window = self.client.span_window
+        if window is None:
+            return
+        with self._stream_lock:
+            self._ended_spans += 1
+            if self._ended_spans < window:
+                return
+            # One pass, so a span ending in another thread meanwhile lands in exactly one list
+            ended, running = [], []
+            for s in self.spans:
+                (running if s.end_ns is None else ended).append(s)
+            self.spans = running
+            self._ended_spans = 0
+
+        if self.streamed is None:
+            # The sampler can only decide from the trace id this early
+            sampler = self.client.sampler
+            self.streamed = sampler is None or sampler.head_sampled(self.trace_id)
+            if sampler is not None and self.streamed:
+                self.sample_rate = sampler.rate
+        if self.streamed:
+            self.client.ingest_chunk(TraceChunk(self, ended, final=False))
+
+    def header_dict(self, final: bool = True) -> Dict[str, Any]:
+        """
+        Trace fields without spans; end time and output only once final.
+        """
         return {
-            "id": str(self.id),
+            "id": format_id(self.trace_id),
             "name": self.name,
-            "start_time": self.start_time.isoformat(),
-            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "start_time": ns_to_iso(self.start_ns),
+            "end_time": ns_to_iso(self.end_ns) if final and self.end_ns is not None else None,
             "input": self.input,
-            "output": self.output,
-            "spans": [s.to_dict() for s in self.spans]
+            "output": self.output if final else None,
+            "metadata": self.metadata,
+            "sample_rate": self.sample_rate,
         }
 
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.header_dict()
+        data["spans"] = [s.to_dict() for s in self.spans]
+        return data
+
 class JordyClient:
-    def __init__(self, api_key: str, base_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "http://localhost:8000",
+        background: bool = True,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 100,
+        max_batch_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        timeout: float = 5.0,
+        sampler: Optional[Sampler] = None,
+        wire: Optional[WireFormat] = None,
+        span_window: Optional[int] = None,
+        spool_dir: Optional[str] = None,
+        spool_max_bytes: int = 256 * 1024 * 1024,
+        payload_limits: Optional[PayloadLimiter] = None,
+    ):
+        if span_window is not None and span_window < 1:
+            raise ValueError("span_window must be at least 1")
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.sampler = sampler
+        # Upload finished spans of a still-open trace every `span_window` spans
+        self.span_window = span_window
+        self.sampled_out = 0
+        self.wire = wire or WireFormat()
+        # Shared with the exporter; inline posts skip the network while it is open
+        self.breaker = CircuitBreaker()
+        self.payload_limits = payload_limits
+        if payload_limits is not None:
+            payload_limits.uploader = self._upload_blob
         self.session = requests.Session()
         self.session.headers.update({
             "X-API-KEY": self.api_key,
             "Content-Type": "application/json"
         })
+        # With background=False every trace is posted inline (useful for scripts and tests)
+        self.exporter: Optional[BatchExporter] = None
+        if background:
+            self.exporter = BatchExporter(
+                self.session,
+                f"{self.base_url}/api/v1/traces/batch",
+                span_endpoint=f"{self.base_url}/api/v1/traces/{{trace_id}}/spans",
+                blob_endpoint=f"{self.base_url}/api/v1/blobs/{{digest}}",
+                # Uploads that fail while the API is down are kept on disk and replayed
+                spool=DiskSpool(spool_dir, max_bytes=spool_max_bytes) if spool_dir else None,
+                breaker=self.breaker,
+                max_queue_size=max_queue_size,
+                max_batch_size=max_batch_size,
+                max_batch_bytes=max_batch_bytes,
+                flush_interval=flush_interval,
+                timeout=timeout,
+                wire=self.wire,
+                on_blob_failed=payload_limits.forget if payload_limits is not None else None,
+            )
 
-    def trace(self, name: str) -> Trace:
-        return Trace(self, name)
+    def trace(self, name: str, parent: Optional[Dict[str, str]] = None) -> Trace:
+        return Trace(self, name, parent=parent)
 
     @contextmanager
-    def start_trace(self, name: str):
-        t = Trace(self, name)
+    def start_trace(self, name: str, parent: Optional[Dict[str, str]] = None):
+        """
+        Start a trace and make it current. Pass `parent=context.inject()` from
+        another process to link the new trace to the span that spawned it.
+        """
+        t = Trace(self, name, parent=parent)
         try:
-            yield t
+            with context.use_trace(t):
+                yield t
         finally:
             t.end()
 
     def ingest_trace(self, trace: Trace):
+        if self.sampler is not None and not self.sampler.apply(trace):
+            self.sampled_out += 1
+            return
+        if self.exporter is not None:
+            # Hot path: enqueue only, the exporter thread serializes and uploads
+            self.exporter.enqueue(trace)
+            return
+        self._post_inline(f"{self.base_url}/api/v1/traces/", trace)
+
+    def ingest_chunk(self, chunk: TraceChunk):
+        """
+        Upload spans of a still-running trace (see `span_window`).
+        """
+        if self.exporter is not None:
+            self.exporter.enqueue(chunk)
+            return
+        self._post_inline(f"{self.base_url}/api/v1/traces/{chunk.trace_id}/spans", chunk)
+
+    def _upload_blob(self, digest: str, data: bytes):
+        """
+        Offloaded payload field from `payload_limits`; sent before the trace referencing it.
+        """
+        blob = BlobUpload(digest, data)
+        if self.exporter is not None:
+            uploaded = self.exporter.enqueue(blob)
+        else:
+            headers = dict(self.wire.headers)
+            headers["Content-Type"] = "text/plain; charset=utf-8"
+            uploaded = self._post_inline(f"{self.base_url}/api/v1/blobs/{digest}", blob, "PUT", headers)
+        if not uploaded:
+            # Dropped or rejected: the next payload with this content uploads it again
+            self.payload_limits.forget(digest)
+
+    def _post_inline(
+        self, url: str, item: Any, method: str = "POST", headers: Optional[Dict[str, str]] = None
+    ) -> bool:
+        if not self.breaker.allow():
+            # The API is known to be down: fail fast instead of waiting out the timeout
+            print("Jordy Observe unavailable, skipping upload")
+            return False
         try:
-            url = f"{self.base_url}/api/v1/traces/"
-            response = self.session.post(url, json=trace.to_dict(), timeout=5)
-            response.raise_for_status()
-        except Exception as e:
-            # In production, use background worker or async logging to not block app
+            if isinstance(item, BlobUpload):
+                payload = self.wire.compress(item.data)
+            else:
+                payload = self.wire.compress(self.wire.encode_trace(item))
+            response = self.session.request(
+                method, url, data=payload, headers=headers or self.wire.headers, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
             print(f"Failed to ingest trace to Jordy Observe: {e}")
+            return False
+        if response.status_code in RETRYABLE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if not response.ok:
+            print(f"Failed to ingest trace to Jordy Observe: HTTP {response.status_code}")
+        return response.ok
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all finished traces have been sent (or spooled to disk).
+        """
+        if self.exporter is None:
+            return True
+        return self.exporter.flush(timeout)
+
+    def shutdown(self, timeout: Optional[float] = 10.0):
+        """
+        Flush pending traces and stop the background exporter.
+        """
+        if self.exporter is not None:
+            self.exporter.shutdown(timeout)
+            if self.exporter.spool is not None:
+                self.exporter.spool.close()
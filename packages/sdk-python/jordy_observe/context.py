@@ -0,0 +1,111 @@
+import contextvars
+import functools
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# The active trace and innermost open span. asyncio copies the context into
+# every task, so concurrent coroutines each keep their own parent chain.
+_current_trace: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("jordy_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("jordy_span", default=None)
+
+# Carrier keys used to hand a position in a trace to another process
+TRACE_ID_KEY = "jordy-trace-id"
+SPAN_ID_KEY = "jordy-span-id"
+
+
+def get_current_trace() -> Optional[Any]:
+    return _current_trace.get()
+
+
+def get_current_span() -> Optional[Any]:
+    return _current_span.get()
+
+
+@contextmanager
+def use_trace(trace: Any):
+    """
+    Make `trace` the active trace for the enclosed block.
+    """
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def activate_span(trace: Any, span: Any) -> Tuple[contextvars.Token, contextvars.Token]:
+    return _current_trace.set(trace), _current_span.set(span)
+
+
+def deactivate_span(tokens: Tuple[contextvars.Token, contextvars.Token]):
+    trace_token, span_token = tokens
+    _current_span.reset(span_token)
+    _current_trace.reset(trace_token)
+
+
+def wrap(fn: Callable) -> Callable:
+    """
+    Bind `fn` to the caller's current trace context.
+
+    Threads don't inherit context variables, so wrap callables before handing
+    them to a thread or `loop.run_in_executor`. Each call runs in its own copy
+    of the captured context, so one wrapped function can run concurrently.
+    """
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def submit(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """
+    `executor.submit` that carries the current trace context into the worker thread.
+    """
+    return executor.submit(wrap(fn), *args, **kwargs)
+
+
+class ContextExecutor(Executor):
+    """
+    Executor wrapper whose submit/map propagate the caller's trace context, so
+    existing thread-pool code picks up span parenting without call-site changes.
+    """
+
+    def __init__(self, executor: Executor):
+        self._executor = executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._executor.submit(wrap(fn), *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def inject(carrier: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Write the current trace/span ids into a picklable dict for another process.
+    """
+    carrier = {} if carrier is None else carrier
+    trace, span = _current_trace.get(), _current_span.get()
+    if trace is not None:
+        carrier[TRACE_ID_KEY] = str(trace.id)
+        if span is not None:
+            carrier[SPAN_ID_KEY] = str(span.id)
+    return carrier
+
+
+def extract(carrier: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Trace metadata linking a trace started in a child process to its parent.
+    """
+    if not carrier or TRACE_ID_KEY not in carrier:
+        return {}
+    metadata = {"parent_trace_id": carrier[TRACE_ID_KEY]}
+    if SPAN_ID_KEY in carrier:
+        metadata["parent_span_id"] = carrier[SPAN_ID_KEY]
+    return metadata
@@ -0,0 +1,355 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from .retry import RETRYABLE_STATUSES, CircuitBreaker, backoff_delay
+from .spool import DiskSpool, SpoolRecord
+from .utils import format_id
+from .wire import WireFormat
+
+# Spooled requests replayed before the worker checks the live queue again
+REPLAY_PER_CYCLE = 20
+
+
+class TraceChunk:
+    """
+    Spans of a still-running trace, uploaded ahead of the trace's end to the
+    span-append endpoint. The final chunk carries the end time and output
+    and closes the trace on the server.
+    """
+
+    __slots__ = ("trace", "spans", "final")
+
+    def __init__(self, trace: Any, spans: List[Any], final: bool):
+        self.trace = trace
+        self.spans = spans
+        self.final = final
+
+    @property
+    def trace_id(self) -> str:
+        return format_id(self.trace.trace_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.trace.header_dict(final=self.final)
+        data["spans"] = [s.to_dict() for s in self.spans]
+        return data
+
+
+class BlobUpload:
+    """
+    A large payload field offloaded by PayloadLimiter, stored under its digest.
+    """
+
+    __slots__ = ("digest", "data")
+
+    def __init__(self, digest: str, data: bytes):
+        self.digest = digest
+        self.data = data
+
+
+class BatchExporter:
+    """
+    Background exporter that ships finished traces off the caller's thread.
+
+    Traces are put on a bounded in-memory queue; a daemon worker drains it and
+    posts batches to the batch ingest endpoint once they hit `max_batch_size`
+    traces, `max_batch_bytes` serialized bytes, or `flush_interval` seconds of
+    age, whichever comes first (the byte bound applies before compression).
+    Bodies are encoded and compressed per `wire` (gzip JSON by default).
+    When the queue is full new traces are dropped and counted in `dropped`.
+    TraceChunks are posted one by one, in queue order, to `span_endpoint`,
+    and BlobUploads are PUT to `blob_endpoint` ahead of the traces that
+    reference them; `on_blob_failed` is called with the digest of a blob
+    that could not be uploaded (or spooled).
+
+    `breaker` (a CircuitBreaker) trips after repeated timeouts, connection
+    errors or 408/429/5xx-unavailable responses; while it is open nothing is
+    posted, so an outage can't stall the worker on timeouts. Those requests
+    are then written to `spool` (a DiskSpool) if one is given, otherwise
+    counted as failed. Once anything is spooled, later requests queue behind
+    it on disk so the server still sees them in order; the worker replays
+    the spool with exponential backoff and full jitter between failed attempts.
+    While replay is succeeding the worker does not wait out `flush_interval`
+    between rounds, so the backlog drains as fast as the server accepts it
+    rather than at a fixed number of requests per cycle.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        endpoint: str,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 100,
+        max_batch_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        timeout: float = 5.0,
+        wire: Optional[WireFormat] = None,
+        span_endpoint: Optional[str] = None,
+        blob_endpoint: Optional[str] = None,
+        spool: Optional[DiskSpool] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        on_blob_failed: Optional[Callable[[str], None]] = None,
+    ):
+        self.session = session
+        self.endpoint = endpoint
+        self.span_endpoint = span_endpoint
+        self.blob_endpoint = blob_endpoint
+        self.spool = spool
+        self.breaker = breaker or CircuitBreaker()
+        self.on_blob_failed = on_blob_failed
+        self.wire = wire or WireFormat()
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self.spooled = 0
+
+        self._replay_attempt = 0
+        self._replay_at = 0.0
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._flush_requested = threading.Event()
+        self._shutdown = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._worker = threading.Thread(target=self._run, name="jordy-exporter", daemon=True)
+        self._worker.start()
+        atexit.register(self.shutdown)
+
+    def enqueue(self, trace: Any) -> bool:
+        """
+        Hand a finished trace to the worker. Never blocks; returns False if dropped.
+        """
+        if self._shutdown.is_set():
+            self.dropped += 1
+            return False
+        with self._idle:
+            self._in_flight += 1
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+            self._mark_done(1)
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every trace enqueued so far has been exported (or failed).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._flush_requested.set()
+        with self._idle:
+            while self._in_flight > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = 10.0):
+        """
+        Flush pending traces and stop the worker thread.
+        """
+        if self._shutdown.is_set():
+            return
+        self.flush(timeout)
+        self._shutdown.set()
+        self._flush_requested.set()
+        self._worker.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "spooled": self.spooled,
+            "spool_pending": len(self.spool) if self.spool is not None else 0,
+            "spool_dropped": self.spool.dropped if self.spool is not None else 0,
+            "breaker": self.breaker.state,
+        }
+
+    def _run(self):
+        while not self._shutdown.is_set():
+            backlog = self._replay()
+            bodies = self._collect(wait=not backlog)
+            if bodies:
+                self._export(bodies)
+                self._mark_done(len(bodies))
+
+    def _collect(self, wait: bool = True):
+        """
+        Gather one batch, bounded by count, serialized size and age. Without
+        `wait` only what is already queued is taken.
+        """
+        bodies: List[bytes] = []
+        size = 0
+        deadline = time.monotonic() + (self.flush_interval if wait else 0)
+
+        while len(bodies) < self.max_batch_size and size < self.max_batch_bytes:
+            remaining = deadline - time.monotonic()
+            if self._flush_requested.is_set():
+                remaining = 0
+            try:
+                if remaining > 0:
+                    trace = self._queue.get(timeout=min(remaining, 0.1))
+                else:
+                    trace = self._queue.get_nowait()
+            except queue.Empty:
+                if remaining <= 0 or self._shutdown.is_set():
+                    break
+                continue
+
+            if isinstance(trace, TraceChunk):
+                self._export_chunk(trace)
+                self._mark_done(1)
+                continue
+            if isinstance(trace, BlobUpload):
+                self._export_blob(trace)
+                self._mark_done(1)
+                continue
+
+            # Serialization happens here, on the worker, not on the request thread
+            try:
+                body = self.wire.encode_trace(trace)
+            except Exception as e:
+                self.failed += 1
+                self._mark_done(1)
+                print(f"Failed to serialize trace for Jordy Observe: {e}")
+                continue
+            size += len(body)
+            bodies.append(body)
+
+        if self._queue.empty():
+            self._flush_requested.clear()
+        return bodies
+
+    def _export(self, bodies: List[bytes]):
+        try:
+            payload = self.wire.compress(self.wire.batch(bodies))
+        except Exception as e:
+            self.failed += len(bodies)
+            print(f"Failed to serialize traces for Jordy Observe: {e}")
+            return
+        self._send(SpoolRecord(self.endpoint, self.wire.headers, payload, len(bodies)))
+
+    def _export_chunk(self, chunk: TraceChunk):
+        try:
+            payload = self.wire.compress(self.wire.encode_trace(chunk))
+        except Exception as e:
+            self.failed += 1
+            print(f"Failed to serialize spans for Jordy Observe: {e}")
+            return
+        url = self.span_endpoint.format(trace_id=chunk.trace_id)
+        self._send(SpoolRecord(url, self.wire.headers, payload, int(chunk.final)))
+
+    def _export_blob(self, blob: BlobUpload):
+        headers = dict(self.wire.headers)
+        headers["Content-Type"] = "text/plain; charset=utf-8"
+        url = self.blob_endpoint.format(digest=blob.digest)
+        try:
+            payload = self.wire.compress(blob.data)
+        except Exception as e:
+            self.failed += 1
+            print(f"Failed to compress payload blob for Jordy Observe: {e}")
+            delivered = False
+        else:
+            delivered = self._send(SpoolRecord(url, headers, payload, 0, "PUT"))
+        if not delivered and self.on_blob_failed is not None:
+            self.on_blob_failed(blob.digest)
+
+    def _send(self, record: SpoolRecord) -> bool:
+        """
+        Post now, or spool when the backend is unavailable or a backlog exists.
+        Returns False if the request failed for good.
+        """
+        if self.spool is not None and len(self.spool):
+            return self._spool(record)
+        if self.breaker.allow():
+            accepted = self._post(record)
+            if accepted is not None:
+                return accepted
+        if self.spool is not None:
+            return self._spool(record)
+        self.failed += max(record.count, 1)
+        return False
+
+    def _post(self, record: SpoolRecord) -> Optional[bool]:
+        """
+        Returns None when the request should be retried later, otherwise
+        whether the server accepted it.
+        """
+        try:
+            response = self.session.request(
+                record.method, record.url, data=record.payload, headers=record.headers, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            print(f"Failed to reach Jordy Observe: {e}")
+            return None
+        if response.status_code in RETRYABLE_STATUSES:
+            self.breaker.record_failure()
+            print(f"Jordy Observe unavailable: HTTP {response.status_code}")
+            return None
+
+        self.breaker.record_success()
+        try:
+            response.raise_for_status()
+            result = response.json()
+            # Duplicates were stored by an earlier attempt of a retried request
+            self.exported += result.get("accepted", record.count) + result.get("duplicates", 0)
+            self.failed += result.get("rejected", 0)
+        except Exception as e:
+            # The server answered, so resending the same payload would fail the same way
+            self.failed += max(record.count, 1)
+            print(f"Failed to ingest traces to Jordy Observe: {e}")
+            return False
+        return True
+
+    def _spool(self, record: SpoolRecord) -> bool:
+        try:
+            self.spool.append(record)
+            self.spooled += 1
+        except OSError as e:
+            self.failed += max(record.count, 1)
+            print(f"Failed to spool traces for Jordy Observe: {e}")
+            return False
+        return True
+
+    def _replay(self) -> bool:
+        """
+        Replay spooled requests until the spool is drained or a retry is due
+        later; returns True if it stopped only to serve the live queue.
+        """
+        if self.spool is None or not len(self.spool):
+            return False
+        replayed = 0
+        while time.monotonic() >= self._replay_at:
+            if replayed >= REPLAY_PER_CYCLE and not self._queue.empty():
+                return True
+            record = self.spool.peek()
+            if record is None or not self.breaker.allow():
+                return False
+            if self._post(record) is None:
+                self._replay_attempt += 1
+                self._replay_at = time.monotonic() + backoff_delay(self._replay_attempt)
+                return False
+            self._replay_attempt = 0
+            self.spool.ack()
+            replayed += 1
+        return False
+
+    def _mark_done(self, count: int):
+        with self._idle:
+            self._in_flight -= count
+            if self._in_flight <= 0:
+                self._idle.notify_all()
@@ -0,0 +1,33 @@
+import importlib
+from typing import Dict
+
+from ._patch import unpatch_all
+
+# library name -> integration module
+INTEGRATIONS: Dict[str, str] = {
+    "openai": ".openai",
+    "anthropic": ".anthropic",
+}
+
+
+def instrument(*libraries: str):
+    """
+    Opt-in auto-instrumentation of LLM client libraries, e.g.
+    `instrument("openai", "anthropic")`. Calls made inside a trace are
+    recorded as `llm` spans with model and token usage read from the
+    response; calls outside a trace go straight to the original method.
+    """
+    for library in libraries or tuple(INTEGRATIONS):
+        if library not in INTEGRATIONS:
+            raise ValueError(f"Unknown integration: {library}")
+        importlib.import_module(INTEGRATIONS[library], __name__).instrument()
+
+
+def uninstrument():
+    """
+    Restore every method patched by `instrument`.
+    """
+    unpatch_all()
+
+
+__all__ = ["instrument", "uninstrument"]
@@ -0,0 +1,82 @@
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..observe import _get_trace, capture
+
+# (owner, attribute, original) for every patched method, for uninstrument()
+_patched: List[Tuple[Any, str, Callable]] = []
+
+
+def patch_method(owner: Any, attribute: str, name: str, extract: Callable[[Any], Dict[str, Any]], is_async: bool):
+    """
+    Wrap `owner.attribute` so calls inside a trace become `llm` spans called `name`.
+
+    `extract(response)` returns the model, token usage and output to record.
+    Outside a trace the wrapper is a context variable lookup and a call.
+    """
+    original = getattr(owner, attribute)
+    if getattr(original, "__jordy_original__", None) is not None:
+        return
+
+    if is_async:
+        @functools.wraps(original)
+        async def wrapper(self, *args, **kwargs):
+            trace = _get_trace()
+            if trace is None:
+                return await original(self, *args, **kwargs)
+            async with _start(trace, name, kwargs) as span:
+                response = await original(self, *args, **kwargs)
+                _record(span, extract, response, kwargs)
+                return response
+    else:
+        @functools.wraps(original)
+        def wrapper(self, *args, **kwargs):
+            trace = _get_trace()
+            if trace is None:
+                return original(self, *args, **kwargs)
+            with _start(trace, name, kwargs) as span:
+                response = original(self, *args, **kwargs)
+                _record(span, extract, response, kwargs)
+                return response
+
+    wrapper.__jordy_original__ = original
+    setattr(owner, attribute, wrapper)
+    _patched.append((owner, attribute, original))
+
+
+def unpatch_all():
+    while _patched:
+        owner, attribute, original = _patched.pop()
+        setattr(owner, attribute, original)
+
+
+def _start(trace: Any, name: str, kwargs: Dict[str, Any]) -> Any:
+    span = trace.span(name, span_type="llm")
+    span.log_input({key: capture(value) for key, value in kwargs.items()})
+    return span
+
+
+def _record(span: Any, extract: Callable[[Any], Dict[str, Any]], response: Any, kwargs: Dict[str, Any]):
+    if kwargs.get("stream"):
+        # Streamed responses carry usage only in their last event; record the call without it
+        span.model = kwargs.get("model")
+        return
+    try:
+        info = extract(response)
+    except Exception:
+        return
+    span.set_llm_metadata(
+        info.get("model") or kwargs.get("model") or "unknown",
+        info.get("prompt_tokens") or 0,
+        info.get("completion_tokens") or 0,
+    )
+    if info.get("output") is not None:
+        span.log_output({"output": info["output"]})
+
+
+def attr(obj: Any, *path: str, default: Optional[Any] = None) -> Any:
+    for name in path:
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return default
+    return obj
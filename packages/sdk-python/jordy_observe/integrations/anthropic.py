@@ -0,0 +1,27 @@
+from typing import Any, Dict
+
+from ._patch import attr, patch_method
+
+
+def _extract(response: Any) -> Dict[str, Any]:
+    blocks = getattr(response, "content", None) or []
+    text = "".join(getattr(block, "text", "") or "" for block in blocks)
+    return {
+        "model": getattr(response, "model", None),
+        "prompt_tokens": attr(response, "usage", "input_tokens"),
+        "completion_tokens": attr(response, "usage", "output_tokens"),
+        "output": text or None,
+    }
+
+
+def instrument():
+    """
+    Record `messages.create` (sync and async).
+    """
+    try:
+        from anthropic.resources import messages
+    except ImportError as e:
+        raise ImportError("The anthropic integration requires the anthropic package: pip install anthropic") from e
+
+    patch_method(messages.Messages, "create", "anthropic.messages", _extract, is_async=False)
+    patch_method(messages.AsyncMessages, "create", "anthropic.messages", _extract, is_async=True)
@@ -0,0 +1,30 @@
+from typing import Any, Dict
+
+from ._patch import attr, patch_method
+
+
+def _extract(response: Any) -> Dict[str, Any]:
+    choices = getattr(response, "choices", None) or []
+    message = attr(choices[0], "message") if choices else None
+    return {
+        "model": getattr(response, "model", None),
+        "prompt_tokens": attr(response, "usage", "prompt_tokens"),
+        "completion_tokens": attr(response, "usage", "completion_tokens"),
+        "output": attr(message, "content") if message is not None else attr(choices[0], "text") if choices else None,
+    }
+
+
+def instrument():
+    """
+    Record `chat.completions.create` and `completions.create` (sync and async).
+    """
+    try:
+        from openai.resources import completions
+        from openai.resources.chat import completions as chat_completions
+    except ImportError as e:
+        raise ImportError("The openai integration requires the openai package: pip install openai") from e
+
+    patch_method(chat_completions.Completions, "create", "openai.chat.completions", _extract, is_async=False)
+    patch_method(chat_completions.AsyncCompletions, "create", "openai.chat.completions", _extract, is_async=True)
+    patch_method(completions.Completions, "create", "openai.completions", _extract, is_async=False)
+    patch_method(completions.AsyncCompletions, "create", "openai.completions", _extract, is_async=True)
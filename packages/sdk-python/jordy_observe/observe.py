@@ -0,0 +1,268 @@
+import functools
+import inspect
+from typing import Any, Callable, Dict, Optional
+
+from . import context
+from .context import _current_trace
+from .payload import PayloadLimiter
+
+# Arguments/return values are converted to plain JSON-like data when captured,
+# so later mutation (or a huge object) can't leak into the exported trace
+MAX_CAPTURE_DEPTH = 6
+MAX_REPR_CHARS = 1000
+# Used for captured values when the client has no payload_limits of its own
+DEFAULT_LIMITS = PayloadLimiter(max_string_bytes=16 * 1024, max_items=100)
+
+_default_client: Optional[Any] = None
+
+
+def set_default_client(client: Optional[Any]):
+    """
+    Client used by @observe functions called outside any trace: each such
+    call starts (and ends) a trace of its own. Without one, those calls run
+    untraced.
+    """
+    global _default_client
+    _default_client = client
+
+
+def observe(
+    fn: Optional[Callable] = None,
+    *,
+    name: Optional[str] = None,
+    span_type: str = "custom",
+    capture_input: bool = True,
+    capture_output: bool = True,
+):
+    """
+    Record each call of the decorated function as a span.
+
+    Works on plain, async, generator and async generator functions, with or
+    without arguments (`@observe` or `@observe(span_type="tool")`). The span
+    nests under the current span, records arguments and the return value
+    (bounded by the client's payload_limits, or DEFAULT_LIMITS), and is
+    marked as errored if an exception escapes. Generator bodies only run
+    once iterated, so a generator's span belongs to the trace current at
+    its first step, nests under the span current then, and is timed from
+    that step until the generator is exhausted or closed; calling it
+    without iterating records nothing.
+
+    With no active trace and no default client (set_default_client), the
+    wrapper only pays for one context variable lookup before calling through.
+    """
+    def decorate(func: Callable) -> Callable:
+        observed = _Observed(func, name or func.__qualname__, span_type, capture_input, capture_output)
+        if inspect.isasyncgenfunction(func):
+            return _wrap_async_generator(func, observed)
+        if inspect.iscoroutinefunction(func):
+            return _wrap_coroutine(func, observed)
+        if inspect.isgeneratorfunction(func):
+            return _wrap_generator(func, observed)
+        return _wrap_function(func, observed)
+
+    return decorate if fn is None else decorate(fn)
+
+
+def capture(value: Any, depth: int = 0) -> Any:
+    """
+    Snapshot a value as JSON-like data; other objects become a bounded repr.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if depth >= MAX_CAPTURE_DEPTH:
+        return _repr(value)
+    if isinstance(value, dict):
+        return {str(k): capture(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [capture(v, depth + 1) for v in value]
+    return _repr(value)
+
+
+def _repr(value: Any) -> str:
+    try:
+        text = repr(value)
+    except Exception:
+        text = f"<{type(value).__name__}>"
+    return text if len(text) <= MAX_REPR_CHARS else text[:MAX_REPR_CHARS] + "..."
+
+
+class _Observed:
+    """
+    Per-function settings, resolved once at decoration time.
+    """
+
+    __slots__ = ("name", "span_type", "capture_input", "capture_output", "signature", "skip_first")
+
+    def __init__(self, func: Callable, name: str, span_type: str, capture_input: bool, capture_output: bool):
+        self.name = name
+        self.span_type = span_type
+        self.capture_input = capture_input
+        self.capture_output = capture_output
+        try:
+            self.signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            self.signature = None
+        params = list(self.signature.parameters) if self.signature else []
+        # Methods: don't record self/cls
+        self.skip_first = bool(params) and params[0] in ("self", "cls")
+
+    def start(self, trace: Any, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        span = trace.span(self.name, self.span_type)
+        if self.capture_input:
+            span.input = self._limit(trace, self._inputs(args, kwargs))
+            if trace.input is None and span.parent is None:
+                trace.input = span.input
+        return span
+
+    def finish(self, trace: Any, span: Any, result: Any):
+        if self.capture_output and result is not None:
+            span.output = self._limit(trace, {"output": capture(result)})
+            if span.parent is None:
+                trace.output = span.output
+
+    def _inputs(self, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.signature is not None:
+            try:
+                bound = self.signature.bind_partial(*args, **kwargs).arguments
+                items = list(bound.items())[1:] if self.skip_first else bound.items()
+                return {key: capture(value) for key, value in items}
+            except TypeError:
+                pass
+        return {"args": capture(args), "kwargs": capture(kwargs)}
+
+    @staticmethod
+    def _limit(trace: Any, data: Any) -> Any:
+        return (trace.client.payload_limits or DEFAULT_LIMITS).apply(data)
+
+
+# Bound once: the disabled path is this call plus a global lookup
+_get_trace = _current_trace.get
+
+
+def _wrap_function(func: Callable, observed: _Observed) -> Callable:
+    def call(trace, args, kwargs):
+        with observed.start(trace, args, kwargs) as span:
+            result = func(*args, **kwargs)
+            observed.finish(trace, span, result)
+            return result
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _get_trace()
+        if trace is not None:
+            return call(trace, args, kwargs)
+        if _default_client is None:
+            return func(*args, **kwargs)
+        trace = _default_client.trace(observed.name)
+        try:
+            with context.use_trace(trace):
+                return call(trace, args, kwargs)
+        finally:
+            trace.end()
+
+    return wrapper
+
+
+def _wrap_coroutine(func: Callable, observed: _Observed) -> Callable:
+    async def call(trace, args, kwargs):
+        async with observed.start(trace, args, kwargs) as span:
+            result = await func(*args, **kwargs)
+            observed.finish(trace, span, result)
+            return result
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        trace = _get_trace()
+        if trace is not None:
+            return await call(trace, args, kwargs)
+        if _default_client is None:
+            return await func(*args, **kwargs)
+        trace = _default_client.trace(observed.name)
+        try:
+            with context.use_trace(trace):
+                return await call(trace, args, kwargs)
+        finally:
+            trace.end()
+
+    return wrapper
+
+
+def _end_span(span: Any, error: Optional[BaseException] = None):
+    if isinstance(error, Exception):
+        span.set_error(f"{type(error).__name__}: {error}")
+    span.end()
+    span._trace = None
+
+
+def _wrap_generator(func: Callable, observed: _Observed) -> Callable:
+    # The span is made current only while the generator body runs, never
+    # across a yield, so the caller's context is untouched between items
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Runs at the first next(), not at the call (see observe)
+        trace = _get_trace()
+        if trace is None:
+            # A generator outlives the call, so it never starts a trace of its own
+            return (yield from func(*args, **kwargs))
+        span = observed.start(trace, args, kwargs)
+        gen = func(*args, **kwargs)
+        step, value = gen.send, None
+        try:
+            while True:
+                tokens = context.activate_span(trace, span)
+                try:
+                    item = step(value)
+                finally:
+                    context.deactivate_span(tokens)
+                step, value = gen.send, None
+                try:
+                    value = yield item
+                except GeneratorExit:
+                    gen.close()
+                    raise
+                except BaseException as e:
+                    step, value = gen.throw, e
+        except StopIteration as stop:
+            observed.finish(trace, span, stop.value)
+            _end_span(span)
+            return stop.value
+        except BaseException as e:
+            _end_span(span, e)
+            raise
+
+    return wrapper
+
+
+def _wrap_async_generator(func: Callable, observed: _Observed) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        trace = _get_trace()
+        if trace is None:
+            async for item in func(*args, **kwargs):
+                yield item
+            return
+        span = observed.start(trace, args, kwargs)
+        agen = func(*args, **kwargs)
+        step, value = agen.asend, None
+        try:
+            while True:
+                tokens = context.activate_span(trace, span)
+                try:
+                    item = await step(value)
+                finally:
+                    context.deactivate_span(tokens)
+                step, value = agen.asend, None
+                try:
+                    value = yield item
+                except GeneratorExit:
+                    await agen.aclose()
+                    raise
+                except BaseException as e:
+                    step, value = agen.athrow, e
+        except StopAsyncIteration:
+            _end_span(span)
+        except BaseException as e:
+            _end_span(span, e)
+            raise
+
+    return wrapper
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+BLOB_KEY = "$blob"
+# Digests remembered as uploaded or queued for upload; older ones may be uploaded again (the server dedupes)
+UPLOADED_CACHE_SIZE = 10000
+
+
+class PayloadLimiter:
+    """
+    Bounds what `log_input`/`log_output`/`set_input`/`set_output` keep.
+
+    Applied when a payload is logged, so oversized values are never held on
+    the span, queued or serialized:
+
+    - `max_string_bytes`: longer strings (UTF-8) are cut and end with a
+      `...[truncated N of M bytes]` marker.
+    - `max_items`: longer lists keep their first items plus a marker item.
+    - `blob_min_bytes`: strings at least this long are offloaded instead of
+      truncated. The text is uploaded once to the blob endpoint under its
+      SHA-256 and replaced by `{"$blob": "sha256:...", "bytes": n,
+      "preview": "..."}`; identical text (a system prompt sent on every
+      call) is only referenced after the first upload; if that upload is
+      dropped or fails, the next copy is uploaded again. Off by default.
+    - `max_blob_bytes`: strings above this are truncated even when offloading.
+    """
+
+    def __init__(
+        self,
+        max_string_bytes: int = 64 * 1024,
+        max_items: int = 1000,
+        blob_min_bytes: Optional[int] = None,
+        max_blob_bytes: int = 32 * 1024 * 1024,
+        preview_chars: int = 200,
+    ):
+        self.max_string_bytes = max_string_bytes
+        self.max_items = max_items
+        self.blob_min_bytes = blob_min_bytes
+        self.max_blob_bytes = max_blob_bytes
+        self.preview_chars = preview_chars
+        # Set by the client: called with (digest, utf-8 bytes) for each new blob
+        self.uploader: Optional[Callable[[str, bytes], None]] = None
+
+        self.truncated = 0
+        self.offloaded = 0
+        self._uploaded: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Strings at most this many chars can't reach any limit (UTF-8 is <= 4 bytes per char)
+        smallest = max_string_bytes if blob_min_bytes is None else min(max_string_bytes, blob_min_bytes)
+        self._fast_chars = smallest // 4
+
+    def apply(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return self._string(value)
+        if isinstance(value, dict):
+            return {k: self.apply(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            items = [self.apply(v) for v in value[:self.max_items]]
+            if len(value) > self.max_items:
+                self.truncated += 1
+                items.append(f"...[truncated {len(value) - self.max_items} of {len(value)} items]")
+            return items
+        return value
+
+    def _string(self, value: str) -> Any:
+        if len(value) <= self._fast_chars:
+            return value
+        data = value.encode("utf-8")
+        if (
+            self.blob_min_bytes is not None
+            and self.uploader is not None
+            and self.blob_min_bytes <= len(data) <= self.max_blob_bytes
+        ):
+            return self._offload(value, data)
+        if len(data) <= self.max_string_bytes:
+            return value
+        self.truncated += 1
+        kept = data[:self.max_string_bytes].decode("utf-8", "ignore")
+        return f"{kept}...[truncated {len(data) - self.max_string_bytes} of {len(data)} bytes]"
+
+    def _offload(self, value: str, data: bytes) -> Any:
+        digest = "sha256:" + hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = digest in self._uploaded
+            if known:
+                self._uploaded.move_to_end(digest)
+            else:
+                self._uploaded[digest] = None
+                if len(self._uploaded) > UPLOADED_CACHE_SIZE:
+                    self._uploaded.popitem(last=False)
+        if not known:
+            self.uploader(digest, data)
+        self.offloaded += 1
+        return {BLOB_KEY: digest, "bytes": len(data), "preview": value[:self.preview_chars]}
+
+    def forget(self, digest: str):
+        """
+        Drop a digest whose upload was dropped or failed.
+        """
+        with self._lock:
+            self._uploaded.pop(digest, None)
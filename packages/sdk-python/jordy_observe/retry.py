@@ -0,0 +1,67 @@
+import random
+import threading
+import time
+
+# Statuses that mean "try again later"; other 4xx/5xx responses are final
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 502, 503, 504})
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)].
+    Jitter keeps many clients recovering from the same outage from retrying in lockstep.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a backend that keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `allow()` returns False for `reset_timeout` seconds, so callers fail (or
+    spool) immediately instead of waiting on timeouts. Then it half-opens:
+    one call is let through as a probe, and its outcome closes the breaker
+    or opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one probe through until it reports back
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
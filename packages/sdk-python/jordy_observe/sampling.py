@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Optional
+
+
+def id_ratio(value: int) -> float:
+    """
+    Map a 128-bit id to [0, 1) from its high 64 bits. The server tail sampler
+    uses the same mapping, so head and tail decisions for a trace agree.
+    """
+    return (value >> 64) / 2 ** 64
+
+
+class Sampler:
+    """
+    Client-side sampling applied when a trace ends, before it is queued.
+
+    - `rate`: head sampling probability, decided from the trace id so every
+      service that sees the same trace makes the same choice.
+    - `span_type_rates`: keep only a fraction of spans of a given type, e.g.
+      {"retrieval": 0.1}. Children of dropped spans are re-parented to the
+      nearest kept ancestor. Spans that errored or carry model usage are
+      always kept so token and cost totals stay exact.
+    - `keep_errors` / `slow_threshold_ms`: always keep traces with an error
+      span or a latency at or above the threshold, regardless of `rate`.
+
+    Kept traces report the probability they were kept with as `sample_rate`
+    so the server can weight them back to unbiased totals.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        span_type_rates: Optional[Dict[str, float]] = None,
+        keep_errors: bool = True,
+        slow_threshold_ms: Optional[float] = None,
+    ):
+        if not 0.0 < rate <= 1.0:
+            raise ValueError("rate must be in (0, 1]")
+        self.rate = rate
+        self.span_type_rates = dict(span_type_rates or {})
+        self.keep_errors = keep_errors
+        self.slow_threshold_ms = slow_threshold_ms
+
+    def head_sampled(self, trace_id: int) -> bool:
+        return id_ratio(trace_id) < self.rate
+
+    def apply(self, trace: Any) -> bool:
+        """
+        Decide whether a finished trace is exported; prunes spans in place.
+        """
+        if self._always_keep(trace):
+            trace.sample_rate = 1.0
+        elif self.head_sampled(trace.trace_id):
+            trace.sample_rate = self.rate
+        else:
+            return False
+        if self.span_type_rates:
+            self._prune_spans(trace)
+        return True
+
+    def _always_keep(self, trace: Any) -> bool:
+        if self.keep_errors and any(span.status == "error" for span in trace.spans):
+            return True
+        if self.slow_threshold_ms is not None and trace.end_ns is not None:
+            return (trace.end_ns - trace.start_ns) / 1e6 >= self.slow_threshold_ms
+        return False
+
+    def _keep_span(self, span: Any) -> bool:
+        rate = self.span_type_rates.get(span.span_type)
+        if rate is None or span.status == "error" or span.model:
+            return True
+        return id_ratio(span.span_id) < rate
+
+    def _prune_spans(self, trace: Any):
+        kept: List[Any] = []
+        dropped = set()
+        for span in trace.spans:
+            if self._keep_span(span):
+                kept.append(span)
+            else:
+                dropped.add(span.span_id)
+        if not dropped:
+            return
+        for span in kept:
+            parent = span.parent
+            while parent is not None and parent.span_id in dropped:
+                parent = parent.parent
+            span.parent = parent
+        trace.spans = kept
+        trace.metadata["dropped_spans"] = len(dropped)
@@ -0,0 +1,249 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Frame header: metadata length, payload length, CRC32 of metadata + payload
+_HEADER = struct.Struct(">III")
+_MAX_META_BYTES = 64 * 1024
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor"
+
+
+class SpoolRecord(NamedTuple):
+    url: str
+    headers: Dict[str, str]
+    payload: bytes
+    # Traces the payload carries, for export accounting on replay
+    count: int
+    method: str = "POST"
+
+
+class DiskSpool:
+    """
+    Append-only on-disk log of export requests that could not be sent.
+
+    Records are length-prefixed, checksummed frames appended to numbered
+    segment files of up to `segment_bytes`. A cursor file records how far
+    replay has got; a segment is deleted once replay moves past it. When the
+    spool grows past `max_bytes` the oldest segment is evicted and its
+    unsent records are counted in `dropped`. A frame torn by a crash is cut
+    off when the spool is reopened, and everything before it is replayed.
+
+    Payloads are stored exactly as they would have been posted (encoded and
+    compressed). One spool directory must be used by one process at a time.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        segment_bytes: int = 8 * 1024 * 1024,
+        fsync: bool = False,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.fsync = fsync
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments: List[int] = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit()
+        )
+        if not self._segments:
+            self._segments.append(1)
+        self._recover_tail()
+        self._sizes = {seg: os.path.getsize(self._path(seg)) for seg in self._segments}
+        self._counts = {seg: len(self._scan(seg, 0)) for seg in self._segments}
+
+        self._read_seg, self._read_offset = self._load_cursor()
+        # Records of the read segment already acknowledged
+        self._read_index = len(self._scan(self._read_seg, 0)) - len(self._scan(self._read_seg, self._read_offset))
+        self._reader = None
+        # Length of the frame last returned by peek, consumed by ack
+        self._peeked: Optional[int] = None
+        self._writer = open(self._path(self._segments[-1]), "ab")
+
+    def __len__(self) -> int:
+        """
+        Number of records not yet acknowledged.
+        """
+        return sum(self._counts[seg] for seg in self._segments if seg >= self._read_seg) - self._read_index
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def append(self, record: SpoolRecord):
+        meta = json.dumps(
+            {"url": record.url, "headers": record.headers, "count": record.count, "method": record.method}
+        ).encode("utf-8")
+        body = meta + record.payload
+        frame = _HEADER.pack(len(meta), len(record.payload), zlib.crc32(body)) + body
+
+        with self._lock:
+            tail = self._segments[-1]
+            if self._sizes[tail] and self._sizes[tail] + len(frame) > self.segment_bytes:
+                tail = self._roll()
+            self._writer.write(frame)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            self._sizes[tail] += len(frame)
+            self._counts[tail] += 1
+            while self.size_bytes > self.max_bytes and len(self._segments) > 1:
+                self._evict_oldest()
+
+    def peek(self) -> Optional[SpoolRecord]:
+        """
+        Oldest unacknowledged record, or None if the spool is drained.
+        """
+        with self._lock:
+            while True:
+                frame = self._read_frame()
+                if frame is not None:
+                    self._peeked = frame[1]
+                    return frame[0]
+                if self._read_seg == self._segments[-1]:
+                    if self._read_offset >= self._sizes[self._read_seg]:
+                        return None
+                    # Corrupt frame in the active segment: continue writing in a fresh one
+                    self._roll()
+                # Nothing readable left in this segment: skip to the next one
+                self._advance_segment()
+
+    def ack(self):
+        """
+        Drop the record last returned by `peek` once it has been delivered.
+        """
+        with self._lock:
+            if self._peeked is None:
+                return
+            self._read_offset += self._peeked
+            self._read_index += 1
+            self._peeked = None
+            if self._read_offset >= self._sizes[self._read_seg] and self._read_seg != self._segments[-1]:
+                self._advance_segment()
+            self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{seg:020d}{_SEGMENT_SUFFIX}")
+
+    def _scan(self, seg: int, offset: int, verify: bool = False) -> List[Tuple[int, int]]:
+        """
+        (offset, length) of each complete frame from `offset` on; stops at
+        the first frame that is truncated or, with `verify`, fails its CRC.
+        """
+        frames = []
+        path = self._path(seg)
+        if not os.path.exists(path):
+            return frames
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while offset + _HEADER.size <= size:
+                meta_len, payload_len, crc = _HEADER.unpack(f.read(_HEADER.size))
+                length = _HEADER.size + meta_len + payload_len
+                if meta_len > _MAX_META_BYTES or offset + length > size:
+                    break
+                if verify:
+                    if zlib.crc32(f.read(meta_len + payload_len)) != crc:
+                        break
+                else:
+                    f.seek(meta_len + payload_len, os.SEEK_CUR)
+                frames.append((offset, length))
+                offset += length
+        return frames
+
+    def _recover_tail(self):
+        path = self._path(self._segments[-1])
+        if not os.path.exists(path):
+            open(path, "ab").close()
+            return
+        frames = self._scan(self._segments[-1], 0, verify=True)
+        valid = frames[-1][0] + frames[-1][1] if frames else 0
+        if valid < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, _CURSOR_FILE)) as f:
+                seg, offset = (int(part) for part in f.read().split())
+        except (OSError, ValueError):
+            return self._segments[0], 0
+        if seg not in self._sizes:
+            return self._segments[0], 0
+        return seg, min(offset, self._sizes[seg])
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        # Write-then-rename so a crash never leaves a half-written cursor
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self._read_seg} {self._read_offset}")
+        os.replace(path + ".tmp", path)
+
+    def _read_frame(self) -> Optional[Tuple[SpoolRecord, int]]:
+        if self._read_offset + _HEADER.size > self._sizes[self._read_seg]:
+            return None
+        if self._reader is None:
+            self._reader = open(self._path(self._read_seg), "rb")
+        self._reader.seek(self._read_offset)
+        meta_len, payload_len, crc = _HEADER.unpack(self._reader.read(_HEADER.size))
+        if meta_len > _MAX_META_BYTES:
+            return None
+        body = self._reader.read(meta_len + payload_len)
+        if len(body) != meta_len + payload_len or zlib.crc32(body) != crc:
+            return None
+        meta = json.loads(body[:meta_len])
+        record = SpoolRecord(meta["url"], meta["headers"], body[meta_len:], meta["count"], meta.get("method", "POST"))
+        return record, _HEADER.size + meta_len + payload_len
+
+    def _advance_segment(self):
+        """
+        Move replay to the next segment, deleting the current one.
+        """
+        seg = self._read_seg
+        self.dropped += self._counts[seg] - self._read_index
+        self._peeked = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._remove_segment(seg)
+        self._read_seg, self._read_offset, self._read_index = self._segments[0], 0, 0
+        self._save_cursor()
+
+    def _roll(self) -> int:
+        self._writer.close()
+        seg = self._segments[-1] + 1
+        self._segments.append(seg)
+        self._sizes[seg] = 0
+        self._counts[seg] = 0
+        self._writer = open(self._path(seg), "ab")
+        return seg
+
+    def _evict_oldest(self):
+        oldest = self._segments[0]
+        if oldest == self._read_seg:
+            self._advance_segment()
+        else:
+            self._remove_segment(oldest)
+
+    def _remove_segment(self, seg: int):
+        self._segments.remove(seg)
+        del self._sizes[seg]
+        del self._counts[seg]
+        os.remove(self._path(seg))
@@ -0,0 +1,50 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+# Wall-clock time of perf_counter zero, captured once at import. Span
+# timestamps are monotonic readings shifted by this offset, so durations are
+# immune to clock steps and reading the clock costs one syscall-free call.
+_WALL_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+# Version 4 / RFC 4122 variant bits, so generated ids are valid UUIDs
+_UUID_CLEAR = ~((0xF000 << 64) | (0xC000 << 48))
+_UUID_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+def now_ns() -> int:
+    return time.perf_counter_ns() + _WALL_OFFSET_NS
+
+
+def ns_to_datetime(ns: int) -> datetime:
+    # Naive UTC, matching what the API expects
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+# (second, "YYYY-MM-DDTHH:MM:SS") of the last formatted timestamp. Spans of a
+# trace mostly share a second, so the calendar math is usually skipped.
+# Swapped as one tuple, so concurrent exporters never see a torn pair.
+_iso_second = (-1, "")
+
+
+def ns_to_iso(ns: int) -> str:
+    global _iso_second
+    second, rem = divmod(ns, 1_000_000_000)
+    cached_second, prefix = _iso_second
+    if second != cached_second:
+        prefix = (_EPOCH + timedelta(seconds=second)).isoformat()
+        _iso_second = (second, prefix)
+    return f"{prefix}.{rem // 1000:06d}"
+
+
+def new_id() -> int:
+    """
+    Random 128-bit id as an int; formatted as a UUID only at export time.
+    """
+    return (random.getrandbits(128) & _UUID_CLEAR) | _UUID_SET
+
+
+def format_id(value: int) -> str:
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
@@ -8,6 +8,11 @@ setup(
         "requests>=2.28.0",
         "pydantic>=2.0.0",
     ],
+    extras_require={
+        "async": ["httpx[http2]>=0.24.0"],
+        "msgpack": ["msgpack>=1.0.0"],
+        "zstd": ["zstandard>=0.21.0"],
+    },
     author="Thanh Vu",
     description="Python SDK for Jordy Observe AI Observability",
 )
\ No newline at end of file
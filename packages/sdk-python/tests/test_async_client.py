@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+from jordy_observe.async_client import AsyncJordyClient
+
+
+def test_traces_ended_in_worker_threads_reach_the_queue():
+    async def run():
+        client = AsyncJordyClient("key", flush_interval=0.01, http2=False, span_window=2)
+        exported = []
+
+        async def export(items):
+            exported.extend(items)
+
+        client._export = export
+
+        def work(i):
+            trace = client.trace(f"job-{i}")
+            for n in range(3):
+                with trace.span(f"step-{n}"):
+                    pass
+            trace.end()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        await asyncio.to_thread(lambda: [thread.join() for thread in threads])
+        # Let the loop run the enqueue callbacks before flushing
+        await asyncio.sleep(0)
+        assert await client.flush(timeout=5)
+        await client.aclose()
+        return client, exported
+
+    client, exported = asyncio.run(run())
+    assert client.dropped == 0
+    # One early chunk (2 spans) and one closing chunk (1 span) per trace
+    assert len(exported) == 8
+    assert sum(len(chunk.spans) for chunk in exported) == 12
@@ -0,0 +1,34 @@
+import sys
+import threading
+
+from jordy_observe.client import JordyClient
+
+
+def test_concurrent_spans_survive_window_flushes():
+    interval = sys.getswitchinterval()
+    # Switch threads as often as possible to widen any race
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            client = JordyClient("key", background=False, span_window=50)
+            chunks = []
+            client.ingest_chunk = chunks.append
+            trace = client.trace("agent")
+
+            def work():
+                for i in range(2000):
+                    with trace.span(f"step-{i}"):
+                        pass
+
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            trace.end()
+
+            span_ids = [span.span_id for chunk in chunks for span in chunk.spans]
+            assert len(span_ids) == len(set(span_ids)) == 8 * 2000
+            assert chunks[-1].final
+    finally:
+        sys.setswitchinterval(interval)
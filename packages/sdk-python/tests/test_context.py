@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from jordy_observe import context
+from jordy_observe.client import JordyClient
+from jordy_observe.context import ContextExecutor, get_current_span, get_current_trace, submit, wrap
+
+
+def child_span(name):
+    trace = get_current_trace()
+    if trace is None:
+        return None
+    with trace.span(name) as span:
+        return span
+
+
+def make_client():
+    client = JordyClient("key", background=False)
+    client.ingest_trace = lambda trace: None
+    return client
+
+
+def test_submit_carries_the_current_span_into_the_pool():
+    with ThreadPoolExecutor(2) as pool:
+        with make_client().start_trace("job") as trace, trace.span("parent") as parent:
+            spans = [submit(pool, child_span, f"child-{i}").result() for i in range(4)]
+            # Without submit the worker thread sees no trace
+            assert pool.submit(child_span, "lost").result() is None
+    assert [span.parent for span in spans] == [parent] * 4
+
+
+def test_wrap_binds_the_context_at_wrap_time():
+    with make_client().start_trace("job") as trace:
+        with trace.span("first") as first:
+            task = wrap(child_span)
+        with trace.span("second"):
+            result = []
+            thread = threading.Thread(target=lambda: result.append(task("child")))
+            thread.start()
+            thread.join()
+    assert result[0].parent is first
+    assert get_current_trace() is None and get_current_span() is None
+
+
+def test_context_executor_propagates_through_submit_and_map():
+    with ContextExecutor(ThreadPoolExecutor(2)) as pool:
+        with make_client().start_trace("job") as trace, trace.span("parent") as parent:
+            submitted = pool.submit(child_span, "submitted").result()
+            mapped = list(pool.map(child_span, ["a", "b", "c"]))
+    assert [span.parent for span in [submitted] + mapped] == [parent] * 4
+
+
+def test_concurrent_coroutines_each_keep_their_own_parent():
+    async def branch(trace, name):
+        with trace.span(name) as outer:
+            await asyncio.sleep(0)
+            with trace.span(f"{name}-inner") as inner:
+                await asyncio.sleep(0)
+        return outer, inner
+
+    async def run(trace):
+        with trace.span("root") as root:
+            branches = await asyncio.gather(*(branch(trace, f"branch-{i}") for i in range(3)))
+        return root, branches
+
+    with make_client().start_trace("job") as trace:
+        root, branches = asyncio.run(run(trace))
+    # Interleaved at every await, yet no branch nests under another
+    assert all(outer.parent is root and inner.parent is outer for outer, inner in branches)
+    assert get_current_span() is None
+
+
+def test_inject_and_extract_link_traces_across_processes():
+    with make_client().start_trace("job") as trace, trace.span("parent") as parent:
+        carrier = context.inject()
+    assert context.extract(carrier) == {"parent_trace_id": str(trace.id), "parent_span_id": str(parent.id)}
+    assert context.extract({}) == {}
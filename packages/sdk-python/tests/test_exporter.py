@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+
+import requests
+
+from jordy_observe.exporter import BatchExporter
+from jordy_observe.retry import CircuitBreaker
+from jordy_observe.spool import DiskSpool, SpoolRecord
+from jordy_observe.wire import WireFormat
+
+PLAIN = WireFormat(compression=None)
+
+
+class FakeTrace:
+    def __init__(self, n: int):
+        self.n = n
+
+    def to_dict(self):
+        return {"id": self.n}
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, count: int):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.count = count
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return {"accepted": self.count}
+
+
+class FakeSession:
+    """
+    Records the trace ids of every accepted batch; `down` fails requests
+    with a connection error.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.down = False
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def request(self, method, url, data, headers, timeout):
+        time.sleep(self.delay)
+        if self.down:
+            raise requests.ConnectionError("connection refused")
+        ids = [trace["id"] for trace in json.loads(data)["traces"]]
+        with self._lock:
+            self.batches.append(ids)
+        return FakeResponse(200, len(ids))
+
+    @property
+    def ids(self):
+        with self._lock:
+            return [n for batch in self.batches for n in batch]
+
+
+def make_exporter(session, **kwargs):
+    kwargs.setdefault("wire", PLAIN)
+    return BatchExporter(session, "http://api/batch", **kwargs)
+
+
+def test_spooled_backlog_is_replayed_in_order(tmp_path):
+    session = FakeSession()
+    session.down = True
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    exporter = make_exporter(
+        session, spool=DiskSpool(str(tmp_path)), breaker=breaker, max_batch_size=1, flush_interval=0.01
+    )
+    for n in range(5):
+        exporter.enqueue(FakeTrace(n))
+    assert exporter.flush(5)
+    assert len(exporter.spool) == 5
+
+    # Recovered: new traces queue behind the backlog instead of overtaking it
+    session.down = False
+    for n in range(5, 10):
+        exporter.enqueue(FakeTrace(n))
+    exporter.flush(5)
+    deadline = time.monotonic() + 10
+    while len(exporter.spool) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    exporter.shutdown()
+    assert session.ids == list(range(10))
+
+
+def test_backlog_drains_under_steady_live_traffic(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    for n in range(300):
+        spool.append(SpoolRecord("http://api/batch", PLAIN.headers, PLAIN.batch([PLAIN.encode_trace(FakeTrace(n))]), 1))
+    session = FakeSession(delay=0.001)
+    # A long flush interval: replay must not be paced by it
+    exporter = make_exporter(session, spool=spool, flush_interval=5.0)
+
+    n = 300
+    deadline = time.monotonic() + 5
+    while len(spool) and time.monotonic() < deadline:
+        exporter.enqueue(FakeTrace(n))
+        n += 1
+        time.sleep(0.02)
+    drained = not len(spool)
+    exporter.shutdown()
+    assert drained
+    assert session.ids[:300] == list(range(300))
+
+
+def test_full_queue_drops_and_counts():
+    session = FakeSession()
+    sending = threading.Event()
+    release = threading.Event()
+    request = session.request
+
+    def blocked(*args, **kwargs):
+        sending.set()
+        release.wait(5)
+        return request(*args, **kwargs)
+
+    session.request = blocked
+    exporter = make_exporter(session, max_queue_size=3, max_batch_size=1, flush_interval=0.01)
+    exporter.enqueue(FakeTrace(0))
+    # The worker holds trace 0 in a stalled request; the queue fills behind it
+    assert sending.wait(5)
+    results = [exporter.enqueue(FakeTrace(n)) for n in range(1, 6)]
+    assert results == [True, True, True, False, False]
+    assert exporter.dropped == 2
+
+    release.set()
+    exporter.shutdown()
+    assert session.ids == [0, 1, 2, 3]
+
+
+def test_batches_close_on_count():
+    session = FakeSession()
+    exporter = make_exporter(session, max_batch_size=4, flush_interval=60.0)
+    for n in range(8):
+        exporter.enqueue(FakeTrace(n))
+    deadline = time.monotonic() + 5
+    while len(session.ids) < 8 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session.batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    exporter.shutdown()
+
+
+def test_batches_close_on_bytes():
+    session = FakeSession()
+    body = len(PLAIN.encode_trace(FakeTrace(0)))
+    exporter = make_exporter(session, max_batch_bytes=body * 3, flush_interval=60.0)
+    for n in range(6):
+        exporter.enqueue(FakeTrace(n))
+    deadline = time.monotonic() + 5
+    while len(session.ids) < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session.batches == [[0, 1, 2], [3, 4, 5]]
+    exporter.shutdown()
+
+
+def test_partial_batch_is_sent_after_flush_interval():
+    session = FakeSession()
+    exporter = make_exporter(session, flush_interval=0.2)
+    start = time.monotonic()
+    exporter.enqueue(FakeTrace(0))
+    while not session.batches and time.monotonic() - start < 5:
+        time.sleep(0.01)
+    assert session.batches == [[0]]
+    assert time.monotonic() - start >= 0.15
+    exporter.shutdown()
+
+
+def test_flush_waits_for_queued_traces_and_shutdown_stops_the_worker():
+    session = FakeSession(delay=0.05)
+    exporter = make_exporter(session, flush_interval=60.0)
+    for n in range(3):
+        exporter.enqueue(FakeTrace(n))
+    # Sends the partial batch now instead of after flush_interval
+    assert exporter.flush(5)
+    assert session.ids == [0, 1, 2] and exporter.exported == 3
+
+    exporter.enqueue(FakeTrace(3))
+    exporter.shutdown()
+    assert session.ids == [0, 1, 2, 3]
+    assert not exporter._worker.is_alive()
+    # Nothing is accepted after shutdown
+    assert not exporter.enqueue(FakeTrace(4)) and exporter.dropped == 1
+    assert exporter.flush(1)
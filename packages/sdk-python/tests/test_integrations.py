@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from jordy_observe.client import JordyClient
+from jordy_observe.integrations import uninstrument
+from jordy_observe.integrations._patch import patch_method
+
+
+class FakeCompletions:
+    def create(self, **kwargs):
+        return iter(["Hel", "lo"])
+
+
+def test_streamed_call_is_recorded_without_usage():
+    patch_method(FakeCompletions, "create", "fake.completions", lambda response: {}, is_async=False)
+    client = JordyClient("key", background=False)
+    sent = []
+    client.session.request = lambda method, url, data, **kwargs: sent.append(data) or SimpleNamespace(
+        status_code=200, ok=True
+    )
+    try:
+        with client.start_trace("agent") as trace:
+            stream = FakeCompletions().create(model="gpt-4o", stream=True)
+            assert "".join(stream) == "Hello"
+    finally:
+        uninstrument()
+
+    span = trace.to_dict()["spans"][0]
+    assert span["model"] == "gpt-4o"
+    assert span["prompt_tokens"] is None and span["total_tokens"] is None
+    assert trace.spans[0].tokens == {}
+    assert len(sent) == 1
@@ -0,0 +1,87 @@
+import asyncio
+
+from jordy_observe.client import JordyClient
+from jordy_observe.context import get_current_span
+from jordy_observe.observe import observe
+
+
+def make_client():
+    client = JordyClient("key", background=False)
+    client.ingest_trace = lambda trace: None
+    return client
+
+
+@observe(span_type="tool")
+def count(n):
+    for i in range(n):
+        yield i, get_current_span()
+    return "done"
+
+
+@observe
+async def acount(n):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i, get_current_span()
+
+
+def test_generator_span_starts_at_first_step_and_ends_when_exhausted():
+    with make_client().start_trace("job") as trace:
+        gen = count(2)
+        # Nothing runs (or is recorded) until the generator is iterated
+        assert trace.spans == []
+        with trace.span("consumer") as consumer:
+            items = []
+            for i, inner in gen:
+                # The span is current inside the body only, never across a yield
+                assert get_current_span() is consumer
+                items.append((i, inner))
+    span, = [s for s in trace.spans if s.name.endswith("count")]
+    assert [i for i, _ in items] == [0, 1]
+    assert all(inner is span for _, inner in items)
+    assert span.parent is consumer and span.span_type == "tool"
+    assert span.start_ns >= consumer.start_ns and span.end_ns is not None
+    assert span.input == {"n": 2} and span.output == {"output": "done"}
+
+
+def test_generator_closed_early_ends_its_span():
+    with make_client().start_trace("job") as trace:
+        gen = count(5)
+        next(gen)
+        gen.close()
+    span, = trace.spans
+    assert span.end_ns is not None and span.status == "ok"
+
+
+def test_async_generator_span_starts_at_first_step_and_ends_when_closed():
+    async def run(trace):
+        agen = acount(3)
+        assert trace.spans == []
+        with trace.span("consumer") as consumer:
+            first, inner = await agen.__anext__()
+            assert get_current_span() is consumer
+            await agen.aclose()
+        return consumer, inner
+
+    with make_client().start_trace("job") as trace:
+        consumer, inner = asyncio.run(run(trace))
+    span, = [s for s in trace.spans if s.name.endswith("acount")]
+    assert inner is span and span.parent is consumer
+    assert span.end_ns is not None
+
+
+def test_generator_error_marks_its_span():
+    @observe
+    def failing():
+        yield 1
+        raise ValueError("boom")
+
+    with make_client().start_trace("job") as trace:
+        gen = failing()
+        next(gen)
+        try:
+            next(gen)
+        except ValueError:
+            pass
+    span, = trace.spans
+    assert span.status == "error" and "boom" in span.error_message
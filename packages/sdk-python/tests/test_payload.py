@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+from jordy_observe.client import JordyClient
+from jordy_observe.payload import BLOB_KEY, PayloadLimiter
+
+
+def test_failed_blob_upload_is_retried_with_the_next_copy():
+    limits = PayloadLimiter(blob_min_bytes=1024)
+    client = JordyClient("key", background=False, payload_limits=limits)
+    statuses = [400, 200, 200]
+    uploads = []
+
+    def request(method, url, **kwargs):
+        uploads.append(url)
+        status = statuses.pop(0)
+        return SimpleNamespace(status_code=status, ok=status < 400)
+
+    client.session.request = request
+    prompt = "You are a helpful assistant. " * 100
+
+    first = limits.apply(prompt)
+    second = limits.apply(prompt)
+    third = limits.apply(prompt)
+
+    assert first[BLOB_KEY] == second[BLOB_KEY] == third[BLOB_KEY]
+    # The rejected first upload is retried once; the accepted one is remembered
+    assert len(uploads) == 2
@@ -0,0 +1,36 @@
+from jordy_observe import retry
+from jordy_observe.retry import CircuitBreaker
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    now[0] += 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Exactly one probe is let through
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    for _ in range(3):
+        breaker.record_failure()
+
+    now[0] += 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    now[0] += 10.0
+    assert breaker.allow()
@@ -0,0 +1,62 @@
+from jordy_observe.client import JordyClient
+from jordy_observe.sampling import Sampler, id_ratio
+
+
+def trace_with_ratio(client, ratio):
+    trace = client.trace("job")
+    trace.trace_id = int(ratio * 2 ** 64) << 64
+    return trace
+
+
+def make_client(sampler):
+    client = JordyClient("key", background=False, sampler=sampler)
+    kept = []
+    client._post_inline = lambda url, trace, *args: kept.append(trace)
+    return client, kept
+
+
+def test_head_decision_follows_the_trace_id():
+    sampler = Sampler(rate=0.25)
+    client, kept = make_client(sampler)
+    low = trace_with_ratio(client, 0.1)
+    high = trace_with_ratio(client, 0.9)
+    assert id_ratio(low.trace_id) == 0.1
+    low.end()
+    high.end()
+    assert kept == [low] and low.sample_rate == 0.25
+    assert client.sampled_out == 1
+
+
+def test_failed_and_slow_traces_are_always_kept():
+    client, kept = make_client(Sampler(rate=0.01, slow_threshold_ms=1000))
+    failed = trace_with_ratio(client, 0.9)
+    with failed.span("step") as span:
+        span.set_error("boom")
+    failed.end()
+
+    slow = trace_with_ratio(client, 0.9)
+    slow.start_ns -= 2_000_000_000
+    slow.end()
+    assert kept == [failed, slow]
+    assert failed.sample_rate == slow.sample_rate == 1.0
+
+
+def test_span_type_rates_prune_and_reparent():
+    sampler = Sampler(span_type_rates={"retrieval": 0.0})
+    client, kept = make_client(sampler)
+    trace = client.trace("job")
+    with trace.span("agent", span_type="agent") as agent:
+        with trace.span("search", span_type="retrieval"):
+            with trace.span("rerank", span_type="tool") as rerank:
+                pass
+        with trace.span("embed", span_type="retrieval") as embed:
+            embed.set_llm_metadata("text-embedding-3-small", 10, 0)
+        with trace.span("lookup", span_type="retrieval") as lookup:
+            lookup.set_error("timeout")
+    trace.end()
+
+    (exported,) = kept
+    assert [span.name for span in exported.spans] == ["agent", "rerank", "embed", "lookup"]
+    # The dropped search span's child moves up to the nearest kept ancestor
+    assert rerank.parent is agent
+    assert exported.metadata["dropped_spans"] == 1
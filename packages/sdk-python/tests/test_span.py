@@ -0,0 +1,48 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+from jordy_observe.client import JordyClient, Span
+
+
+def test_span_has_no_instance_dict():
+    span = Span("step")
+    assert not hasattr(span, "__dict__")
+    with pytest.raises(AttributeError):
+        span.unknown_field = 1
+    # Attributes are only allocated once something is stored
+    assert span._attributes is None
+    span.set_attribute("k", "v")
+    assert span.attributes == {"k": "v"}
+
+
+def test_trace_to_dict_round_trips_through_json():
+    client = JordyClient("key", background=False)
+    trace = client.trace("agent")
+    trace.set_input({"question": "hi"})
+    with trace.span("plan", span_type="agent") as parent:
+        with trace.span("call", span_type="llm") as child:
+            child.log_input({"prompt": "hi"})
+            child.log_output({"text": "hello"})
+            child.set_llm_metadata("gpt-4o", 12, 30)
+        with trace.span("tool", span_type="tool") as failed:
+            failed.set_error("boom")
+    trace.end_ns = trace.start_ns + 1_500_000
+
+    data = json.loads(json.dumps(trace.to_dict()))
+    assert uuid.UUID(data["id"]) == trace.id
+    assert datetime.fromisoformat(data["start_time"]) == trace.start_time
+    assert datetime.fromisoformat(data["end_time"]) == trace.end_time
+    assert data["input"] == {"question": "hi"} and data["sample_rate"] == 1.0
+
+    plan, call, tool = data["spans"]
+    assert uuid.UUID(plan["id"]) == parent.id and plan["parent_span_id"] is None
+    assert uuid.UUID(call["parent_span_id"]) == parent.id
+    assert datetime.fromisoformat(call["start_time"]) == child.start_time
+    assert datetime.fromisoformat(call["end_time"]) == child.end_time
+    assert (call["model"], call["prompt_tokens"], call["completion_tokens"], call["total_tokens"]) == ("gpt-4o", 12, 30, 42)
+    assert call["input"] == {"prompt": "hi"} and call["output"] == {"text": "hello"}
+    assert plan["model"] is None and plan["total_tokens"] is None
+    assert (tool["status"], tool["error_message"]) == ("error", "boom")